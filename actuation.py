@@ -0,0 +1,354 @@
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+
+import numpy as np
+
+from instrumentation import profiler
+
+
+# One queued input action. args are passed to the backend method named by kind, then done() is
+# called (if given) on the actuation thread once the backend has performed it.
+Action = namedtuple("Action", ["kind", "args", "queued_at", "done"])
+
+
+class PyAutoGuiBackend:
+    """Send input through pyautogui with its per-call pause disabled"""
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+        # The actuation thread paces itself, the default 0.1 s sleep after every call only adds lag
+        pyautogui.PAUSE = 0
+
+    def size(self):
+        return tuple(self.pyautogui.size())
+
+    def query_position(self):
+        return tuple(self.pyautogui.position())
+
+    def move(self, x, y):
+        self.pyautogui.moveTo(x, y)
+
+    def click(self, button="left", clicks=1):
+        self.pyautogui.click(button=button, clicks=clicks, interval=0.05 if clicks > 1 else 0.0)
+
+    def mouse_down(self, button="left"):
+        self.pyautogui.mouseDown(button=button)
+
+    def mouse_up(self, button="left"):
+        self.pyautogui.mouseUp(button=button)
+
+    def press(self, key, presses=1):
+        self.pyautogui.press(key, presses=presses)
+
+    def write(self, text):
+        self.pyautogui.write(text)
+
+    def hotkey(self, *keys):
+        self.pyautogui.hotkey(*keys)
+
+
+class XTestBackend:
+    """Inject input straight into the X server through the XTest extension (needs python-xlib)"""
+    name = "xtest"
+
+    # pyautogui key names that differ from X keysym names
+    KEYSYM_NAMES = {
+        "pageup": "Prior", "pagedown": "Next", "backspace": "BackSpace", "enter": "Return",
+        "space": "space", "tab": "Tab", "esc": "Escape", "ctrl": "Control_L", "shift": "Shift_L",
+        "alt": "Alt_L", "left": "Left", "right": "Right", "up": "Up", "down": "Down",
+        "delete": "Delete", "home": "Home", "end": "End",
+    }
+    BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+    def __init__(self):
+        from Xlib import X, XK, display
+        from Xlib.ext import xtest
+        self.X = X
+        self.XK = XK
+        self.xtest = xtest
+        self.display = display.Display()
+        self.root = self.display.screen().root
+        self.query_display = None  # Own connection for query_position(), which runs on other threads
+        self.shift_keycode = self.display.keysym_to_keycode(XK.string_to_keysym("Shift_L"))
+
+    def size(self):
+        screen = self.display.screen()
+        return screen.width_in_pixels, screen.height_in_pixels
+
+    def query_position(self):
+        if self.query_display is None:
+            from Xlib import display
+            self.query_display = display.Display()
+        pointer = self.query_display.screen().root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def move(self, x, y):
+        self.xtest.fake_input(self.display, self.X.MotionNotify, x=int(x), y=int(y))
+        self.display.sync()
+
+    def _button(self, button, down):
+        event = self.X.ButtonPress if down else self.X.ButtonRelease
+        self.xtest.fake_input(self.display, event, self.BUTTONS[button])
+
+    def click(self, button="left", clicks=1):
+        for _ in range(clicks):
+            self._button(button, True)
+            self._button(button, False)
+        self.display.sync()
+
+    def mouse_down(self, button="left"):
+        self._button(button, True)
+        self.display.sync()
+
+    def mouse_up(self, button="left"):
+        self._button(button, False)
+        self.display.sync()
+
+    def _keycode(self, key):
+        # Returns (keycode, needs_shift)
+        name = self.KEYSYM_NAMES.get(key.lower(), key) if len(key) > 1 else key
+        keysym = self.XK.string_to_keysym(name)
+        if not keysym and len(key) == 1:
+            keysym = ord(key)
+        keycode = self.display.keysym_to_keycode(keysym)
+        needs_shift = keycode != 0 and self.display.keycode_to_keysym(keycode, 0) != keysym
+        return keycode, needs_shift
+
+    def _tap(self, keycode, needs_shift=False):
+        if needs_shift:
+            self.xtest.fake_input(self.display, self.X.KeyPress, self.shift_keycode)
+        self.xtest.fake_input(self.display, self.X.KeyPress, keycode)
+        self.xtest.fake_input(self.display, self.X.KeyRelease, keycode)
+        if needs_shift:
+            self.xtest.fake_input(self.display, self.X.KeyRelease, self.shift_keycode)
+
+    def press(self, key, presses=1):
+        keycode, needs_shift = self._keycode(key)
+        for _ in range(presses):
+            self._tap(keycode, needs_shift)
+        self.display.sync()
+
+    def write(self, text):
+        # One sync for the whole string instead of a round trip per character
+        for char in text:
+            keycode, needs_shift = self._keycode(char)
+            if keycode:
+                self._tap(keycode, needs_shift)
+        self.display.sync()
+
+    def hotkey(self, *keys):
+        keycodes = [self._keycode(key)[0] for key in keys]
+        for keycode in keycodes:
+            self.xtest.fake_input(self.display, self.X.KeyPress, keycode)
+        for keycode in reversed(keycodes):
+            self.xtest.fake_input(self.display, self.X.KeyRelease, keycode)
+        self.display.sync()
+
+
+class MockBackend:
+    """Record input actions in memory instead of touching the desktop"""
+    name = "mock"
+
+    def __init__(self, screen_size=(1920, 1080)):
+        self.screen_size = screen_size
+        self.cursor = (0, 0)
+        self.actions = []
+        self.lock = threading.Lock()
+
+    def _record(self, *action):
+        with self.lock:
+            self.actions.append(action)
+
+    def size(self):
+        return self.screen_size
+
+    def query_position(self):
+        return self.cursor
+
+    def move(self, x, y):
+        self.cursor = (int(x), int(y))
+        self._record("move", self.cursor)
+
+    def click(self, button="left", clicks=1):
+        self._record("click", button, clicks)
+
+    def mouse_down(self, button="left"):
+        self._record("mouse_down", button)
+
+    def mouse_up(self, button="left"):
+        self._record("mouse_up", button)
+
+    def press(self, key, presses=1):
+        self._record("press", key, presses)
+
+    def write(self, text):
+        self._record("write", text)
+
+    def hotkey(self, *keys):
+        self._record("hotkey", keys)
+
+    def count(self, kind):
+        with self.lock:
+            return sum(1 for action in self.actions if action[0] == kind)
+
+
+BACKENDS = {
+    "pyautogui": PyAutoGuiBackend,
+    "xtest": XTestBackend,
+    "mock": MockBackend,
+}
+
+
+def create_backend(name):
+    """Create an input backend by name, falling back to pyautogui if it is unavailable"""
+    try:
+        return BACKENDS[name]()
+    except ImportError as e:
+        print(f"Input backend '{name}' unavailable ({e}), using pyautogui")
+        return PyAutoGuiBackend()
+
+
+class InputActuator:
+    """Apply input actions on a dedicated thread, collapsing queued cursor moves"""
+
+    def __init__(self, backend=None, history=300, position_max_age=0.015):
+        self.backend = backend or PyAutoGuiBackend()
+        self.queue = deque()
+        self.in_flight = 0  # Actions taken off the queue but not yet performed
+        self.lock = threading.Lock()
+        self.action_ready = threading.Condition(self.lock)
+        self.running = False
+        self.thread = None
+
+        self.screen_size = self.backend.size()
+        # The OS cursor position, queried at most once per position_max_age (about a frame)
+        self.position_max_age = position_max_age
+        self.cursor = None
+        self.cursor_time = 0.0
+        self.buttons_down = set()  # Button state as seen by callers
+
+        # Per-action latency (queued to done) in seconds
+        self.latencies = defaultdict(lambda: deque(maxlen=history))
+        self.moves_coalesced = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._actuation_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        # Never leave a button stuck down
+        for button in list(self.buttons_down):
+            self.mouse_up(button)
+        self.flush(timeout=1)
+        self.running = False
+        with self.lock:
+            self.action_ready.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def _enqueue(self, kind, *args, done=None):
+        with self.lock:
+            if kind == "move" and self.queue and self.queue[-1].kind == "move":
+                # Only the newest target of a run of moves matters
+                self.queue[-1] = Action(kind, args, self.queue[-1].queued_at, done)
+                self.moves_coalesced += 1
+            else:
+                self.queue.append(Action(kind, args, time.perf_counter(), done))
+            self.action_ready.notify()
+
+    def _actuation_loop(self):
+        while self.running:
+            with self.lock:
+                self.action_ready.wait_for(lambda: self.queue or not self.running)
+                if not self.queue:
+                    continue
+                action = self.queue.popleft()
+                self.in_flight += 1
+
+            try:
+                with profiler.span("actuation." + action.kind):
+                    getattr(self.backend, action.kind)(*action.args)
+            except Exception as e:
+                print(f"Error performing {action.kind}: {e}")
+            if action.done is not None:
+                action.done()
+
+            with self.lock:
+                self.in_flight -= 1
+                self.latencies[action.kind].append(time.perf_counter() - action.queued_at)
+                self.action_ready.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until every queued action has been performed"""
+        with self.lock:
+            return self.action_ready.wait_for(lambda: not (self.queue or self.in_flight) or not self.running,
+                                              timeout=timeout)
+
+    # Public API, safe to call from any thread and never blocks on the desktop
+
+    def size(self):
+        return self.screen_size
+
+    def position(self):
+        """Where the cursor really is, which lags queued moves and follows the user's own mouse"""
+        now = time.perf_counter()
+        if self.cursor is None or now - self.cursor_time > self.position_max_age:
+            try:
+                self.cursor = tuple(self.backend.query_position())
+            except Exception as e:
+                print(f"Error querying the cursor position: {e}")
+                self.cursor = self.cursor or (0, 0)
+            self.cursor_time = now
+        return self.cursor
+
+    def move_to(self, x, y, done=None):
+        """Move the cursor; done() runs once it has moved, unless a newer move replaced this one"""
+        self._enqueue("move", x, y, done=done)
+
+    def click(self, button="left", clicks=1):
+        self._enqueue("click", button, clicks)
+
+    def right_click(self):
+        self.click("right")
+
+    def double_click(self):
+        self.click("left", 2)
+
+    def mouse_down(self, button="left"):
+        if button not in self.buttons_down:
+            self.buttons_down.add(button)
+            self._enqueue("mouse_down", button)
+
+    def mouse_up(self, button="left"):
+        if button in self.buttons_down:
+            self.buttons_down.discard(button)
+            self._enqueue("mouse_up", button)
+
+    def press(self, key, presses=1):
+        self._enqueue("press", key, presses)
+
+    def write(self, text):
+        if text:
+            self._enqueue("write", text)
+
+    def hotkey(self, *keys, done=None):
+        self._enqueue("hotkey", *keys, done=done)
+
+    def stats(self):
+        """Return p50/p95 latency in milliseconds for each action kind"""
+        with self.lock:
+            snapshot = {kind: np.array(values) * 1000 for kind, values in self.latencies.items() if values}
+            stats = {"moves_coalesced": self.moves_coalesced}
+        for kind, values in snapshot.items():
+            stats[kind] = {
+                "count": len(values),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+            }
+        return stats
@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import speech_recognition as sr
+
+
+# One block of raw 16-bit PCM from the microphone with its sequence number and arrival time
+AudioChunk = namedtuple("AudioChunk", ["index", "timestamp", "data"])
+
+
+class StreamClosed(EOFError):
+    """Raised by AudioReader.read once the stream has stopped, so readers don't spin on old audio"""
+
+
+class AudioStream:
+    """Keep one microphone stream open on a background thread and share its audio with many readers
+
+    Chunks go into a ring buffer holding the last history_seconds of audio. Each consumer gets its
+    own AudioReader, so wake-word spotting, commands, dictation and calibration never compete for
+    the device, and a reader can start slightly in the past so the start of a phrase isn't lost.
+    """
+
+    def __init__(self, microphone=None, history_seconds=10):
+        self.microphone = microphone or sr.Microphone()
+        self.history_seconds = history_seconds
+        self.lock = threading.Lock()
+        self.chunk_ready = threading.Condition(self.lock)
+        self.chunks = deque()
+        self.next_index = 0
+        self.running = False
+        self.thread = None
+        self.opened = threading.Event()
+
+        # Known once the device is open
+        self.sample_rate = None
+        self.sample_width = None
+        self.chunk_size = None
+        self.open_time = None  # Seconds it took to open the device
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        self.opened.wait(timeout=5)
+        return self
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            self.chunk_ready.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def _capture_loop(self):
+        start = time.perf_counter()
+        try:
+            source = self.microphone.__enter__()
+        except Exception as e:
+            print(f"Could not open the microphone: {e}")
+            with self.lock:
+                self.running = False
+                self.chunk_ready.notify_all()
+            self.opened.set()
+            return
+        self.open_time = time.perf_counter() - start
+        self.sample_rate = source.SAMPLE_RATE
+        self.sample_width = source.SAMPLE_WIDTH
+        self.chunk_size = source.CHUNK
+        max_chunks = int(self.history_seconds * self.sample_rate / self.chunk_size) + 1
+        self.opened.set()
+        try:
+            while self.running:
+                try:
+                    data = source.stream.read(source.CHUNK)
+                except Exception as e:
+                    print(f"Error reading audio: {e}")
+                    time.sleep(0.01)
+                    continue
+                with self.lock:
+                    self.chunks.append(AudioChunk(self.next_index, time.perf_counter(), data))
+                    self.next_index += 1
+                    if len(self.chunks) > max_chunks:
+                        self.chunks.popleft()
+                    self.chunk_ready.notify_all()
+        finally:
+            self.microphone.__exit__(None, None, None)
+
+    def reader(self, pre_roll=0.0):
+        """New independent reader starting pre_roll seconds before now"""
+        reader = AudioReader(self)
+        reader.seek_latest(pre_roll)
+        return reader
+
+    def chunks_for(self, seconds):
+        """Number of chunks covering the given duration"""
+        if not self.sample_rate:
+            return 0
+        return int(round(seconds * self.sample_rate / self.chunk_size))
+
+
+class AudioReader(sr.AudioSource):
+    """One consumer's position in an AudioStream
+
+    Works as a speech_recognition source: `recognizer.listen(reader, ...)` and
+    `adjust_for_ambient_noise(reader)` read from the shared buffer instead of opening the device.
+    """
+
+    def __init__(self, audio_stream):
+        self.audio_stream = audio_stream
+        self.SAMPLE_RATE = audio_stream.sample_rate
+        self.SAMPLE_WIDTH = audio_stream.sample_width
+        self.CHUNK = audio_stream.chunk_size
+        self.stream = self  # speech_recognition reads source.stream.read(source.CHUNK)
+        self.next_index = 0
+        self.last_timestamp = None
+        self.overruns = 0  # Chunks lost because this reader fell more than the history behind
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def seek_latest(self, pre_roll=0.0):
+        """Skip ahead so the next read returns audio from pre_roll seconds ago"""
+        audio = self.audio_stream
+        with audio.lock:
+            oldest = audio.chunks[0].index if audio.chunks else audio.next_index
+            self.next_index = max(oldest, audio.next_index - audio.chunks_for(pre_roll))
+
+    def read(self, size=None, timeout=None):
+        """Next chunk of raw audio, waiting for it if needed; b"" on timeout, StreamClosed once stopped"""
+        audio = self.audio_stream
+        with audio.lock:
+            if not audio.chunk_ready.wait_for(lambda: self.next_index < audio.next_index or not audio.running,
+                                              timeout=timeout):
+                return b""
+            if not audio.running:
+                raise StreamClosed("the microphone stream has stopped")
+            oldest = audio.chunks[0].index
+            if self.next_index < oldest:
+                self.overruns += oldest - self.next_index
+                self.next_index = oldest
+            chunk = audio.chunks[self.next_index - oldest]
+        self.next_index += 1
+        self.last_timestamp = chunk.timestamp
+        return chunk.data
+
+    def close(self):
+        pass
+
+
+if __name__ == "__main__":
+    # Device-open cost that a persistent stream saves on every listen, and several readers sharing it
+    start = time.perf_counter()
+    with sr.Microphone() as mic:
+        pass
+    print(f"Opening the microphone: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    audio_stream = AudioStream().start()
+    readers = [audio_stream.reader(pre_roll=0.5) for _ in range(3)]
+    time.sleep(1.0)
+    start = time.perf_counter()
+    for demo_reader in readers:
+        for _ in range(audio_stream.chunks_for(1.5)):
+            demo_reader.read()
+    print(f"Three readers each read 1.5 s of shared audio in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"(stream opened in {audio_stream.open_time * 1000:.0f} ms, {audio_stream.sample_rate} Hz)")
+    audio_stream.stop()
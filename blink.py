@@ -0,0 +1,103 @@
+from collections import namedtuple
+
+
+# kind is one of "click", "double_click", "hold_start" or "hold_end"
+BlinkEvent = namedtuple("BlinkEvent", ["kind", "timestamp"])
+
+
+class EyeState:
+    """Open/closed state of one eye with hysteresis on the eyelid gap"""
+
+    def __init__(self, close_threshold, open_ratio):
+        self.close_threshold = close_threshold
+        self.open_threshold = close_threshold * open_ratio  # Must reopen past this to count as open
+        self.closed = False
+        self.closed_since = None
+
+    def update(self, gap, timestamp):
+        """Return "closed" or "opened" on a state change, otherwise None"""
+        if not self.closed and gap < self.close_threshold:
+            self.closed = True
+            self.closed_since = timestamp
+            return "closed"
+        if self.closed and gap > self.open_threshold:
+            self.closed = False
+            self.closed_since = None
+            return "opened"
+        return None
+
+
+class BlinkDetector:
+    """Turn per-frame eyelid gaps into click, double-click and hold events without sleeping"""
+
+    def __init__(self, blink_threshold, hold_threshold, refractory=0.3, double_interval=0.7,
+                 open_ratio=1.25, hold_delay=0.0):
+        self.right_eye = EyeState(blink_threshold, open_ratio)  # Blink to click
+        self.left_eye = EyeState(hold_threshold, open_ratio)  # Close to hold the button down
+        self.refractory = refractory  # Ignore new right-eye closures for this long after a click
+        self.double_interval = double_interval  # Second click within this window is a double click
+        self.hold_delay = hold_delay  # Left eye must stay closed this long before the button goes down
+
+        self.last_click_time = None
+        self.last_click_was_double = False
+        self.holding = False
+
+    @property
+    def right_closed(self):
+        return self.right_eye.closed
+
+    def update(self, left_gap, right_gap, timestamp):
+        """Feed one frame of eyelid gaps and return the events it produced"""
+        events = []
+
+        # Normal click (right eye blink), fired on the closing edge
+        if self.right_eye.update(right_gap, timestamp) == "closed":
+            since_click = None if self.last_click_time is None else timestamp - self.last_click_time
+            if since_click is None or since_click >= self.refractory:
+                if since_click is not None and since_click <= self.double_interval \
+                        and not self.last_click_was_double:
+                    events.append(BlinkEvent("double_click", timestamp))
+                    self.last_click_was_double = True
+                else:
+                    events.append(BlinkEvent("click", timestamp))
+                    self.last_click_was_double = False
+                self.last_click_time = timestamp
+
+        # Hold click (left eye closed)
+        self.left_eye.update(left_gap, timestamp)
+        if self.left_eye.closed:
+            if not self.holding and timestamp - self.left_eye.closed_since >= self.hold_delay:
+                self.holding = True
+                events.append(BlinkEvent("hold_start", timestamp))
+        elif self.holding:
+            self.holding = False
+            events.append(BlinkEvent("hold_end", timestamp))
+
+        return events
+
+
+def run_trace(detector, trace):
+    """Replay (timestamp, left_gap, right_gap) samples through detector and collect the events"""
+    events = []
+    for timestamp, left_gap, right_gap in trace:
+        events.extend(detector.update(left_gap, right_gap, timestamp))
+    return events
+
+
+def synthetic_trace(right_closures=(), left_closures=(), duration=3.0, fps=30, open_gap=0.02, closed_gap=0.002):
+    """Build a trace where each eye is closed during the given (start, end) intervals"""
+    trace = []
+    for i in range(int(duration * fps)):
+        t = i / fps
+        left = closed_gap if any(start <= t < end for start, end in left_closures) else open_gap
+        right = closed_gap if any(start <= t < end for start, end in right_closures) else open_gap
+        trace.append((t, left, right))
+    return trace
+
+
+if __name__ == "__main__":
+    # Single blink, double blink, then a held left-eye closure
+    demo = synthetic_trace(right_closures=[(0.2, 0.35), (1.0, 1.12), (1.45, 1.6)],
+                           left_closures=[(2.0, 2.6)])
+    for event in run_trace(BlinkDetector(0.008, 0.008), demo):
+        print(f"{event.timestamp:5.2f}s  {event.kind}")
@@ -0,0 +1,256 @@
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+from instrumentation import profiler
+
+
+# One captured frame together with its sequence number and capture time
+CapturedFrame = namedtuple("CapturedFrame", ["frame_id", "timestamp", "image"])
+
+
+class CameraSource:
+    """Read frames from a webcam through cv2.VideoCapture"""
+    live = True
+
+    def __init__(self, index=0, width=None, height=None):
+        self.index = index
+        self.resolution = (width, height) if width and height else None
+        # Opening a webcam can take seconds, so it happens on the first read(), on the capture thread
+        self.cap = None
+
+    def set_resolution(self, width, height):
+        """Ask the driver for a new capture resolution"""
+        self.resolution = (width, height)
+        if self.cap is not None:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    def read(self):
+        if self.cap is None:
+            self.cap = cv2.VideoCapture(self.index)
+            if self.resolution:
+                self.set_resolution(*self.resolution)
+        ok, frame = self.cap.read()
+        return frame if ok else None
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class ArraySource:
+    """Serve frames from an array or list, paced like a camera"""
+    live = False
+
+    def __init__(self, frames, fps=30, loop=False):
+        self.frames = frames
+        self.interval = 1.0 / fps if fps else 0
+        self.loop = loop
+        self.index = 0
+        self.next_time = None
+
+    def _pace(self):
+        # Sleep until the next frame is "exposed" so consumers see camera timing
+        if not self.interval:
+            return
+        now = time.perf_counter()
+        if self.next_time is None:
+            self.next_time = now
+        if self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time += self.interval
+
+    def read(self):
+        if self.index >= len(self.frames):
+            if not self.loop or len(self.frames) == 0:
+                return None
+            self.index = 0
+        self._pace()
+        frame = self.frames[self.index]
+        self.index += 1
+        return frame
+
+    def release(self):
+        pass
+
+
+class VideoFileSource(ArraySource):
+    """Serve frames decoded from a video file, paced at the file frame rate"""
+
+    def __init__(self, path, fps=None, loop=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video file: {path}")
+        fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 30
+        super().__init__([], fps=fps, loop=loop)
+
+    def read(self):
+        ok, frame = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        if not ok:
+            return None
+        self._pace()
+        return frame
+
+    def release(self):
+        self.cap.release()
+
+
+class FrameCapture:
+    """Grab frames on a background thread and keep only the newest ones"""
+
+    def __init__(self, source, buffer_size=2):
+        self.source = source
+        self.buffer = deque(maxlen=buffer_size)
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+        self.running = False
+        self.finished = False  # Set once a non-live source runs out of frames
+        self.thread = None
+        self.recorder = None  # Optional replay.SessionRecorder
+        self.pending_resolution = None  # Applied by the capture thread before its next read
+
+        # Counters
+        self.frames_captured = 0
+        self.frames_dropped = 0  # Frames replaced by a newer one before anyone read them
+        self.last_read_id = 0
+        self.start_time = None
+        self.cpu_time = 0.0  # CPU seconds used by the capture thread
+
+    def start(self):
+        self.running = True
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self._capture_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            self.new_frame.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1)
+        self.source.release()
+
+    def request_resolution(self, width, height):
+        """Change the capture resolution from any thread, if the source supports it"""
+        if hasattr(self.source, "set_resolution"):
+            self.pending_resolution = (width, height)
+
+    def _capture_loop(self):
+        cpu_start = time.thread_time()
+        while self.running:
+            self.cpu_time = time.thread_time() - cpu_start
+            resolution = self.pending_resolution
+            if resolution is not None:
+                # VideoCapture is not thread safe, so only this thread talks to the driver
+                self.pending_resolution = None
+                self.source.set_resolution(*resolution)
+            try:
+                with profiler.span("capture.read"):
+                    image = self.source.read()
+            except Exception as e:
+                print(f"Error reading frame: {e}")
+                image = None
+
+            if image is None:
+                if self.source.live:
+                    # Camera hiccup, try again shortly
+                    time.sleep(0.01)
+                    continue
+                break
+
+            timestamp = time.perf_counter()
+            if self.recorder is not None:
+                self.recorder.add_frame(timestamp, image)
+            with self.lock:
+                self.frames_captured += 1
+                self.buffer.append(CapturedFrame(self.frames_captured, timestamp, image))
+                self.new_frame.notify_all()
+
+        with self.lock:
+            self.finished = True
+            self.new_frame.notify_all()
+
+    def _has_new(self):
+        # Caller holds the lock
+        return bool(self.buffer) and self.buffer[-1].frame_id > self.last_read_id
+
+    def _take_latest(self):
+        # Caller holds the lock
+        latest = self.buffer[-1]
+        if latest.frame_id > self.last_read_id:
+            # Everything captured since the last read but not returned is lost
+            self.frames_dropped += latest.frame_id - self.last_read_id - 1
+            self.last_read_id = latest.frame_id
+        return latest
+
+    def read(self):
+        """Return the newest frame without blocking, or None if none has arrived yet"""
+        with self.lock:
+            if not self.buffer:
+                return None
+            return self._take_latest()
+
+    def read_new(self, timeout=None):
+        """Wait up to timeout for a frame newer than the last one read"""
+        with self.lock:
+            self.new_frame.wait_for(lambda: self._has_new() or self.finished or not self.running,
+                                    timeout=timeout)
+            if not self._has_new():
+                return None
+            return self._take_latest()
+
+    def recent(self):
+        """Return a copy of the ring buffer, oldest frame first"""
+        with self.lock:
+            return list(self.buffer)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0
+        with self.lock:
+            return {
+                "captured": self.frames_captured,
+                "dropped": self.frames_dropped,
+                "capture_fps": self.frames_captured / elapsed if elapsed else 0.0,
+            }
+
+
+def benchmark(source, consumer_delay=0.05, duration=5.0):
+    """Feed a slow consumer from source and report how stale its frames are"""
+    capture = FrameCapture(source).start()
+    ages = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end and not capture.finished:
+        captured = capture.read_new(timeout=0.5)
+        if captured is None:
+            continue
+        ages.append(time.perf_counter() - captured.timestamp)
+        time.sleep(consumer_delay)  # Stand-in for inference and rendering
+    capture.stop()
+
+    stats = capture.stats()
+    print(f"Captured: {stats['captured']}  Dropped: {stats['dropped']}  "
+          f"Capture FPS: {stats['capture_fps']:.1f}")
+    if ages:
+        ages_ms = np.array(ages) * 1000
+        print(f"Frame age at read (ms): p50 {np.percentile(ages_ms, 50):.2f}  "
+              f"p95 {np.percentile(ages_ms, 95):.2f}  max {ages_ms.max():.2f}")
+
+
+if __name__ == "__main__":
+    # python capture.py [video_file]  -- benchmark without a webcam
+    if len(sys.argv) > 1:
+        bench_source = VideoFileSource(sys.argv[1], loop=True)
+    else:
+        bench_source = ArraySource(np.random.randint(0, 255, (30, 480, 640, 3), dtype=np.uint8), fps=30, loop=True)
+    benchmark(bench_source)
@@ -0,0 +1,257 @@
+import random
+import re
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+
+# One way the text can be read as a command. start/end index the matched words of the text.
+CommandMatch = namedtuple("CommandMatch", ["command", "phrase", "confidence", "start", "end"])
+
+# Word similarity for each kind of fuzzy hit (an exact word is 1.0)
+SAME_STEM = 0.9
+SAME_SOUND = 0.85
+# Keys of fewer than three consonants are shared by too many everyday words ("cat", "quit" and
+# "quiet" are all KT), so they only support a longer phrase ("i control") and never fire alone
+SAME_SOUND_SHORT = 0.7
+ONE_EDIT = 0.8  # Only with the same first letter, or "town" would be "down"
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", text.lower().replace("'", ""))
+
+
+def stem(word):
+    """Very light suffix stripping so controls / controller / control compare equal"""
+    for suffix in ("ing", "ers", "er", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 4 and word[-1] == word[-2]:
+        word = word[:-1]
+    return word
+
+
+def consonant_count(key):
+    """Consonants in a phonetic key, not counting the leading vowel marker"""
+    return len(key) - key.startswith("A")
+
+
+def phonetic_key(word):
+    """Rough sound-alike key: the consonant skeleton, with any leading vowel sound written as A"""
+    for spelling, sound in (("ph", "f"), ("ck", "k"), ("gh", ""), ("qu", "kw"), ("x", "ks"), ("wr", "r"),
+                            ("kn", "n")):
+        word = word.replace(spelling, sound)
+    word = re.sub(r"c(?=[eiy])", "s", word).replace("c", "k").replace("q", "k").replace("z", "s")
+    if not word:
+        return ""
+    first = "A" if word[0] in "aeiouy" else word[0].upper()
+    rest = re.sub(r"(.)\1+", r"\1", re.sub(r"[aeiouyhw]", "", word[1:]))
+    return first + rest.upper()
+
+
+def deletions(word):
+    """The word with any one letter removed"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion, substitution or swap"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diffs) == 1 or (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                                   and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return any(longer[:i] + longer[i + 1:] == shorter for i in range(len(longer)))
+
+
+class _TrieNode:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children = {}
+        self.entries = []  # (command, phrase) for phrases ending here
+
+
+class CommandGrammar:
+    """Compiled matcher from spoken phrases to commands
+
+    Phrases are stored in a word trie, so matching walks the words of the text instead of
+    scanning the command table. Each spoken word is first mapped to the vocabulary words it
+    could be (same word, same stem, same sound, or one typo away) through hash indexes, so the
+    cost depends on the length of the text, not on the number of commands.
+    """
+
+    def __init__(self, table=None, min_confidence=0.75):
+        self.root = _TrieNode()
+        self.min_confidence = min_confidence
+        self.vocabulary = set()
+        self.by_stem = {}
+        self.by_sound = {}
+        self.by_deletion = {}  # Word with one letter removed -> vocabulary words (symmetric delete index)
+        # Each grammar gets its own cache, so clearing it in add() leaves other grammars' entries alone
+        self._candidates = lru_cache(maxsize=4096)(self._find_candidates)
+        for command, phrases in (table or {}).items():
+            for phrase in phrases:
+                self.add(command, phrase)
+
+    def add(self, command, phrase):
+        words = tokenize(phrase)
+        if not words:
+            return
+        node = self.root
+        for word in words:
+            node = node.children.setdefault(word, _TrieNode())
+            if word not in self.vocabulary:
+                self._index_word(word)
+        node.entries.append((command, " ".join(words)))
+        self._candidates.cache_clear()
+
+    def _index_word(self, word):
+        self.vocabulary.add(word)
+        self.by_stem.setdefault(stem(word), set()).add(word)
+        self.by_sound.setdefault(phonetic_key(word), set()).add(word)
+        for variant in deletions(word) | {word}:
+            self.by_deletion.setdefault(variant, set()).add(word)
+
+    def _find_candidates(self, word):
+        """Vocabulary words this spoken word may stand for, with their similarity"""
+        found = {}
+        if word in self.vocabulary:
+            found[word] = 1.0
+        for other in self.by_stem.get(stem(word), ()):
+            found.setdefault(other, SAME_STEM)
+        key = phonetic_key(word)
+        for other in self.by_sound.get(key, ()):
+            found.setdefault(other, SAME_SOUND if consonant_count(key) >= 3 else SAME_SOUND_SHORT)
+        if len(word) >= 4:
+            for variant in deletions(word) | {word}:
+                for other in self.by_deletion.get(variant, ()):
+                    if (other not in found and len(other) >= 4 and other[0] == word[0]
+                            and within_one_edit(word, other)):
+                        found[other] = ONE_EDIT
+        return found
+
+    def match(self, text, min_confidence=None, limit=5):
+        """Ranked CommandMatch list for text, best first, at most one per command
+
+        Phrases explaining more words of the text rank higher, then higher confidence (the
+        mean word similarity), so "scroll up" beats the shorter "up" it contains.
+        """
+        min_confidence = self.min_confidence if min_confidence is None else min_confidence
+        words = tokenize(text)
+        candidates = [self._candidates(word) for word in words]
+        best = {}
+        for start in range(len(words)):
+            frontier = [(self.root, 0.0)]
+            for end in range(start, len(words)):
+                frontier = [(node.children[other], total + similarity)
+                            for node, total in frontier
+                            for other, similarity in candidates[end].items() if other in node.children]
+                if not frontier:
+                    break
+                length = end - start + 1
+                for node, total in frontier:
+                    confidence = total / length
+                    if not node.entries or confidence < min_confidence:
+                        continue
+                    for command, phrase in node.entries:
+                        rank = (total, confidence)
+                        if command not in best or rank > best[command][0]:
+                            best[command] = (rank, CommandMatch(command, phrase, confidence, start, end + 1))
+        ranked = sorted(best.values(), key=lambda item: item[0], reverse=True)
+        return [found for _, found in ranked[:limit]]
+
+    def best(self, text):
+        """Best matching command name, or None"""
+        matches = self.match(text, limit=1)
+        return matches[0].command if matches else None
+
+    def extends(self, phrase):
+        """True if a longer phrase starts with this one ("right" -> "right click")"""
+        node = self.root
+        for word in tokenize(phrase):
+            node = node.children.get(word)
+            if node is None:
+                return False
+        return bool(node.children)
+
+
+def linear_match(table, text):
+    """The old substring scan, kept as the benchmark baseline"""
+    for command, variations in table.items():
+        for variation in variations:
+            if variation in text:
+                return command
+    words = text.split()
+    if len(words) <= 3:
+        for command, variations in table.items():
+            for variation in variations:
+                var_words = variation.split()
+                if sum(1 for w in var_words if w in words) >= max(1, len(var_words) - 1):
+                    return command
+    return None
+
+
+def random_table(size, seed=0):
+    """size commands with two or three phrases of one to three made-up words each"""
+    rng = random.Random(seed)
+    syllables = [consonant + vowel + coda for consonant in "bdfgklmnprstvz" for vowel in "aeiou"
+                 for coda in ("", "n", "r", "l", "st", "nd")]
+    def word():
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 3)))
+    return {f"command {i}": [" ".join(word() for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(2, 3))]
+            for i in range(size)}
+
+
+def benchmark(sizes=(10, 100, 1000, 10000), utterances=300):
+    print(f"{'commands':>9s} {'build ms':>9s} {'grammar us':>11s} {'top-1':>6s} {'linear us':>10s} {'top-1':>6s}")
+    for size in sizes:
+        table = random_table(size)
+        rng = random.Random(1)
+        start = time.perf_counter()
+        grammar = CommandGrammar(table)
+        build = time.perf_counter() - start
+
+        tests = []
+        for _ in range(utterances):
+            command = rng.choice(list(table))
+            phrase = rng.choice(table[command])
+            tests.append((command, f"please {phrase} now"))
+
+        # Cold word cache for every utterance, so small tables don't win by repeating the same words
+        hits = 0
+        grammar_time = 0.0
+        for command, text in tests:
+            grammar._candidates.cache_clear()
+            start = time.perf_counter()
+            hits += grammar.best(text) == command
+            grammar_time += (time.perf_counter() - start) / utterances
+        start = time.perf_counter()
+        linear_hits = sum(linear_match(table, text) == command for command, text in tests)
+        linear_time = (time.perf_counter() - start) / utterances
+        print(f"{size:9d} {build * 1000:9.1f} {grammar_time * 1e6:11.1f} {hits / utterances:6.0%} "
+              f"{linear_time * 1e6:10.1f} {linear_hits / utterances:6.0%}")
+
+
+if __name__ == "__main__":
+    demo = CommandGrammar({
+        "scroll up": ["up", "scroll up", "page up"],
+        "scroll down": ["down", "scroll down", "page down"],
+        "right click": ["right", "right click"],
+        "track": ["track", "tracking"],
+        "stop tracking": ["stop", "stop tracking"],
+        "start typing": ["type", "start typing"],
+        "disable feedback": ["quiet", "disable feedback"],
+        "wake": ["eye control", "hey computer"],
+    })
+    for demo_text in ("scroll up", "stop tracking", "i control", "hay computers", "right clik please"):
+        print(f"{demo_text!r:22s} -> {[(m.command, round(m.confidence, 2)) for m in demo.match(demo_text)]}")
+    # Everyday near-misses of short commands, none of which should match
+    for demo_text in ("the cat sat", "its quite nice", "quit", "top", "town"):
+        print(f"{demo_text!r:22s} -> {[(m.command, round(m.confidence, 2)) for m in demo.match(demo_text)]}")
+    benchmark()
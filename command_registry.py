@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from queue import Empty, Queue
+
+import numpy as np
+
+from instrumentation import profiler
+
+
+UI = "ui"  # Runs on the frame loop thread, inside the per-frame budget; must be quick
+WORKER = "worker"  # Blocks (subprocesses, sleeps, joins), runs in order on the command thread
+
+# One command waiting for dispatch, stamped when it was recognized
+QueuedCommand = namedtuple("QueuedCommand", ["name", "queued_at"])
+
+# A registered command: handler is called without arguments on the given thread
+CommandSpec = namedtuple("CommandSpec", ["name", "handler", "thread", "description"])
+
+
+class CommandRegistry:
+    """Map command names to handlers and dispatch queued commands within a per-frame time budget
+
+    The frame loop calls drain() once per frame. It runs every pending UI command until the
+    budget is spent, leaving the rest for the next frame, and hands WORKER commands to a
+    background thread so a slow handler never holds up tracking or drawing.
+    """
+
+    def __init__(self, budget_ms=4, history=300):
+        self.budget = budget_ms / 1000
+        self.commands = {}
+        self.pending = Queue()
+        self.deferred = deque()  # Taken from a queue but not run yet when the budget ran out
+        self.worker_queue = Queue()
+        self.running = False
+        self.thread = None
+
+        # Per-command seconds from recognition to the handler starting, and handler run time
+        self.latencies = defaultdict(lambda: deque(maxlen=history))
+        self.durations = defaultdict(lambda: deque(maxlen=history))
+        self.unknown = 0
+        self.carried_over = 0  # Frames that left commands for the next frame
+
+    def register(self, name, handler, thread=UI, description=""):
+        self.commands[name] = CommandSpec(name, handler, thread, description)
+        return handler
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._worker_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.worker_queue.put(None)
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def submit(self, name):
+        """Queue a command from any thread, e.g. a button click"""
+        self.pending.put(QueuedCommand(name, time.perf_counter()))
+
+    def drain(self, *queues, budget=None):
+        """Dispatch commands from the given queues (and submit()) until the budget is used up
+
+        Queue items are QueuedCommand tuples or plain command names. At least one command is
+        dispatched per call, so a single slow UI handler cannot starve the queue. Returns the
+        number of commands dispatched.
+        """
+        budget = self.budget if budget is None else budget
+        start = time.perf_counter()
+        dispatched = 0
+        for queue in queues + (self.pending,):
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except Empty:
+                    break
+                if isinstance(item, str):
+                    item = QueuedCommand(item, time.perf_counter())
+                self.deferred.append(item)
+        while self.deferred:
+            if dispatched and time.perf_counter() - start >= budget:
+                self.carried_over += 1
+                break
+            self.dispatch(self.deferred.popleft())
+            dispatched += 1
+        return dispatched
+
+    def dispatch(self, command):
+        spec = self.commands.get(command.name)
+        if spec is None:
+            print(f"No handler for command '{command.name}'")
+            self.unknown += 1
+            return
+        if spec.thread == WORKER:
+            self.worker_queue.put(command)
+        else:
+            self._run(spec, command)
+
+    def _run(self, spec, command):
+        started = time.perf_counter()
+        self.latencies[spec.name].append(started - command.queued_at)
+        try:
+            with profiler.span("command." + spec.name.replace(" ", "_")):
+                spec.handler()
+        except Exception as e:
+            print(f"Error running command '{spec.name}': {e}")
+        self.durations[spec.name].append(time.perf_counter() - started)
+
+    def _worker_loop(self):
+        while self.running:
+            command = self.worker_queue.get()
+            if command is None:
+                continue
+            self._run(self.commands[command.name], command)
+
+    def stats(self):
+        """Return count and p50/p95 dispatch latency and run time in milliseconds for each command"""
+        stats = {"unknown": self.unknown, "frames_carried_over": self.carried_over}
+        for name, values in list(self.latencies.items()):
+            latencies = np.array(values) * 1000
+            durations = np.array(self.durations[name]) * 1000
+            if not len(latencies) or not len(durations):
+                continue
+            stats[name] = {
+                "count": len(latencies),
+                "thread": self.commands[name].thread,
+                "latency_p50_ms": float(np.percentile(latencies, 50)),
+                "latency_p95_ms": float(np.percentile(latencies, 95)),
+                "run_p50_ms": float(np.percentile(durations, 50)),
+            }
+        return stats
+
+
+if __name__ == "__main__":
+    # One command per frame through an if/elif chain against draining with a budget, with a slow handler
+    FRAME = 1 / 30
+    registry = CommandRegistry(budget_ms=4).start()
+    registry.register("scroll up", lambda: time.sleep(0.0005))
+    registry.register("right click", lambda: time.sleep(0.0002))
+    registry.register("launch keyboard", lambda: time.sleep(0.5), WORKER)
+
+    burst = ["scroll up", "right click", "launch keyboard", "scroll up", "right click", "scroll up"]
+    voice_queue = Queue()
+    for burst_name in burst:
+        voice_queue.put(QueuedCommand(burst_name, time.perf_counter()))
+    frames = 0
+    longest = 0.0
+    while frames < 10 and (frames == 0 or registry.deferred or not voice_queue.empty()):
+        frame_start = time.perf_counter()
+        registry.drain(voice_queue)
+        longest = max(longest, time.perf_counter() - frame_start)
+        frames += 1
+        time.sleep(FRAME)
+    print(f"Budgeted drain: {len(burst)} commands in {frames} frame(s), longest frame stall "
+          f"{longest * 1000:.1f} ms")
+    print(f"One command per frame: {len(burst)} frames ({len(burst) * FRAME * 1000:.0f} ms for the last command), "
+          f"and the 500 ms handler would stall its frame")
+    time.sleep(0.6)
+    for stat_name, stat in registry.stats().items():
+        print(stat_name, stat)
+    registry.stop()
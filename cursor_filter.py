@@ -0,0 +1,211 @@
+import math
+import sys
+
+import numpy as np
+
+
+def smoothing_factor(cutoff, dt):
+    """Exponential smoothing factor for a first-order low-pass with the given cutoff (Hz)"""
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroFilter:
+    """Speed-adaptive low-pass filter: heavy smoothing when still, little lag when moving"""
+
+    def __init__(self, min_cutoff=1.0, beta=0.01, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff  # Cutoff (Hz) at rest, lower means less jitter
+        self.beta = beta  # How fast the cutoff rises with speed (per px/s), higher means less lag
+        self.d_cutoff = d_cutoff  # Cutoff for the speed estimate
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.velocity = np.zeros(2)
+        self.last_time = None
+
+    def __call__(self, value, timestamp):
+        value = np.asarray(value, dtype=np.float64)
+        if self.value is None:
+            self.value = value
+            self.last_time = timestamp
+            return value
+
+        dt = timestamp - self.last_time
+        if dt <= 0:
+            return self.value
+        self.last_time = timestamp
+
+        a_d = smoothing_factor(self.d_cutoff, dt)
+        self.velocity = a_d * (value - self.value) / dt + (1 - a_d) * self.velocity
+        cutoff = self.min_cutoff + self.beta * np.linalg.norm(self.velocity)
+        a = smoothing_factor(cutoff, dt)
+        self.value = a * value + (1 - a) * self.value
+        return self.value
+
+
+class ConstantVelocityPredictor:
+    """Push the position ahead along its current velocity to hide pipeline latency"""
+
+    def __init__(self, lead_time=0.03, max_lead_px=80):
+        self.lead_time = lead_time  # Seconds to predict ahead, roughly the capture-to-cursor latency
+        self.max_lead_px = max_lead_px  # Cap so a noisy velocity cannot fling the cursor
+
+    def __call__(self, value, velocity):
+        lead = velocity * self.lead_time
+        length = np.linalg.norm(lead)
+        if length > self.max_lead_px:
+            lead *= self.max_lead_px / length
+        return value + lead
+
+
+class DeadZone:
+    """Hold the cursor still until the target leaves a small radius around it"""
+
+    def __init__(self, radius=6):
+        self.radius = radius
+        self.reset()
+
+    def reset(self):
+        self.value = None
+
+    def __call__(self, value):
+        if self.value is None:
+            self.value = np.array(value, dtype=np.float64)
+            return self.value
+        offset = value - self.value
+        distance = np.linalg.norm(offset)
+        if distance > self.radius:
+            # Follow by the amount past the edge so leaving the zone is smooth
+            self.value = self.value + offset * (1 - self.radius / distance)
+        return self.value
+
+
+class CursorFilter:
+    """Filtering stage between landmark extraction and cursor actuation"""
+
+    def __init__(self, min_cutoff=1.0, beta=0.01, d_cutoff=1.0, lead_time=0.0, dead_zone=0):
+        self.one_euro = OneEuroFilter(min_cutoff, beta, d_cutoff)
+        self.predictor = ConstantVelocityPredictor(lead_time) if lead_time else None
+        self.dead_zone = DeadZone(dead_zone) if dead_zone else None
+
+    def reset(self):
+        """Forget history, e.g. after the face was lost"""
+        self.one_euro.reset()
+        if self.dead_zone:
+            self.dead_zone.reset()
+
+    def __call__(self, value, timestamp):
+        """Filter one (x, y) screen position sampled at timestamp (seconds)"""
+        value = self.one_euro(value, timestamp)
+        if self.predictor:
+            value = self.predictor(value, self.one_euro.velocity)
+        if self.dead_zone:
+            value = self.dead_zone(value)
+        return value
+
+
+class MovingAverage:
+    """Plain moving average, kept as the baseline in the benchmark"""
+
+    def __init__(self, window=5):
+        self.window = window
+        self.samples = []
+
+    def reset(self):
+        self.samples = []
+
+    def __call__(self, value, timestamp):
+        self.samples.append(np.asarray(value, dtype=np.float64))
+        self.samples = self.samples[-self.window:]
+        return np.mean(self.samples, axis=0)
+
+
+def apply_filter(cursor_filter, trace):
+    """Run an (N, 3) array of (timestamp, x, y) samples through cursor_filter"""
+    cursor_filter.reset()
+    return np.array([cursor_filter(sample[1:], sample[0]) for sample in trace])
+
+
+def lag_and_jitter(filtered, reference, dt, still_speed=150, max_shift=20):
+    """Return (lag_ms, jitter_px) of filtered against a reference path
+
+    Lag is the delay that best aligns filtered to reference while the gaze is moving,
+    jitter is the RMS frame-to-frame cursor movement while the gaze is holding still.
+    """
+    speed = np.linalg.norm(np.gradient(reference, axis=0), axis=1) / dt
+    moving = speed >= still_speed
+    still = ~moving[1:] & ~moving[:-1]
+
+    steps = np.linalg.norm(np.diff(filtered, axis=0), axis=1)
+    jitter = float(np.sqrt(np.mean(steps[still] ** 2))) if still.any() else 0.0
+
+    # Mean squared error on moving samples for every candidate delay (negative means leading)
+    n = len(reference)
+    shifts = np.arange(-max_shift, max_shift + 1)
+    errors = np.full(len(shifts), np.inf)
+    for i, shift in enumerate(shifts):
+        lo, hi = max(0, shift), min(n, n + shift)
+        mask = moving[lo - shift:hi - shift]
+        if mask.any():
+            diff = filtered[lo:hi][mask] - reference[lo - shift:hi - shift][mask]
+            errors[i] = np.mean(np.sum(diff ** 2, axis=1))
+
+    # Parabolic interpolation around the best whole-frame delay for sub-frame resolution
+    best = int(np.argmin(errors))
+    lag = float(shifts[best])
+    if 0 < best < len(shifts) - 1 and np.isfinite(errors[best - 1:best + 2]).all():
+        left, centre, right = errors[best - 1:best + 2]
+        curvature = left - 2 * centre + right
+        if curvature > 0:
+            lag += 0.5 * (left - right) / curvature
+    return lag * dt * 1000 + 0.0, jitter
+
+
+def synthetic_trace(duration=10.0, fps=30, noise_px=6.0, seed=0):
+    """Fixations joined by quick glides, plus iris jitter. Returns (trace, true_path)"""
+    rng = np.random.default_rng(seed)
+    times = np.arange(0, duration, 1 / fps)
+    targets = rng.uniform((100, 100), (1800, 1000), size=(int(duration) + 1, 2))
+    path = np.empty((len(times), 2))
+    for i, t in enumerate(times):
+        k = int(t)
+        blend = min(1.0, (t - k) / 0.25)  # 250 ms glide, then hold
+        blend = blend * blend * (3 - 2 * blend)
+        path[i] = targets[k] * (1 - blend) + targets[k + 1] * blend
+    noisy = path + rng.normal(0, noise_px, path.shape)
+    return np.column_stack([times, noisy]), path
+
+
+def centred_average(points, half_window=3):
+    """Zero-lag smoothed estimate of the true path for recorded traces with no ground truth"""
+    kernel = np.ones(2 * half_window + 1) / (2 * half_window + 1)
+    padded = np.pad(points, ((half_window, half_window), (0, 0)), mode="edge")
+    return np.column_stack([np.convolve(padded[:, i], kernel, mode="valid") for i in range(2)])
+
+
+def benchmark(trace, reference):
+    dt = float(np.median(np.diff(trace[:, 0])))
+    candidates = [
+        ("raw", None),
+        ("moving average (5)", MovingAverage(5)),
+        ("one euro", CursorFilter()),
+        ("one euro + dead zone", CursorFilter(dead_zone=6)),
+        ("one euro + predictor", CursorFilter(lead_time=0.05)),
+        ("one euro + predictor + dead zone", CursorFilter(lead_time=0.05, dead_zone=6)),
+    ]
+    print(f"{'filter':34s} {'lag ms':>8s} {'jitter px':>10s}")
+    for name, cursor_filter in candidates:
+        filtered = trace[:, 1:] if cursor_filter is None else apply_filter(cursor_filter, trace)
+        lag_ms, jitter_px = lag_and_jitter(filtered, reference, dt)
+        print(f"{name:34s} {lag_ms:8.1f} {jitter_px:10.2f}")
+
+
+if __name__ == "__main__":
+    # python cursor_filter.py [trace.npy]  -- trace is an (N, 3) array of (timestamp, x, y)
+    if len(sys.argv) > 1:
+        bench_trace = np.load(sys.argv[1])
+        bench_reference = centred_average(bench_trace[:, 1:])
+    else:
+        bench_trace, bench_reference = synthetic_trace()
+    benchmark(bench_trace, bench_reference)
@@ -0,0 +1,127 @@
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import pygame
+
+
+class FrameConverter:
+    """Mirror and convert camera frames to RGB in a pool of reused buffers
+
+    The same RGB buffer is fed to FaceMesh, drawn on, and shown by pygame through a surface
+    that shares its memory, so a frame is converted once and never copied again before the blit.
+    """
+
+    def __init__(self, pool_size=4):
+        self.pool_size = pool_size
+        self.buffers = []
+        self.surfaces = {}  # Buffer index -> pygame surface sharing that buffer
+        self.scaled = None  # Reused target when the preview is shown at a different size
+        self.pinned = set()  # Buffers a consumer is still showing, never overwritten
+        self.next_index = 0
+        self.generation = 0  # Bumped whenever the pool is replaced, buffer indices from before are stale
+
+        self.frames_converted = 0
+        self.bytes_allocated = 0
+
+    def _allocate(self, shape):
+        self.buffers = [np.empty(shape, dtype=np.uint8) for _ in range(self.pool_size)]
+        self.surfaces = {}
+        self.pinned = set()
+        self.generation += 1
+        self.bytes_allocated += self.pool_size * int(np.prod(shape))
+
+    def convert(self, bgr_frame):
+        """Mirror bgr_frame into the next free RGB buffer, returns (buffer_index, rgb_frame)"""
+        if not self.buffers or self.buffers[0].shape != bgr_frame.shape:
+            # First frame or the capture resolution changed
+            self._allocate(bgr_frame.shape)
+
+        index = self.next_index
+        for _ in range(self.pool_size):
+            if index not in self.pinned:
+                break
+            index = (index + 1) % self.pool_size
+        self.next_index = (index + 1) % self.pool_size
+
+        rgb = self.buffers[index]
+        cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        cv2.flip(rgb, 1, dst=rgb)  # In place
+        self.frames_converted += 1
+        return index, rgb
+
+    def surface(self, index):
+        """pygame surface backed by buffer index, created once per buffer"""
+        surface = self.surfaces.get(index)
+        if surface is None:
+            rgb = self.buffers[index]
+            surface = pygame.image.frombuffer(rgb, (rgb.shape[1], rgb.shape[0]), "RGB")
+            self.surfaces[index] = surface
+        return surface
+
+    def display_surface(self, index, size):
+        """Surface for buffer index at size, scaled into a reused surface when the capture is smaller"""
+        surface = self.surface(index)
+        if surface.get_size() == tuple(size):
+            return surface
+        if self.scaled is None or self.scaled.get_size() != tuple(size):
+            self.scaled = pygame.Surface(size, 0, surface)  # Same pixel format, as transform.scale needs
+        pygame.transform.scale(surface, size, self.scaled)
+        return self.scaled
+
+    def pin(self, index):
+        """Show buffer index and release the one shown before it"""
+        self.pinned = {index}
+
+    def stats(self):
+        return {
+            "frames": self.frames_converted,
+            "bytes_allocated": self.bytes_allocated,
+            "bytes_per_frame": self.bytes_allocated / self.frames_converted if self.frames_converted else 0.0,
+        }
+
+
+def measure(convert, frames):
+    """Return (ms per frame, bytes allocated per frame) for a conversion function"""
+    start = time.perf_counter()
+    for frame in frames:
+        convert(frame)
+    elapsed = time.perf_counter() - start
+
+    # numpy and OpenCV allocations are visible to tracemalloc
+    allocated = 0
+    tracemalloc.start()
+    for frame in frames:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        convert(frame)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+    tracemalloc.stop()
+    return elapsed / len(frames) * 1000, allocated / len(frames)
+
+
+if __name__ == "__main__":
+    # Compare the old display path with the converter on synthetic 640x480 frames
+    pygame.init()
+    pygame.display.set_mode((640, 480))
+    test_frames = [np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(100)]
+
+    def old_path(frame):
+        frame = cv2.flip(frame, 1)
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # Inference input
+        display = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return pygame.surfarray.make_surface(np.rot90(display)), rgb
+
+    converter = FrameConverter()
+
+    def new_path(frame):
+        index, rgb = converter.convert(frame)
+        return converter.surface(index), rgb
+
+    new_path(test_frames[0])  # Allocate the pool outside the measurement
+    for name, path in (("cvtColor + rot90 + make_surface", old_path), ("FrameConverter", new_path)):
+        ms, allocated = measure(path, test_frames)
+        print(f"{name:32s} {ms:6.2f} ms/frame  {allocated / 1024:8.1f} KiB allocated/frame")
+    print(converter.stats())
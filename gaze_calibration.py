@@ -0,0 +1,279 @@
+import sys
+import time
+
+import numpy as np
+
+from landmarks import gaze_features
+
+
+def grid_targets(rows=3, cols=3, margin=0.08):
+    """Calibration targets in normalised screen coordinates, row by row, corners included"""
+    xs = np.linspace(margin, 1 - margin, cols)
+    ys = np.linspace(margin, 1 - margin, rows)
+    return [(float(x), float(y)) for y in ys for x in xs]
+
+
+def design_matrix(eye, head):
+    """Quadratic terms of the eye position and linear terms of the head position, one row per sample"""
+    ex, ey = eye[:, 0], eye[:, 1]
+    return np.column_stack([np.ones(len(eye)), ex, ey, ex * ex, ex * ey, ey * ey, head[:, 0], head[:, 1]])
+
+
+def fit_gaze_mapping(features, targets, head_ridge=0.01, lut_size=64, margin=0.5):
+    """Least-squares fit of screen positions to GazeFeatures, baked into a GazeMapping
+
+    features is (N, 4) and targets (N, 2) in normalised screen coordinates. Features are
+    standardised first; head_ridge pulls the head terms towards zero when the user kept their
+    head still, so noise in the head position isn't amplified into cursor movement.
+    """
+    features = np.asarray(features, np.float64)
+    targets = np.asarray(targets, np.float64)
+    mean = features.mean(axis=0)
+    scale = np.maximum(features.std(axis=0), 1e-6)
+    z = (features - mean) / scale
+    rows = design_matrix(z[:, :2], z[:, 2:])
+    # Ridge rows for the two head columns: sqrt(lambda * N) * I against zero targets
+    ridge = np.zeros((2, rows.shape[1]))
+    ridge[:, 6:] = np.eye(2) * np.sqrt(head_ridge * len(rows))
+    coefficients = np.linalg.lstsq(np.vstack([rows, ridge]), np.vstack([targets, np.zeros((2, 2))]), rcond=None)[0]
+
+    low = z[:, :2].min(axis=0)
+    high = z[:, :2].max(axis=0)
+    span = high - low
+    return GazeMapping(coefficients, mean, scale, low - span * margin, high + span * margin, lut_size)
+
+
+class GazeMapping:
+    """Calibrated map from GazeFeatures to a normalised screen position
+
+    The quadratic eye part is evaluated once over a grid covering the calibrated range (plus a
+    margin) when the mapping is built, so per frame it is a bilinear lookup in that table plus
+    the linear head term, a few float operations. Outside the table the edge values are used.
+    """
+
+    def __init__(self, coefficients, mean, scale, low, high, lut_size=64):
+        self.coefficients = np.asarray(coefficients, np.float64)
+        self.mean = np.asarray(mean, np.float64)
+        self.scale = np.asarray(scale, np.float64)
+        self.low = np.asarray(low, np.float64)
+        self.high = np.asarray(high, np.float64)
+        self.lut_size = lut_size
+
+        xs = np.linspace(self.low[0], self.high[0], lut_size)
+        ys = np.linspace(self.low[1], self.high[1], lut_size)
+        grid_x, grid_y = np.meshgrid(xs, ys)
+        eye = np.column_stack([grid_x.ravel(), grid_y.ravel()])
+        rows = design_matrix(eye, np.zeros_like(eye))
+        self.lut = (rows[:, :6] @ self.coefficients[:6]).reshape(lut_size, lut_size, 2)
+
+        # Plain floats for the per-frame path, numpy scalar arithmetic costs more than it saves here
+        self.table = self.lut.tolist()
+        step = (self.high - self.low) / (lut_size - 1)
+        # Raw feature -> table cell: (feature - mean) / scale - low, divided by the cell size
+        self.cell_gain = (1 / (self.scale[:2] * step)).tolist()
+        self.cell_offset = (-(self.mean[:2] / self.scale[:2] + self.low) / step).tolist()
+        head = self.coefficients[6:] / self.scale[2:, None]
+        self.head_gain = head.tolist()
+        self.head_offset = (-(self.mean[2:] @ head)).tolist()
+
+    def __call__(self, features):
+        """Normalised (x, y) screen position for one GazeFeatures, clipped to the screen"""
+        eye_x, eye_y, head_x, head_y = features
+        last = self.lut_size - 1.000001
+        u = min(max(eye_x * self.cell_gain[0] + self.cell_offset[0], 0.0), last)
+        v = min(max(eye_y * self.cell_gain[1] + self.cell_offset[1], 0.0), last)
+        i = int(u)
+        j = int(v)
+        fu = u - i
+        fv = v - j
+        top = self.table[j]
+        bottom = self.table[j + 1]
+        a, b, c, d = top[i], top[i + 1], bottom[i], bottom[i + 1]
+        (hxx, hxy), (hyx, hyy) = self.head_gain
+        x = ((a[0] * (1 - fu) + b[0] * fu) * (1 - fv) + (c[0] * (1 - fu) + d[0] * fu) * fv
+             + head_x * hxx + head_y * hyx + self.head_offset[0])
+        y = ((a[1] * (1 - fu) + b[1] * fu) * (1 - fv) + (c[1] * (1 - fu) + d[1] * fu) * fv
+             + head_x * hxy + head_y * hyy + self.head_offset[1])
+        return min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+
+    def predict(self, features):
+        """Evaluate the fitted polynomial directly for an (N, 4) array, without the table or clipping"""
+        z = (np.asarray(features, np.float64) - self.mean) / self.scale
+        return design_matrix(z[:, :2], z[:, 2:]) @ self.coefficients
+
+    def error(self, features, targets, size=(1, 1)):
+        """RMS distance between the mapped features and targets, scaled by size (e.g. screen pixels)"""
+        mapped = np.array([self(sample) for sample in np.asarray(features).tolist()])
+        return float(np.sqrt(np.mean(np.sum(((mapped - targets) * size) ** 2, axis=1))))
+
+    def save(self, path):
+        np.savez(path, coefficients=self.coefficients, mean=self.mean, scale=self.scale, low=self.low,
+                 high=self.high, lut_size=self.lut_size)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["coefficients"], data["mean"], data["scale"], data["low"], data["high"],
+                       int(data["lut_size"]))
+
+
+class CalibrationSession:
+    """Collect gaze features while the user looks at each target in turn
+
+    For every target the first settle seconds are skipped while the eyes move and settle, then
+    samples frames are kept. Feed it one update() per landmark snapshot; target is None once
+    every target has its samples.
+    """
+
+    def __init__(self, targets=None, settle=0.7, samples=20):
+        self.targets = targets or grid_targets()
+        self.settle = settle
+        self.samples = samples
+        self.index = 0
+        self.target_start = None
+        self.collected = 0  # Samples kept for the current target
+        self.features = []  # (target index, GazeFeatures)
+
+    @property
+    def target(self):
+        return self.targets[self.index] if self.index < len(self.targets) else None
+
+    def progress(self, timestamp):
+        """Fraction of the current target done, for drawing"""
+        if self.target_start is None or timestamp - self.target_start < self.settle:
+            return 0.0
+        return self.collected / self.samples
+
+    def update(self, features, timestamp):
+        if self.target is None:
+            return
+        if self.target_start is None:
+            self.target_start = timestamp
+        if timestamp - self.target_start < self.settle:
+            return
+        self.features.append((self.index, features))
+        self.collected += 1
+        if self.collected >= self.samples:
+            self.index += 1
+            self.target_start = None
+            self.collected = 0
+
+    def arrays(self, outlier_mad=3.0):
+        """(features, targets) arrays, without samples far from their target's median (blinks, glances)"""
+        indices = np.array([index for index, _ in self.features])
+        features = np.array([sample for _, sample in self.features], np.float64)
+        keep = np.ones(len(features), bool)
+        for index in np.unique(indices):
+            rows = indices == index
+            eye = features[rows, :2]
+            distance = np.linalg.norm(eye - np.median(eye, axis=0), axis=1)
+            mad = np.median(distance) + 1e-9
+            keep[np.nonzero(rows)[0][distance > outlier_mad * mad]] = False
+        targets = np.array(self.targets, np.float64)[indices]
+        return features[keep], targets[keep]
+
+    def fit(self, **kwargs):
+        features, targets = self.arrays()
+        return fit_gaze_mapping(features, targets, **kwargs)
+
+
+def run_calibration(face_worker, font, session=None):
+    """Show the targets full screen and feed the session from face_worker until it is done
+
+    Returns the session, or None if the user pressed Escape. The caller restores its own window.
+    """
+    import pygame
+
+    session = session or CalibrationSession()
+    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+    width, height = screen.get_size()
+    last_snapshot_id = 0
+    while session.target is not None:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                return None
+        snapshot = face_worker.wait_snapshot(after_id=last_snapshot_id, timeout=1 / 30)
+        now = time.perf_counter()
+        if snapshot is not None:
+            last_snapshot_id = snapshot.frame_id
+            now = snapshot.capture_time
+            if snapshot.landmarks is not None:
+                session.update(gaze_features(snapshot.landmarks), now)
+        if session.target is None:
+            break
+
+        screen.fill((0, 0, 0))
+        x, y = int(session.target[0] * width), int(session.target[1] * height)
+        # The dot shrinks while samples are taken, which draws the eye to its centre
+        radius = int(20 - 14 * session.progress(now))
+        pygame.draw.circle(screen, (255, 255, 0), (x, y), radius)
+        pygame.draw.circle(screen, (255, 0, 0), (x, y), 3)
+        label = font.render(f"Look at the dot ({session.index + 1}/{len(session.targets)}), Esc cancels", True,
+                            (255, 255, 255))
+        screen.blit(label, (width // 2 - label.get_width() // 2, height // 2 + 40))
+        pygame.display.flip()
+    return session
+
+
+def synthetic_session(seed=0, head_motion=0.01, noise=0.004, samples=30, targets=None):
+    """(features, targets) of a simulated user, for benchmarks
+
+    The eyes map onto the screen through a mildly non-linear function and the head drifts by
+    head_motion (normalised image units), shifting the gaze on screen with it.
+    """
+    rng = np.random.default_rng(seed)
+    targets = np.repeat(np.array(targets or grid_targets()), samples, axis=0)
+    head = 0.5 + rng.normal(0, head_motion, (len(targets), 2))
+    # Turning the head moves the gaze on screen; the eyes make up the rest
+    eye_part = targets - (head - 0.5) * 6.0
+    centred = eye_part - 0.5
+    eye_x = 0.16 * centred[:, 0] - 0.05 * centred[:, 0] ** 3 + 0.01 * centred[:, 0] * centred[:, 1]
+    eye_y = 0.07 * centred[:, 1] + 0.02 * centred[:, 1] ** 2
+    features = np.column_stack([eye_x, eye_y, head]) + rng.normal(0, [noise, noise, noise / 4, noise / 4],
+                                                                   (len(targets), 4))
+    return features, targets
+
+
+def benchmark(screen_size=(1920, 1080)):
+    size = np.array(screen_size)
+    features, targets = synthetic_session(seed=0)
+    start = time.perf_counter()
+    mapping = fit_gaze_mapping(features, targets)
+    fit_time = time.perf_counter() - start
+
+    # Held-out gaze anywhere on the screen, not just on the calibration targets
+    rng = np.random.default_rng(1)
+    test_features, test_targets = synthetic_session(seed=2, samples=1, targets=rng.uniform(0.05, 0.95, (500, 2)).tolist())
+    direct = np.clip(mapping.predict(test_features), 0, 1)
+    direct_error = float(np.sqrt(np.mean(np.sum(((direct - test_targets) * size) ** 2, axis=1))))
+    table_error = mapping.error(test_features, test_targets, size)
+    # Without calibration the cursor is the iris position in the frame scaled to the screen
+    raw = test_features[:, 2:] + test_features[:, :2] * 0.06
+    raw_error = float(np.sqrt(np.mean(np.sum(((raw - test_targets) * size) ** 2, axis=1))))
+    raw_span = (raw.max(axis=0) - raw.min(axis=0)) / (test_targets.max(axis=0) - test_targets.min(axis=0))
+
+    samples = [tuple(row) for row in test_features.tolist()]
+    start = time.perf_counter()
+    for row in np.asarray(test_features):
+        np.clip(mapping.predict(row[None]), 0, 1)
+    direct_time = (time.perf_counter() - start) / len(samples)
+    start = time.perf_counter()
+    for sample in samples:
+        mapping(sample)
+    table_time = (time.perf_counter() - start) / len(samples)
+
+    print(f"Fit: {len(features)} samples on {len(grid_targets())} targets in {fit_time * 1000:.2f} ms")
+    print(f"Raw iris position: {raw_error:.0f} px RMS, reaches {raw_span[0]:.0%} x {raw_span[1]:.0%} of the screen")
+    print(f"Calibrated:        {table_error:.0f} px RMS with the table, {direct_error:.0f} px evaluating the "
+          f"polynomial (screen {screen_size[0]}x{screen_size[1]})")
+    print(f"Per frame: polynomial {direct_time * 1e6:.1f} us, table {table_time * 1e6:.2f} us "
+          f"({mapping.lut.nbytes // 1024} KB table)")
+
+
+if __name__ == "__main__":
+    # python gaze_calibration.py [calibration.npz]: fit error and per-frame cost, or a saved calibration's coefficients
+    if len(sys.argv) > 1:
+        saved = GazeMapping.load(sys.argv[1])
+        print(f"Eye range {saved.low} .. {saved.high} (standardised), coefficients:\n{saved.coefficients}")
+    else:
+        benchmark()
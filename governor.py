@@ -0,0 +1,129 @@
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+
+# One step of the quality ladder. preview_every shows one in n snapshots in the pygame window.
+GovernorLevel = namedtuple("GovernorLevel", ["name", "resolution", "inference_stride", "preview_every"])
+
+LEVELS = [
+    GovernorLevel("full", (640, 480), 1, 1),
+    GovernorLevel("half preview", (640, 480), 1, 2),
+    GovernorLevel("low res", (320, 240), 1, 2),
+    GovernorLevel("low res, half rate", (320, 240), 2, 3),
+    GovernorLevel("minimal", (320, 240), 3, 4),
+]
+
+
+class Governor:
+    """Trade capture resolution, inference rate and preview rate for CPU time
+
+    The main loop reports the cost of each frame it handles. Once per interval the governor
+    compares the p90 frame cost (FaceMesh plus the loop's own work) with the latency budget and
+    the CPU use of the vision pipeline with its target. Over either one it steps down a level
+    straight away; it steps back up only after a longer calm period, so it does not oscillate.
+
+    The CPU use counts only the threads the levels can relieve: the capture thread, the FaceMesh
+    worker and the frame loop, which calls update(). Speech, audio and actuation threads are left
+    out, as is the graph mediapipe runs on its own threads, which the frame cost already covers.
+    """
+
+    def __init__(self, capture, face_worker, budget_ms=25, cpu_target=0.6, levels=LEVELS, interval=1.0,
+                 recover_after=5.0, history=120):
+        self.capture = capture
+        self.face_worker = face_worker
+        self.budget = budget_ms / 1000
+        self.cpu_target = cpu_target  # Cores used by the pipeline threads, e.g. 0.6 of one core
+        self.levels = levels
+        self.interval = interval
+        self.recover_after = recover_after  # Seconds under budget before stepping back up
+
+        self.level_index = 0
+        self.resolution = None
+        self.loop_costs = deque(maxlen=history)
+        self.frame_cost = 0.0  # p90 seconds per frame over the last interval
+        self.cpu_load = 0.0
+        self.last_check = time.perf_counter()
+        self.last_cpu = self._pipeline_cpu()
+        self.last_frames = face_worker.frames_processed
+        self.calm_since = None
+        self.previews = 0
+        self.changes = 0
+        self._apply()
+
+    @property
+    def level(self):
+        return self.levels[self.level_index]
+
+    def _apply(self):
+        level = self.level
+        if level.resolution != self.resolution:
+            self.resolution = level.resolution
+            self.capture.request_resolution(*level.resolution)
+        self.face_worker.inference_stride = level.inference_stride
+
+    def _pipeline_cpu(self):
+        """CPU seconds of the capture, inference and frame loop threads (update() runs on the loop)"""
+        return time.thread_time() + self.capture.cpu_time + self.face_worker.cpu_time
+
+    def frame_done(self, seconds):
+        """Record how long the main loop spent on a frame (tracking and drawing)"""
+        self.loop_costs.append(seconds)
+
+    def preview_due(self):
+        """Whether this snapshot should be shown, given the current preview rate"""
+        self.previews += 1
+        return self.previews % self.level.preview_every == 0
+
+    def update(self, now=None):
+        """Re-evaluate at most once per interval, returns True when the level changed"""
+        now = time.perf_counter() if now is None else now
+        elapsed = now - self.last_check
+        if elapsed < self.interval:
+            return False
+        cpu = self._pipeline_cpu()
+        self.cpu_load = (cpu - self.last_cpu) / elapsed
+        self.last_cpu = cpu
+        self.last_check = now
+
+        # Only the FaceMesh runs since the last check
+        frames = self.face_worker.frames_processed
+        new_frames, self.last_frames = frames - self.last_frames, frames
+        inference = list(self.face_worker.inference_durations)[-new_frames:] if new_frames else []
+        inference_cost = np.percentile(inference, 90) if inference else 0.0
+        loop_cost = np.percentile(self.loop_costs, 90) if self.loop_costs else 0.0
+        self.frame_cost = float(inference_cost + loop_cost)
+        self.loop_costs.clear()
+
+        over = self.frame_cost > self.budget or self.cpu_load > self.cpu_target
+        calm = self.frame_cost < 0.6 * self.budget and self.cpu_load < 0.6 * self.cpu_target
+        if over:
+            self.calm_since = None
+            return self._step(1)
+        if not calm:
+            self.calm_since = None
+            return False
+        if self.calm_since is None:
+            self.calm_since = now
+        if now - self.calm_since >= self.recover_after:
+            self.calm_since = now
+            return self._step(-1)
+        return False
+
+    def _step(self, direction):
+        index = min(max(self.level_index + direction, 0), len(self.levels) - 1)
+        if index == self.level_index:
+            return False
+        self.level_index = index
+        self.changes += 1
+        self._apply()
+        print(f"Governor: {self.level.name} (frame cost {self.frame_cost * 1000:.1f} ms, "
+              f"CPU {self.cpu_load * 100:.0f}%)")
+        return True
+
+    def status_text(self):
+        level = self.level
+        width, height = level.resolution
+        return (f"Perf: {width}x{height}, FaceMesh 1/{level.inference_stride}, "
+                f"preview 1/{level.preview_every} ({self.frame_cost * 1000:.0f} ms, {self.cpu_load * 100:.0f}% CPU)")
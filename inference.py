@@ -0,0 +1,264 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+from frame_convert import FrameConverter
+from instrumentation import profiler
+from landmarks import landmarks_to_array
+
+
+# Result of running FaceMesh on one captured frame.
+# frame is the mirrored RGB image the landmarks refer to, held in converter buffer buffer_index of
+# converter generation generation (the index means nothing once the pool has been reallocated),
+# landmarks is an (N, 3) float32 array of normalised coordinates (see landmarks.py) or None when
+# no face was found, and roi is the (x0, y0, x1, y1) crop that was fed to FaceMesh, or None for a
+# full-frame pass.
+LandmarkSnapshot = namedtuple(
+    "LandmarkSnapshot",
+    ["frame_id", "capture_time", "inference_time", "frame", "landmarks", "roi", "buffer_index",
+     "generation"]
+)
+
+
+class FaceRoiTracker:
+    """Crop inference input to the area around the face found in the previous frame"""
+
+    def __init__(self, margin=0.3, max_input_size=256, min_box_size=96):
+        self.margin = margin  # Extra border around the landmark box, as a fraction of its size
+        self.max_input_size = max_input_size  # Longest side of the crop handed to FaceMesh
+        self.min_box_size = min_box_size
+        self.box = None  # (x0, y0, x1, y1) in full-frame pixels, None when tracking is lost
+
+        self.cropped_passes = 0
+        self.full_passes = 0
+        self.pixels_processed = 0
+
+    def crop(self, rgb_frame):
+        """Return the image to run FaceMesh on and the box it was cut from (None for full frame)"""
+        if self.box is None:
+            self.full_passes += 1
+            self.pixels_processed += rgb_frame.shape[0] * rgb_frame.shape[1]
+            return rgb_frame, None
+
+        x0, y0, x1, y1 = self.box
+        crop = rgb_frame[y0:y1, x0:x1]
+        box_w, box_h = x1 - x0, y1 - y0
+        scale = self.max_input_size / max(box_w, box_h)
+        if scale < 1:
+            crop = cv2.resize(crop, (max(1, round(box_w * scale)), max(1, round(box_h * scale))),
+                              interpolation=cv2.INTER_AREA)
+        else:
+            # FaceMesh needs a contiguous buffer
+            crop = np.ascontiguousarray(crop)
+        self.cropped_passes += 1
+        self.pixels_processed += crop.shape[0] * crop.shape[1]
+        return crop, self.box
+
+    def update(self, points, roi, frame_w, frame_h):
+        """Map an (N, 3) landmark array from the crop back to the full frame and track the face box"""
+        if points is None:
+            self.box = None  # Tracking lost, the next frame gets a full-frame pass
+            return None
+
+        if roi is not None:
+            # Normalised crop coordinates -> normalised full-frame coordinates
+            x0, y0, x1, y1 = roi
+            box_w, box_h = x1 - x0, y1 - y0
+            points *= (box_w / frame_w, box_h / frame_h, box_w / frame_w)
+            points[:, 0] += x0 / frame_w
+            points[:, 1] += y0 / frame_h
+
+        left, top = points[:, :2].min(axis=0) * (frame_w, frame_h)
+        right, bottom = points[:, :2].max(axis=0) * (frame_w, frame_h)
+        self._set_box(left, top, right, bottom, frame_w, frame_h)
+        return points
+
+    def _set_box(self, left, top, right, bottom, frame_w, frame_h):
+        # Square box around the face, grown by the margin and clamped to the frame
+        size = max(right - left, bottom - top) * (1 + 2 * self.margin)
+        size = min(max(size, self.min_box_size), frame_w, frame_h)
+        centre_x, centre_y = (left + right) / 2, (top + bottom) / 2
+        x0 = int(min(max(centre_x - size / 2, 0), frame_w - size))
+        y0 = int(min(max(centre_y - size / 2, 0), frame_h - size))
+        self.box = (x0, y0, x0 + int(size), y0 + int(size))
+
+    def reset(self):
+        self.box = None
+
+    def stats(self):
+        passes = self.cropped_passes + self.full_passes
+        return {
+            "cropped_passes": self.cropped_passes,
+            "full_passes": self.full_passes,
+            "pixels_per_pass": self.pixels_processed / passes if passes else 0.0,
+        }
+
+
+class FaceMeshWorker:
+    """Run FaceMesh on the newest captured frame on a background thread"""
+
+    def __init__(self, capture, face_mesh=None, roi_tracker=None, converter=None, history=300):
+        self.capture = capture
+        self.face_mesh = face_mesh  # None: imported and built on the worker thread when it starts
+        self.load_time = None  # Seconds that took
+        self.roi_tracker = roi_tracker
+        self.converter = converter or FrameConverter()
+        self.recorder = None  # Optional replay.SessionRecorder
+        self.inference_stride = 1  # Run FaceMesh at most once every n captured frames
+        self.last_inferred_id = 0
+        self.frame_shape = None
+        self.lock = threading.Lock()
+        self.snapshot_ready = threading.Condition(self.lock)
+        self.latest = None
+        self.running = False
+        self.finished = False
+        self.error = None  # Why the worker stopped early, e.g. mediapipe failed to load
+        self.thread = None
+
+        # Timing history in seconds
+        self.inference_durations = deque(maxlen=history)
+        self.cursor_latencies = deque(maxlen=history)  # Capture to cursor move
+        self.frames_processed = 0
+        self.frames_skipped = 0  # Left out because of inference_stride
+        self.start_time = None
+        self.cpu_time = 0.0  # CPU seconds used by the worker thread since the model was loaded
+
+    def start(self):
+        self.running = True
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self._inference_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def _load_face_mesh(self):
+        start = time.perf_counter()
+        import mediapipe as mp
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+        self.load_time = time.perf_counter() - start
+
+    def _inference_loop(self):
+        if self.face_mesh is None:
+            # Overlaps the mediapipe import and model setup with opening the camera and the window
+            try:
+                self._load_face_mesh()
+            except Exception as e:
+                self.error = f"Could not start face mesh: {e}"
+                print(self.error)
+                self.running = False
+        cpu_start = time.thread_time()
+        while self.running:
+            self.cpu_time = time.thread_time() - cpu_start
+            captured = self.capture.read_new(timeout=0.1)
+            if captured is None:
+                if self.capture.finished:
+                    break
+                continue
+            if captured.frame_id - self.last_inferred_id < self.inference_stride:
+                self.frames_skipped += 1
+                continue
+            self.last_inferred_id = captured.frame_id
+            if captured.image.shape != self.frame_shape:
+                # The capture resolution changed, the face box is in old pixel coordinates
+                self.frame_shape = captured.image.shape
+                if self.roi_tracker is not None:
+                    self.roi_tracker.reset()
+
+            # Mirrored once into a reused RGB buffer that also backs the preview
+            with profiler.span("inference.convert"):
+                buffer_index, rgb_frame = self.converter.convert(captured.image)
+            start = time.perf_counter()
+            try:
+                landmarks, roi = self._detect(rgb_frame, captured.frame_id)
+            except Exception as e:
+                print(f"Error in face mesh inference: {e}")
+                continue
+            done = time.perf_counter()
+            if self.recorder is not None:
+                self.recorder.add_landmarks(captured.timestamp, landmarks, rgb_frame.shape)
+
+            snapshot = LandmarkSnapshot(captured.frame_id, captured.timestamp, done, rgb_frame, landmarks, roi,
+                                        buffer_index, self.converter.generation)
+
+            with self.lock:
+                self.latest = snapshot
+                self.frames_processed += 1
+                self.inference_durations.append(done - start)
+                self.snapshot_ready.notify_all()
+
+        with self.lock:
+            self.finished = True
+            self.snapshot_ready.notify_all()
+
+    def _run_face_mesh(self, image):
+        with profiler.span("inference.face_mesh"):
+            landmark_points = self.face_mesh.process(image).multi_face_landmarks
+        if not landmark_points:
+            return None
+        # Converted once here so the frame loop only ever does vectorised maths
+        with profiler.span("inference.landmarks"):
+            return landmarks_to_array(landmark_points[0].landmark)
+
+    def _detect(self, rgb_frame, frame_id):
+        if self.roi_tracker is None:
+            return self._run_face_mesh(rgb_frame), None
+
+        frame_h, frame_w = rgb_frame.shape[:2]
+        image, roi = self.roi_tracker.crop(rgb_frame)
+        landmarks = self._run_face_mesh(image)
+        if landmarks is None and roi is not None:
+            # Lost the face inside the crop, retry this frame on the full image
+            self.roi_tracker.reset()
+            image, roi = self.roi_tracker.crop(rgb_frame)
+            landmarks = self._run_face_mesh(image)
+        return self.roi_tracker.update(landmarks, roi, frame_w, frame_h), roi
+
+    def get_snapshot(self, after_id=0):
+        """Return the newest snapshot if it is newer than after_id, without blocking"""
+        with self.lock:
+            if self.latest is not None and self.latest.frame_id > after_id:
+                return self.latest
+            return None
+
+    def wait_snapshot(self, after_id=0, timeout=None):
+        """Wait up to timeout for a snapshot newer than after_id"""
+        with self.lock:
+            self.snapshot_ready.wait_for(
+                lambda: (self.latest is not None and self.latest.frame_id > after_id) or self.finished,
+                timeout=timeout,
+            )
+            if self.latest is not None and self.latest.frame_id > after_id:
+                return self.latest
+            return None
+
+    def mark_actuated(self, snapshot):
+        """Record the capture-to-cursor latency once the cursor has moved for snapshot"""
+        latency = time.perf_counter() - snapshot.capture_time
+        with self.lock:
+            self.cursor_latencies.append(latency)
+        return latency
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0
+        with self.lock:
+            inference_ms = np.array(self.inference_durations) * 1000
+            latency_ms = np.array(self.cursor_latencies) * 1000
+            frames = self.frames_processed
+        stats = {"frames": frames, "inference_fps": frames / elapsed if elapsed else 0.0,
+                 "frames_skipped": self.frames_skipped}
+        if len(inference_ms):
+            stats["inference_ms_p50"] = float(np.percentile(inference_ms, 50))
+        if len(latency_ms):
+            stats["latency_ms_p50"] = float(np.percentile(latency_ms, 50))
+            stats["latency_ms_p95"] = float(np.percentile(latency_ms, 95))
+        if self.roi_tracker is not None:
+            stats.update(self.roi_tracker.stats())
+        return stats
@@ -0,0 +1,212 @@
+import bisect
+import json
+import math
+import threading
+import time
+
+
+# Histogram bucket upper edges, log-spaced from 1 us to 10 s with each bucket 5% wider than the last
+BUCKET_EDGES = [1e-6 * 1.05 ** i for i in range(int(math.log(10.0 / 1e-6) / math.log(1.05)) + 2)]
+
+
+class Histogram:
+    """Fixed-size latency histogram, percentiles are accurate to one bucket (5%)"""
+    EDGES = BUCKET_EDGES
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.EDGES) + 1)  # Last bucket catches anything over 10 s
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.EDGES, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the q-th percentile, in seconds"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.EDGES[i], self.max) if i < len(self.EDGES) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """Named timing spans collected into per-stage histograms
+
+    Use as `with profiler.span("stage"):` around hot-path code, or record(name, seconds) for
+    durations measured elsewhere. While disabled, span() returns a shared no-op and record()
+    returns immediately, so the calls can stay in the hot path.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def summary(self):
+        """Return {stage: count/mean/p50/p95/p99/max in milliseconds}, sorted by stage name"""
+        with self.lock:
+            return {name: self.histograms[name].summary() for name in sorted(self.histograms)}
+
+    def dump_jsonl(self, path):
+        """Append the current summary to path as one JSON line"""
+        with open(path, "a") as f:
+            f.write(json.dumps({"time": time.time(), "stages": self.summary()}) + "\n")
+
+
+# Shared by the capture, inference, actuation, voice and UI code
+profiler = Profiler()
+
+
+class StartupTimer:
+    """Seconds from launch to each startup milestone, printed once as each is first reached"""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.marks = {}
+        self.lock = threading.Lock()
+
+    def mark(self, name, at=None):
+        """Record that name was reached now (or at the perf_counter time at); later calls are ignored"""
+        with self.lock:
+            if name in self.marks:
+                return self.marks[name]
+            elapsed = self.marks[name] = (time.perf_counter() if at is None else at) - self.start
+        print(f"Startup: {name} after {elapsed:.2f} s")
+        profiler.record("startup." + name.replace(" ", "_"), elapsed)
+        return elapsed
+
+    def summary(self):
+        """{milestone: seconds since launch}, in the order they were reached"""
+        with self.lock:
+            return dict(sorted(self.marks.items(), key=lambda item: item[1]))
+
+
+# Counts from the first import of this module, which the entry point does before anything heavy
+startup = StartupTimer()
+
+
+class ProfilerOverlay:
+    """Table of per-stage percentiles drawn over the camera view, toggled at runtime"""
+
+    def __init__(self, profiler, font, surfaces, refresh_interval=0.5):
+        self.profiler = profiler
+        self.font = font
+        self.surfaces = surfaces  # render_cache.SurfaceCache
+        self.refresh_interval = refresh_interval
+        self.visible = False
+        self.was_enabled = profiler.enabled  # Whether profiling was on before the overlay was shown (--profile)
+        self.lines = []
+        self.last_refresh = 0
+
+    def toggle(self):
+        """Show or hide the overlay; the profiler only collects while it is shown or profiling was asked for"""
+        self.visible = not self.visible
+        if self.visible:
+            self.was_enabled = self.profiler.enabled
+            self.profiler.enabled = True
+        else:
+            self.profiler.enabled = self.was_enabled
+        self.last_refresh = 0
+
+    def draw(self, target, pos):
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        if now - self.last_refresh >= self.refresh_interval:
+            # Rendering fresh numbers every frame would defeat the surface cache
+            self.lines = [f"{'stage':22s} {'p50':>6s} {'p95':>6s} {'p99':>6s} ms"]
+            for name, stats in self.profiler.summary().items():
+                self.lines.append(f"{name[:22]:22s} {stats['p50_ms']:6.1f} {stats['p95_ms']:6.1f} "
+                                  f"{stats['p99_ms']:6.1f}")
+            self.last_refresh = now
+
+        line_height = self.font.get_linesize()
+        x, y = pos
+        width = max(self.font.size(line)[0] for line in self.lines) + 10
+        target.blit(self.surfaces.box((0, 0, 0), (width, line_height * len(self.lines) + 10)), (x, y))
+        for i, line in enumerate(self.lines):
+            target.blit(self.surfaces.text(self.font, line, (255, 255, 255)), (x + 5, y + 5 + i * line_height))
+
+
+if __name__ == "__main__":
+    # Cost of a span with the profiler disabled and enabled
+    for enabled in (False, True):
+        bench = Profiler(enabled)
+        n = 200000
+        start = time.perf_counter()
+        for _ in range(n):
+            with bench.span("bench"):
+                pass
+        per_span = (time.perf_counter() - start) / n
+        print(f"enabled={enabled}: {per_span * 1e9:.0f} ns per span")
+    print(bench.summary())
@@ -0,0 +1,257 @@
+import sys
+import time
+
+import numpy as np
+
+
+WIDE_KEYS = {"Space": 3, "Backspace": 1.5, "Enter": 1.5, "Clear": 1.5, "Close": 1.5}
+
+
+def layout_rects(layout, x, y, width, height):
+    """(key, row, col, (x, y, w, h)) for every key of a row-by-row layout, rows centered in the area"""
+    key_width = width / max(len(row) for row in layout)
+    key_height = height / len(layout)
+    boxes = []
+    for row_idx, row in enumerate(layout):
+        start_x = x + (width - len(row) * key_width) / 2
+        for key_idx, key in enumerate(row):
+            boxes.append((key, row_idx, key_idx, (start_x + key_idx * key_width, y + row_idx * key_height,
+                                                   key_width * WIDE_KEYS.get(key, 1), key_height)))
+    return boxes
+
+
+class KeyGrid:
+    """Key index for every pixel of the keyboard area, so a hit test is one array read
+
+    Rectangles later in the list win where they overlap, the same as the drawing order.
+    """
+
+    def __init__(self, rects):
+        boxes = [tuple(int(value) for value in rect) for rect in rects]
+        self.x0 = min(x for x, y, w, h in boxes)
+        self.y0 = min(y for x, y, w, h in boxes)
+        x1 = max(x + w for x, y, w, h in boxes)
+        y1 = max(y + h for x, y, w, h in boxes)
+        self.grid = np.full((y1 - self.y0, x1 - self.x0), -1, np.int16)
+        for index, (x, y, w, h) in enumerate(boxes):
+            self.grid[y - self.y0:y - self.y0 + h, x - self.x0:x - self.x0 + w] = index
+
+    def lookup(self, x, y):
+        """Index of the key at window position (x, y), or -1"""
+        col = int(x) - self.x0
+        row = int(y) - self.y0
+        if 0 <= row < self.grid.shape[0] and 0 <= col < self.grid.shape[1]:
+            return int(self.grid[row, col])
+        return -1
+
+    def centers(self):
+        """Center of the visible part of each key, by index"""
+        rows, cols = np.nonzero(self.grid >= 0)
+        indices = self.grid[rows, cols]
+        counts = np.bincount(indices)
+        xs = np.bincount(indices, cols) / np.maximum(counts, 1) + self.x0
+        ys = np.bincount(indices, rows) / np.maximum(counts, 1) + self.y0
+        return {index: (xs[index], ys[index]) for index in range(len(counts)) if counts[index]}
+
+
+class WindowTransform:
+    """Map desktop coordinates into the pygame window, following the window when it is moved"""
+
+    def __init__(self, origin=None, refresh_interval=1.0):
+        self.fixed = origin is not None
+        self.origin = origin or (0, 0)
+        self.refresh_interval = refresh_interval
+        self.last_refresh = None
+
+    def _window_position(self):
+        try:
+            from pygame._sdl2.video import Window
+            return tuple(Window.from_display_module().position)
+        except Exception:
+            return None
+
+    def to_window(self, pos, now=None):
+        if not self.fixed:
+            now = time.perf_counter() if now is None else now
+            if self.last_refresh is None or now - self.last_refresh >= self.refresh_interval:
+                self.last_refresh = now
+                self.origin = self._window_position() or self.origin
+        return pos[0] - self.origin[0], pos[1] - self.origin[1]
+
+
+class DwellSelector:
+    """Select a key by looking at it for dwell_time seconds
+
+    Feed it the key under every filtered gaze sample. Glances away shorter than grace seconds
+    don't restart the timer, so jitter at the edge of a key doesn't cost the whole dwell. After a
+    selection the same key fires again every repeat_time seconds, or, with None, only after the
+    gaze has left it.
+    """
+
+    def __init__(self, dwell_time=0.8, grace=0.15, repeat_time=None):
+        self.dwell_time = dwell_time
+        self.grace = grace
+        self.repeat_time = repeat_time
+        self.reset()
+
+    def reset(self):
+        self.key = None
+        self.start = None
+        self.away_since = None
+        self.fired_at = None
+        self.progress = 0.0  # Fraction of the dwell done, for drawing
+
+    def update(self, key, timestamp):
+        """Returns the selected key, or None"""
+        if key == self.key:
+            self.away_since = None
+        else:
+            if self.key is not None and self.away_since is None:
+                self.away_since = timestamp
+            if self.key is None or timestamp - self.away_since >= self.grace:
+                self.key = key
+                self.start = timestamp
+                self.away_since = None
+                self.fired_at = None
+            else:
+                return None
+        if self.key is None:
+            self.progress = 0.0
+            return None
+
+        if self.fired_at is None:
+            self.progress = min(1.0, (timestamp - self.start) / self.dwell_time)
+            if timestamp - self.start >= self.dwell_time:
+                self.fired_at = timestamp
+                self.progress = 0.0
+                return self.key
+        elif self.repeat_time is not None and timestamp - self.fired_at >= self.repeat_time:
+            self.fired_at = timestamp
+            return self.key
+        return None
+
+
+def save_trace(path, timestamps, points, text=""):
+    """Save a gaze trace in window coordinates; text is what the user meant to type, if known"""
+    np.savez_compressed(path, timestamps=np.asarray(timestamps, np.float64), points=np.asarray(points, np.float32),
+                        text=np.array(text))
+
+
+def load_trace(path):
+    with np.load(path) as data:
+        return data["timestamps"], data["points"], str(data["text"])
+
+
+def synthetic_trace(centers, text, seed=0, rate=30, fixation=(0.7, 1.6), saccade=0.12, jitter=6.0):
+    """Gaze samples of someone looking at each key of text in turn (centers maps key name to position)
+
+    Fixations last a random time in the fixation range with Gaussian jitter in pixels, joined by
+    short linear saccades, like the filtered cursor on a real session. Between double letters
+    the gaze goes up to the text field and back, as a dwell keyboard needs.
+    """
+    rng = np.random.default_rng(seed)
+    names = {" ": "Space"}
+    timestamps = []
+    points = []
+    t = 0.0
+    position = np.array(centers["Space"])
+
+    def move(target, dwell):
+        nonlocal t, position
+        steps = max(1, int(saccade * rate))
+        for step in range(steps):
+            t += 1 / rate
+            timestamps.append(t)
+            points.append(position + (target - position) * (step + 1) / steps)
+        for _ in range(int(dwell * rate)):
+            t += 1 / rate
+            timestamps.append(t)
+            points.append(target + rng.normal(0, jitter, 2))
+        position = target
+
+    previous = None
+    for char in text:
+        target = np.array(centers[names.get(char, char)])
+        if char == previous:
+            move(target - (0, 150), 0.3)
+        move(target, rng.uniform(*fixation))
+        previous = char
+    return np.array(timestamps), np.array(points, np.float32)
+
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def replay_trace(timestamps, points, grid, keys, selector):
+    """Run a gaze trace through the hit-test grid and a selector, returns the typed text"""
+    typed = []
+    selector.reset()
+    for timestamp, (x, y) in zip(timestamps, points):
+        index = grid.lookup(x, y)
+        selected = selector.update(index if index >= 0 else None, timestamp)
+        if selected is not None:
+            key = keys[selected]
+            typed.append(" " if key == "Space" else key if len(key) == 1 else "")
+    return "".join(typed)
+
+
+def benchmark(paths=()):
+    import pygame
+
+    layout = [
+        ['1', '2', '3', '4', '5', '6', '7', '8', '9', '0', 'Backspace'],
+        ['q', 'w', 'e', 'r', 't', 'y', 'u', 'i', 'o', 'p'],
+        ['a', 's', 'd', 'f', 'g', 'h', 'j', 'k', 'l'],
+        ['z', 'x', 'c', 'v', 'b', 'n', 'm', '.', ','],
+        ['Space', 'Enter', 'Clear', 'Close'],
+    ]
+    # The on-screen keyboard's geometry in a 640x480 window
+    boxes = layout_rects(layout, 32, 480 - 192 - 10, 576, 192)
+    keys = [key for key, row, col, box in boxes]
+    rects = [pygame.Rect(*box) for key, row, col, box in boxes]
+    grid = KeyGrid(rects)
+
+    rng = np.random.default_rng(0)
+    samples = rng.uniform((0, 240), (640, 480), (20000, 2)).astype(int).tolist()
+    start = time.perf_counter()
+    linear = [next((i for i in range(len(rects) - 1, -1, -1) if rects[i].collidepoint(p)), -1) for p in samples]
+    linear_time = (time.perf_counter() - start) / len(samples)
+    start = time.perf_counter()
+    indexed = [grid.lookup(x, y) for x, y in samples]
+    grid_time = (time.perf_counter() - start) / len(samples)
+    assert linear == indexed
+    print(f"Hit test: linear scan {linear_time * 1e6:.2f} us, grid {grid_time * 1e6:.2f} us "
+          f"({len(rects)} keys, {grid.grid.nbytes // 1024} KB grid)")
+
+    if paths:
+        traces = [load_trace(path) for path in paths]
+    else:
+        phrases = ["hello world", "the quick brown fox", "eye control works", "see you at ten"]
+        centers = {keys[index]: center for index, center in grid.centers().items()}
+        traces = [synthetic_trace(centers, phrase, seed) + (phrase,) for seed, phrase in enumerate(phrases)]
+
+    print(f"{'dwell s':>8s} {'keys/min':>9s} {'errors':>7s}")
+    for dwell_time in (0.4, 0.6, 0.8, 1.0):
+        selector = DwellSelector(dwell_time)
+        minutes = 0.0
+        correct = 0
+        errors = 0
+        for timestamps, points, text in traces:
+            typed = replay_trace(timestamps, points, grid, keys, selector)
+            minutes += (timestamps[-1] - timestamps[0]) / 60
+            wrong = edit_distance(typed, text) if text else 0
+            errors += wrong
+            correct += max(0, len(text or typed) - wrong)
+        print(f"{dwell_time:8.1f} {correct / minutes:9.1f} {errors / max(1, correct + errors):7.1%}")
+
+
+if __name__ == "__main__":
+    # python key_selection.py [trace.npz ...]: hit-test cost and dwell typing rate on gaze traces
+    benchmark(sys.argv[1:])
@@ -0,0 +1,344 @@
+import argparse
+import time
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sample_rate, n_fft, n_mels=26, fmin=20.0, fmax=None):
+    """Triangular mel filters as an (n_mels, n_fft // 2 + 1) matrix"""
+    fmax = fmax or sample_rate / 2
+    mel_min, mel_max = 2595 * np.log10(1 + np.array([fmin, fmax]) / 700)
+    hz_points = 700 * (10 ** (np.linspace(mel_min, mel_max, n_mels + 2) / 2595) - 1)
+    bins = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    lower, centre, upper = hz_points[:-2, None], hz_points[1:-1, None], hz_points[2:, None]
+    rising = (bins - lower) / (centre - lower)
+    falling = (upper - bins) / (upper - centre)
+    return np.maximum(0, np.minimum(rising, falling)).astype(np.float32)
+
+
+@lru_cache(maxsize=4)
+def dct_matrix(n_mfcc, n_mels):
+    """Orthonormal DCT-II rows for the first n_mfcc coefficients"""
+    k = np.arange(n_mfcc)[:, None]
+    n = np.arange(n_mels)[None, :]
+    matrix = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2 / n_mels)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+def mfcc(samples, sample_rate, n_mfcc=13, n_mels=26, frame_ms=25, hop_ms=10):
+    """MFCCs of int16 samples, one row per 10 ms hop, without c0 so loudness does not matter"""
+    samples = np.asarray(samples, dtype=np.float32) / 32768
+    frame_len = int(sample_rate * frame_ms / 1000)
+    hop = int(sample_rate * hop_ms / 1000)
+    if len(samples) < frame_len:
+        return np.empty((0, n_mfcc - 1), dtype=np.float32)
+
+    emphasized = np.empty_like(samples)
+    emphasized[0] = samples[0]
+    emphasized[1:] = samples[1:] - 0.97 * samples[:-1]
+    n_frames = 1 + (len(emphasized) - frame_len) // hop
+    stride = emphasized.strides[0]
+    frames = np.lib.stride_tricks.as_strided(emphasized, (n_frames, frame_len), (stride * hop, stride))
+
+    n_fft = 1 << (frame_len - 1).bit_length()
+    power = np.abs(np.fft.rfft(frames * np.hamming(frame_len).astype(np.float32), n_fft)) ** 2 / n_fft
+    log_mel = np.log(power @ mel_filterbank(sample_rate, n_fft, n_mels).T + 1e-10)
+    return (log_mel @ dct_matrix(n_mfcc, n_mels).T)[:, 1:]
+
+
+def trim_silence(samples, sample_rate, top_db=30, frame_ms=10):
+    """Cut leading and trailing audio quieter than top_db below the loudest 10 ms"""
+    samples = np.asarray(samples)
+    frame_len = int(sample_rate * frame_ms / 1000)
+    n_frames = len(samples) // frame_len
+    if not n_frames:
+        return samples
+    energy = (samples[:n_frames * frame_len].astype(np.float32).reshape(n_frames, frame_len) ** 2).mean(axis=1)
+    loud = np.nonzero(energy > energy.max() * 10 ** (-top_db / 10))[0]
+    return samples[loud[0] * frame_len:(loud[-1] + 1) * frame_len]
+
+
+class Resampler:
+    """Convert a stream of int16 chunks from one sample rate to another by linear interpolation
+
+    When downsampling, a windowed-sinc low-pass runs first so sound above the new Nyquist
+    frequency does not fold back into the bands the spotter uses.
+    """
+
+    def __init__(self, from_rate, to_rate, taps=31):
+        self.step = from_rate / to_rate
+        if self.step > 1:
+            cutoff = 0.5 / self.step  # In cycles per input sample
+            k = np.arange(taps) - (taps - 1) / 2
+            kernel = np.sinc(2 * cutoff * k) * np.hamming(taps)
+            self.kernel = (kernel / kernel.sum()).astype(np.float32)
+        else:
+            self.kernel = np.ones(1, dtype=np.float32)
+        self.taps = len(self.kernel)
+        self.carry = np.zeros(self.taps, dtype=np.float32)  # Tail of the previous chunk
+        self.position = 1.0  # Next output sample, in input samples from the end of the carry
+
+    def __call__(self, samples):
+        if self.step == 1:
+            return samples
+        padded = np.concatenate([self.carry, np.asarray(samples, dtype=np.float32)])
+        self.carry = padded[-self.taps:]
+        # smoothed[0] is the last sample of the previous chunk, smoothed[1:] this chunk
+        smoothed = np.convolve(padded, self.kernel, "valid")
+        positions = np.arange(self.position, len(smoothed) - 1, self.step)
+        self.position = (positions[-1] + self.step if len(positions) else self.position) - (len(smoothed) - 1)
+        return np.round(np.interp(positions, np.arange(len(smoothed)), smoothed)).astype(np.int16)
+
+
+def subsequence_dtw(template, window):
+    """Per-frame cost of the best match of template against any stretch of window ending at that frame
+
+    Each step advances the template by one frame and the window by one or two (or the template
+    by two), so every row only depends on earlier rows and is computed as one vector operation.
+    """
+    cost = np.sqrt(((template[:, None, :] - window[None, :, :]) ** 2).sum(axis=2))
+    rows, cols = cost.shape
+    total = np.full((rows, cols), np.inf, dtype=np.float32)
+    total[0] = cost[0]  # The match can start anywhere in the window
+    best = np.empty(cols, dtype=np.float32)
+    for i in range(1, rows):
+        best[0] = np.inf
+        best[1:] = total[i - 1, :-1]
+        best[2:] = np.minimum(best[2:], total[i - 1, :-2])
+        if i >= 2:
+            best[1:] = np.minimum(best[1:], total[i - 2, :-1])
+        total[i] = cost[i] + best
+    return total[-1] / rows
+
+
+class KeywordSpotter:
+    """Spot enrolled wake phrases in raw microphone audio with MFCC templates and DTW
+
+    Feed 16-bit mono PCM chunks as they arrive. Every hop the recent audio is matched against
+    each enrolled template; a phrase fires when a match ending in the last few frames costs less
+    than that phrase's threshold. Quiet audio is skipped before any features are computed.
+    A phrase needs at least two recordings before it is spotted, since its threshold comes from
+    how far apart they are.
+
+    Templates and matching use sample_rate, whose mel bands the templates were computed with.
+    Audio at any other rate (the microphone's native 44.1 or 48 kHz) is resampled as it is fed.
+    """
+
+    def __init__(self, sample_rate=16000, hop_ms=100, min_rms=200, sensitivity=1.3, refractory=1.0):
+        self.templates = {}  # Phrase -> list of MFCC arrays
+        self.thresholds = {}
+        self.hop_ms = hop_ms
+        self.min_rms = min_rms  # int16 RMS below which the window is treated as silence
+        self.sensitivity = sensitivity  # Threshold as a multiple of the spread between enrolled templates
+        self.refractory = refractory
+        self.end_slack = 5  # A match must end within this many frames (50 ms) of now
+        self.sample_rate = sample_rate
+        self.reset()
+
+        self.windows_checked = 0
+        self.match_time = 0.0
+
+    def reset(self, input_rate=None):
+        """Start over on a new stream, whose audio arrives at input_rate (default: sample_rate)"""
+        self.resampler = Resampler(input_rate or self.sample_rate, self.sample_rate)
+        self.samples = deque()
+        self.buffered = 0
+        self.since_check = 0
+        self.last_fire = 0.0
+
+    @property
+    def phrases(self):
+        """Phrases that can be spotted, those with at least two recordings"""
+        return list(self.thresholds)
+
+    def enroll(self, phrase, samples, sample_rate):
+        """Add one recording of phrase (int16 samples) as a template"""
+        samples = Resampler(sample_rate, self.sample_rate)(samples)
+        features = mfcc(trim_silence(samples, self.sample_rate), self.sample_rate)
+        self.templates.setdefault(phrase, []).append(features)
+        self._update_threshold(phrase)
+
+    def _update_threshold(self, phrase):
+        templates = self.templates[phrase]
+        if len(templates) < 2:
+            self.thresholds.pop(phrase, None)  # Nothing to measure a threshold from yet
+            return
+        # How far apart the user's own recordings are sets how loose a live match may be
+        costs = [subsequence_dtw(a, b).min() for i, a in enumerate(templates) for b in templates[i + 1:]]
+        self.thresholds[phrase] = float(np.max(costs)) * self.sensitivity
+
+    def save(self, path):
+        arrays = {"sample_rate": np.array(self.sample_rate)}
+        for phrase, templates in self.templates.items():
+            for i, features in enumerate(templates):
+                arrays[f"{phrase}|{i}"] = features
+        np.savez_compressed(path, **arrays)
+
+    def load(self, path, phrases=None):
+        """Load templates saved with save(), optionally only for the given phrases"""
+        data = np.load(path)
+        # Files saved before the rate was stored were all enrolled at 16 kHz
+        enrolled_rate = int(data["sample_rate"]) if "sample_rate" in data.files else 16000
+        if enrolled_rate != self.sample_rate:
+            raise ValueError(f"{path} was enrolled at {enrolled_rate} Hz but the spotter runs at "
+                             f"{self.sample_rate} Hz, enroll the phrases again")
+        for key in sorted(data.files):
+            if "|" not in key:
+                continue
+            phrase = key.rsplit("|", 1)[0]
+            if phrases is None or phrase in phrases:
+                self.templates.setdefault(phrase, []).append(data[key])
+        for phrase in self.templates:
+            self._update_threshold(phrase)
+            if phrase not in self.thresholds:
+                print(f"'{phrase}' has only one recording in {path}, enroll it again to spot it")
+        return self
+
+    def _window_samples(self):
+        longest = max(len(features) for phrase in self.thresholds for features in self.templates[phrase])
+        # 1.5x the longest template (in 10 ms frames) so slower speech still fits
+        return int(self.sample_rate * longest * 0.015)
+
+    def feed(self, chunk):
+        """Add raw 16-bit PCM bytes, returns the spotted phrase or None"""
+        if not self.thresholds:
+            return None
+        samples = self.resampler(np.frombuffer(chunk, dtype=np.int16))
+        self.samples.append(samples)
+        self.buffered += len(samples)
+        self.since_check += len(samples)
+        window_size = self._window_samples()
+        while self.buffered - len(self.samples[0]) >= window_size:
+            self.buffered -= len(self.samples.popleft())
+
+        if self.since_check < self.sample_rate * self.hop_ms / 1000:
+            return None
+        self.since_check = 0
+        now = time.perf_counter()
+        if now - self.last_fire < self.refractory:
+            return None
+        window = np.concatenate(self.samples)[-window_size:]
+        if np.sqrt(np.mean(window[-len(samples):].astype(np.float32) ** 2)) < self.min_rms:
+            return None  # Nothing being said right now
+
+        phrase = self.match(window)
+        if phrase:
+            self.last_fire = now
+            self.samples.clear()
+            self.buffered = 0
+        return phrase
+
+    def match(self, samples):
+        """Best enrolled phrase ending at the end of samples, or None"""
+        start = time.perf_counter()
+        features = mfcc(samples, self.sample_rate)
+        best_phrase, best_margin = None, 1.0
+        for phrase, threshold in self.thresholds.items():
+            for template in self.templates[phrase]:
+                if len(features) < len(template) // 2:
+                    continue
+                cost = subsequence_dtw(template, features)[-self.end_slack:].min()
+                margin = cost / threshold
+                if margin < best_margin:
+                    best_phrase, best_margin = phrase, margin
+        self.windows_checked += 1
+        self.match_time += time.perf_counter() - start
+        return best_phrase
+
+    def stats(self):
+        return {
+            "windows_checked": self.windows_checked,
+            "match_ms": self.match_time / self.windows_checked * 1000 if self.windows_checked else 0.0,
+            "thresholds": dict(self.thresholds),
+        }
+
+
+def record_phrase(prompt, sample_rate=16000):
+    """Record one phrase from the default microphone as int16 samples"""
+    import speech_recognition as sr
+    recognizer = sr.Recognizer()
+    with sr.Microphone(sample_rate=sample_rate) as source:
+        recognizer.adjust_for_ambient_noise(source, duration=0.5)
+        print(prompt)
+        audio = recognizer.listen(source, timeout=5, phrase_time_limit=3)
+    return np.frombuffer(audio.get_raw_data(convert_rate=sample_rate, convert_width=2), dtype=np.int16)
+
+
+def synthetic_phrase(rng, sample_rate, pitch):
+    """Stand-in for speech in the benchmark: a rising then falling harmonic tone with noise"""
+    t = np.arange(int(sample_rate * 0.6)) / sample_rate
+    f0 = pitch * (1 + 0.6 * np.sin(np.pi * t / 0.6) + 0.4 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    return (voice * 6000 + rng.normal(0, 300, len(t))).astype(np.int16)
+
+
+def benchmark(sample_rate=16000):
+    """Detection latency and per-chunk cost on synthetic audio recorded and fed at sample_rate"""
+    rng = np.random.default_rng(0)
+    spotter = KeywordSpotter()
+    for _ in range(3):
+        spotter.enroll("wake", synthetic_phrase(rng, sample_rate, 180), sample_rate)
+    spotter.reset(sample_rate)
+    chunk = 1024
+    silence = rng.normal(0, 50, sample_rate * 2).astype(np.int16)
+    other = synthetic_phrase(rng, sample_rate, 320)
+    stream = np.concatenate([silence, other, silence, synthetic_phrase(rng, sample_rate, 180), silence])
+    phrase_end = (len(silence) * 2 + len(other) + int(sample_rate * 0.6)) / sample_rate
+
+    feed_times = []
+    for offset in range(0, len(stream), chunk):
+        start = time.perf_counter()
+        spotted = spotter.feed(stream[offset:offset + chunk].tobytes())
+        feed_times.append(time.perf_counter() - start)
+        if spotted:
+            heard_at = (offset + chunk) / sample_rate
+            print(f"Spotted '{spotted}' at {heard_at:.2f} s, the phrase ended at {phrase_end:.2f} s")
+    feed_ms = np.array(feed_times) * 1000
+    print(f"feed(): p50 {np.percentile(feed_ms, 50):.2f} ms, max {feed_ms.max():.2f} ms per {chunk}-sample chunk "
+          f"({chunk / sample_rate * 1000:.0f} ms of audio)")
+    print(spotter.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enroll and test wake phrases for the local keyword spotter")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enroll_parser = commands.add_parser("enroll", help="record a wake phrase a few times")
+    enroll_parser.add_argument("phrase")
+    enroll_parser.add_argument("--count", type=int, default=3, help="recordings to take, at least 2")
+    enroll_parser.add_argument("--path", default="wake_templates.npz")
+    listen_parser = commands.add_parser("listen", help="print spotted phrases from the microphone")
+    listen_parser.add_argument("--path", default="wake_templates.npz")
+    bench_parser = commands.add_parser("bench", help="latency and CPU cost on synthetic audio")
+    bench_parser.add_argument("--sample-rate", type=int, default=16000,
+                              help="rate of the synthetic audio, resampled to 16 kHz by the spotter")
+    args = parser.parse_args()
+
+    if args.command == "enroll":
+        if args.count < 2:
+            parser.error("--count must be at least 2, the threshold comes from comparing the recordings")
+        spotter = KeywordSpotter()
+        try:
+            spotter.load(args.path)
+        except FileNotFoundError:
+            pass
+        spotter.templates.pop(args.phrase, None)
+        for n in range(args.count):
+            spotter.enroll(args.phrase, record_phrase(f"Say '{args.phrase}' ({n + 1}/{args.count})"), 16000)
+        spotter.save(args.path)
+        print(f"Saved {args.count} templates for '{args.phrase}', threshold {spotter.thresholds[args.phrase]:.1f}")
+    elif args.command == "listen":
+        import speech_recognition as sr
+        spotter = KeywordSpotter().load(args.path)
+        with sr.Microphone(sample_rate=16000) as mic:
+            print(f"Listening for {spotter.phrases}...")
+            while True:
+                spotted = spotter.feed(mic.stream.read(mic.CHUNK))
+                if spotted:
+                    print(f"Spotted: {spotted}")
+    else:
+        benchmark(args.sample_rate)
@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+# FaceMesh (refine_landmarks=True) indices used for tracking
+LEFT_EYE_LOWER = 145
+LEFT_EYE_UPPER = 159
+RIGHT_EYE_LOWER = 374
+RIGHT_EYE_UPPER = 386
+IRIS_POINTS = slice(474, 478)
+CURSOR_POINT = 475  # Iris point that drives the cursor
+IRIS_CENTRES = np.array([468, 473])
+EYE_CORNERS = np.array([[33, 133], [362, 263]])  # Corners of the eye around each iris centre
+NOSE_TIP = 1
+
+EYELID_LOWER = np.array([LEFT_EYE_LOWER, RIGHT_EYE_LOWER])
+EYELID_UPPER = np.array([LEFT_EYE_UPPER, RIGHT_EYE_UPPER])
+
+
+# Quantities derived from one frame of landmarks, all in normalised image coordinates
+EyeFeatures = namedtuple(
+    "EyeFeatures", ["iris_points", "cursor_point", "iris_centre", "left_eye_gap", "right_eye_gap"]
+)
+
+# Inputs of the gaze calibration: where the irises sit within the eyes, in eye widths, and the head position
+GazeFeatures = namedtuple("GazeFeatures", ["eye_x", "eye_y", "head_x", "head_y"])
+
+
+def landmarks_to_array(landmarks):
+    """Convert a FaceMesh landmark list into a contiguous (N, 3) float32 array"""
+    return np.array([(landmark.x, landmark.y, landmark.z) for landmark in landmarks], dtype=np.float32)
+
+
+def eye_features(points):
+    """Compute iris position and eyelid gaps from an (N, 3) landmark array"""
+    iris = points[IRIS_POINTS, :2]
+    gaps = points[EYELID_LOWER, 1] - points[EYELID_UPPER, 1]
+    return EyeFeatures(iris, points[CURSOR_POINT, :2], iris.mean(axis=0), float(gaps[0]), float(gaps[1]))
+
+
+def gaze_features(points):
+    """Compute the GazeFeatures of an (N, 3) landmark array"""
+    corners = points[EYE_CORNERS, :2]
+    axis = corners[:, 1] - corners[:, 0]
+    width = np.sqrt((axis * axis).sum(axis=1))
+    offset = (points[IRIS_CENTRES, :2] - corners.mean(axis=1)) / width[:, None]
+    eye_x, eye_y = offset.mean(axis=0).tolist()
+    head_x, head_y = points[NOSE_TIP, :2].tolist()
+    return GazeFeatures(eye_x, eye_y, head_x, head_y)
+
+
+def to_pixels(points, width, height):
+    """Scale normalised (x, y) points to integer pixel coordinates"""
+    return (points[..., :2] * (width, height)).astype(np.int32)
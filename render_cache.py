@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class SurfaceCache:
+    """Keep rendered text and shape surfaces so unchanged labels are rasterised only once"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, create):
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = create()
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            # Least recently used surface goes first (e.g. old cursor coordinates)
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def text(self, font, text, color, antialias=True):
+        """Drop-in for font.render(text, antialias, color)"""
+        return self._get(("text", text, font, tuple(color), antialias),
+                         lambda: font.render(text, antialias, color))
+
+    def circle(self, color, radius):
+        """Filled circle on a transparent square surface of side 2 * radius"""
+        def create():
+            surface = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            pygame.draw.circle(surface, color, (radius, radius), radius)
+            return surface
+        return self._get(("circle", tuple(color), radius), create)
+
+    def box(self, color, size):
+        """Solid rectangle of the given size"""
+        def create():
+            surface = pygame.Surface(size)
+            surface.fill(color)
+            return surface
+        return self._get(("box", tuple(color), tuple(size)), create)
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+class DirtyRegions:
+    """Compose overlay surfaces over a background and push only the rectangles that changed
+
+    Overlay code calls blit() like Surface.blit, once per item per frame. flush() compares the
+    items with the previous frame; when the background is unchanged only the rectangles of
+    items that appeared, moved, changed or disappeared are repainted and sent to the display.
+    """
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = None
+        self.items = []
+        self.previous_items = []
+        self.full = True
+
+    def set_background(self, surface):
+        """Use a new background (e.g. the latest camera frame), which repaints the whole window"""
+        self.background = surface
+        self.full = True
+
+    def blit(self, surface, pos):
+        rect = surface.get_rect(topleft=pos)
+        self.items.append((surface, rect))
+        return rect
+
+    def _paint_background(self, rect=None):
+        if self.background is None:
+            self.screen.fill((0, 0, 0), rect)
+        elif rect is None:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            self.screen.blit(self.background, rect, rect)
+
+    def flush(self):
+        """Draw this frame's items and update the display, returns the number of rectangles pushed"""
+        if self.full:
+            self._paint_background()
+            for surface, rect in self.items:
+                self.screen.blit(surface, rect)
+            pygame.display.update()
+            updated = 1
+        else:
+            # Surfaces come from SurfaceCache, so identity tells us whether an item changed
+            previous = {(id(surface), tuple(rect)): rect for surface, rect in self.previous_items}
+            current = {(id(surface), tuple(rect)): rect for surface, rect in self.items}
+            changed = [rect for key, rect in previous.items() if key not in current]
+            changed += [rect for key, rect in current.items() if key not in previous]
+            for dirty in changed:
+                # Repaint the area and everything overlapping it, in the original order
+                self.screen.set_clip(dirty)
+                self._paint_background(dirty)
+                for surface, rect in self.items:
+                    if rect.colliderect(dirty):
+                        self.screen.blit(surface, rect)
+            self.screen.set_clip(None)
+            if changed:
+                pygame.display.update(changed)
+            updated = len(changed)
+
+        self.previous_items = self.items
+        self.items = []
+        self.full = False
+        return updated
@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from capture import CameraSource, FrameCapture
+from inference import FaceMeshWorker, FaceRoiTracker
+from instrumentation import profiler
+
+
+class SessionRecorder:
+    """Collect camera frames or landmark arrays with their timestamps for replay"""
+
+    def __init__(self, mode="frames", jpeg_quality=90):
+        if mode not in ("frames", "landmarks"):
+            raise ValueError(f"Unknown recording mode: {mode}")
+        self.mode = mode
+        self.jpeg_quality = jpeg_quality
+        self.lock = threading.Lock()
+        self.timestamps = []
+        self.items = []  # JPEG bytes or landmark arrays (None when no face was found)
+        self.frame_shape = None
+
+    def add_frame(self, timestamp, image):
+        """Called by FrameCapture for every captured BGR frame"""
+        if self.mode != "frames":
+            return
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        with self.lock:
+            self.frame_shape = image.shape
+            self.timestamps.append(timestamp)
+            self.items.append(encoded.tobytes())
+
+    def add_landmarks(self, timestamp, points, frame_shape):
+        """Called by FaceMeshWorker for every processed frame"""
+        if self.mode != "landmarks":
+            return
+        with self.lock:
+            self.frame_shape = frame_shape
+            self.timestamps.append(timestamp)
+            self.items.append(None if points is None else points.copy())
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def save(self, path):
+        """Write the session as a compressed .npz file"""
+        with self.lock:
+            timestamps = np.array(self.timestamps, dtype=np.float64)
+            items = list(self.items)
+            frame_shape = np.array(self.frame_shape or (480, 640, 3), dtype=np.int32)
+        if len(timestamps):
+            timestamps -= timestamps[0]
+
+        arrays = {"mode": np.array(self.mode), "timestamps": timestamps, "frame_shape": frame_shape}
+        if self.mode == "frames":
+            # All JPEGs back to back plus where each one starts, no pickled objects
+            offsets = np.zeros(len(items) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(item) for item in items])
+            arrays["jpeg"] = np.frombuffer(b"".join(items), dtype=np.uint8)
+            arrays["offsets"] = offsets
+        else:
+            num_points = next((len(item) for item in items if item is not None), 478)
+            landmarks = np.zeros((len(items), num_points, 3), dtype=np.float32)
+            has_face = np.array([item is not None for item in items], dtype=bool)
+            for i, item in enumerate(items):
+                if item is not None:
+                    landmarks[i] = item
+            arrays["landmarks"] = landmarks
+            arrays["has_face"] = has_face
+        np.savez_compressed(path, **arrays)
+        print(f"Saved {len(timestamps)} {self.mode} to {path}")
+
+
+class Session:
+    """A recorded session loaded from disk"""
+
+    def __init__(self, path):
+        data = np.load(path)
+        self.path = path
+        self.mode = str(data["mode"])
+        self.timestamps = data["timestamps"]
+        self.frame_shape = tuple(int(v) for v in data["frame_shape"])
+        if self.mode == "frames":
+            self.jpeg = data["jpeg"]
+            self.offsets = data["offsets"]
+        else:
+            self.landmarks = data["landmarks"]
+            self.has_face = data["has_face"]
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def frame(self, index):
+        """Decoded BGR frame, or a blank frame for landmark sessions"""
+        if self.mode == "frames":
+            encoded = self.jpeg[self.offsets[index]:self.offsets[index + 1]]
+            return cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+        return np.zeros(self.frame_shape, dtype=np.uint8)
+
+    def landmarks_at(self, index):
+        if self.mode != "landmarks" or not self.has_face[index]:
+            return None
+        return self.landmarks[index].copy()
+
+
+class ReplaySource:
+    """Serve recorded frames to FrameCapture at their original timing, or as fast as possible
+
+    Without realtime pacing the source waits for step() before each frame after the first, so a
+    fast replay goes through every recorded frame instead of dropping the ones the loop can't keep up with.
+    """
+    live = False
+
+    def __init__(self, session, realtime=True):
+        self.session = session
+        self.realtime = realtime
+        self.index = 0
+        self.start_time = None
+        self.blank = None
+        self.next_frame = threading.Event()
+
+    def step(self):
+        """Let the next frame through when replaying without realtime pacing"""
+        self.next_frame.set()
+
+    def read(self):
+        if self.index >= len(self.session):
+            return None
+        if not self.realtime and self.index:
+            # Timeout so a frame the pipeline never reported back cannot stall the replay
+            self.next_frame.wait(timeout=1)
+            self.next_frame.clear()
+        if self.realtime:
+            if self.start_time is None:
+                self.start_time = time.perf_counter()
+            delay = self.start_time + self.session.timestamps[self.index] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if self.session.mode == "frames":
+            frame = self.session.frame(self.index)
+        else:
+            # Landmark sessions only need a frame of the right size for the display path
+            if self.blank is None:
+                self.blank = self.session.frame(0)
+            frame = self.blank
+        self.index += 1
+        return frame
+
+    def release(self):
+        pass
+
+
+class RecordedLandmarkWorker(FaceMeshWorker):
+    """FaceMeshWorker that returns recorded landmarks instead of running FaceMesh"""
+
+    def __init__(self, capture, session, **kwargs):
+        # Stand-in for the FaceMesh object, never called
+        super().__init__(capture, face_mesh=SimpleNamespace(process=None), **kwargs)
+        self.session = session
+
+    def _detect(self, rgb_frame, frame_id):
+        # FrameCapture numbers frames from 1 in the order the source produced them
+        return self.session.landmarks_at(frame_id - 1), None
+
+
+def percentiles(values):
+    values_ms = np.array(values) * 1000
+    if not len(values_ms):
+        return {"count": 0}
+    return {
+        "count": int(len(values_ms)),
+        "p50_ms": float(np.percentile(values_ms, 50)),
+        "p95_ms": float(np.percentile(values_ms, 95)),
+        "p99_ms": float(np.percentile(values_ms, 99)),
+    }
+
+
+def run_replay(session, realtime=True, render=True, window_size=(640, 480)):
+    """Replay session through capture, inference, tracking and actuation, and return a report"""
+    # Imported here so SDL picks up the dummy video driver on machines without a display
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from actuation import InputActuator, MockBackend
+    from governor import Governor
+    from render_cache import DirtyRegions, SurfaceCache
+    from status_overlay import BLUE, IDLE_VOICE, StatusOverlay
+    from tracking import EyeTracker
+
+    pygame.init()
+    surfaces = SurfaceCache()
+    # Without render nothing is shown, as in a headless run
+    overlay = DirtyRegions(pygame.display.set_mode(window_size)) if render else None
+
+    source = ReplaySource(session, realtime)
+    capture = FrameCapture(source)
+    if session.mode == "frames":
+        worker = FaceMeshWorker(capture, roi_tracker=FaceRoiTracker())
+    else:
+        worker = RecordedLandmarkWorker(capture, session)
+    backend = MockBackend()
+    actuator = InputActuator(backend).start()
+    tracker = EyeTracker(actuator, worker)
+    # The overlay main() draws, with voice control idle. The governor only supplies its status
+    # line; it never changes levels here, so every replay runs the same pipeline.
+    status_overlay = None
+    if render:
+        status_overlay = StatusOverlay(surfaces, pygame.font.Font(None, 36), pygame.font.Font(None, 24), window_size)
+        governor = Governor(capture, worker)
+
+    # Fine-grained spans inside the stages (FaceMesh, landmark maths, each input action, ...)
+    profiler.enabled = True
+    profiler.reset()
+    stage_times = defaultdict(list)
+    event_counts = Counter()
+    frames = 0
+    last_snapshot_id = 0
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    capture.start()
+    worker.start()
+    while True:
+        snapshot = worker.wait_snapshot(after_id=last_snapshot_id, timeout=0.5)
+        if snapshot is None:
+            if worker.finished:
+                break
+            continue
+        picked_up = time.perf_counter()
+        last_snapshot_id = snapshot.frame_id
+        # A snapshot from before a resolution change points into the old buffer pool, don't show it
+        current = snapshot.generation == worker.converter.generation
+        if current:
+            worker.converter.pin(snapshot.buffer_index)
+        frames += 1
+        stage_times["capture_to_inference_done"].append(snapshot.inference_time - snapshot.capture_time)
+        stage_times["snapshot_wait"].append(picked_up - snapshot.inference_time)
+
+        t0 = time.perf_counter()
+        for event in tracker.update(snapshot):
+            event_counts[event.kind] += 1
+        t1 = time.perf_counter()
+        stage_times["tracking"].append(t1 - t0)
+
+        if render:
+            if current:
+                tracker.draw_iris(snapshot.frame, BLUE)
+                overlay.set_background(worker.converter.surface(snapshot.buffer_index))
+            status_overlay.draw(overlay, tracker, actuator, IDLE_VOICE, governor=governor)
+            pygame.event.pump()
+            stage_times["render"].append(time.perf_counter() - t1)
+        stage_times["frame_loop"].append(time.perf_counter() - picked_up)
+        source.step()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    worker.stop()
+    capture.stop()
+    actuator.stop()
+    pygame.quit()
+
+    stage_times["inference"] = list(worker.inference_durations)
+    stage_times["capture_to_cursor"] = list(worker.cursor_latencies)
+    stage_times["actuation_move"] = list(actuator.latencies["move"])
+    capture_stats = capture.stats()
+    return {
+        "session": session.path,
+        "mode": session.mode,
+        "recorded_frames": len(session),
+        "processed_frames": frames,
+        "dropped_frames": capture_stats["dropped"],
+        "fps": frames / elapsed if elapsed else 0.0,
+        "cpu_load": cpu / elapsed if elapsed else 0.0,  # Cores used by the whole process
+        "clicks": backend.count("click"),
+        "blink_events": dict(event_counts),
+        "stages": {name: percentiles(values) for name, values in stage_times.items()},
+        "spans": profiler.summary(),
+    }
+
+
+def print_report(report):
+    print(f"Session: {report['session']} ({report['mode']}, {report['recorded_frames']} frames)")
+    print(f"Processed {report['processed_frames']} frames at {report['fps']:.1f} FPS, "
+          f"{report['dropped_frames']} dropped, {report['clicks']} clicks {report['blink_events']}, "
+          f"CPU {report['cpu_load'] * 100:.0f}%")
+    print(f"{'stage':28s} {'count':>6s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    for name, stats in list(report["stages"].items()) + list(report["spans"].items()):
+        if stats["count"]:
+            print(f"{name:28s} {stats['count']:6d} {stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} "
+                  f"{stats['p99_ms']:8.2f}")
+
+
+def compare_render(session, realtime=True):
+    """Replay session with the preview window and headless, and print CPU use and latency side by side"""
+    reports = [("window", run_replay(session, realtime, render=True)),
+               ("headless", run_replay(session, realtime, render=False))]
+    print(f"{'mode':10s} {'FPS':>6s} {'CPU':>5s} {'loop p50':>9s} {'loop p95':>9s} {'cursor p50':>11s} "
+          f"{'cursor p95':>11s}")
+    for mode, report in reports:
+        loop = report["stages"]["frame_loop"]
+        cursor = report["stages"]["capture_to_cursor"]
+        if not loop["count"] or not cursor["count"]:
+            print(f"{mode:10s} no frames processed")
+            continue
+        print(f"{mode:10s} {report['fps']:6.1f} {report['cpu_load'] * 100:4.0f}% {loop['p50_ms']:7.2f}ms "
+              f"{loop['p95_ms']:7.2f}ms {cursor['p50_ms']:9.2f}ms {cursor['p95_ms']:9.2f}ms")
+    return reports
+
+
+def record(path, seconds, landmarks=False, camera=0):
+    """Record a session from the webcam without the UI"""
+    recorder = SessionRecorder("landmarks" if landmarks else "frames")
+    capture = FrameCapture(CameraSource(camera))
+    worker = FaceMeshWorker(capture, roi_tracker=FaceRoiTracker())
+    if landmarks:
+        worker.recorder = recorder
+    else:
+        capture.recorder = recorder
+    capture.start()
+    worker.start()
+    print(f"Recording for {seconds} seconds...")
+    time.sleep(seconds)
+    worker.stop()
+    capture.stop()
+    recorder.save(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay eye-tracking sessions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="record a session from the webcam")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--seconds", type=float, default=30)
+    record_parser.add_argument("--landmarks", action="store_true", help="store landmark arrays instead of frames")
+    record_parser.add_argument("--camera", type=int, default=0)
+
+    run_parser = commands.add_parser("run", help="replay a session and report throughput and latency")
+    run_parser.add_argument("path")
+    run_parser.add_argument("--fast", action="store_true", help="replay every frame as fast as the loop allows; blink timing is compressed")
+    run_parser.add_argument("--no-render", action="store_true", help="skip the preview and overlay")
+    run_parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+
+    compare_parser = commands.add_parser("compare", help="replay a session with and without the preview window")
+    compare_parser.add_argument("path")
+    compare_parser.add_argument("--fast", action="store_true", help="replay every frame as fast as the loop allows")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.path, args.seconds, args.landmarks, args.camera)
+    elif args.command == "compare":
+        compare_render(Session(args.path), realtime=not args.fast)
+    else:
+        replay_report = run_replay(Session(args.path), realtime=not args.fast, render=not args.no_render)
+        print_report(replay_report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(replay_report, f, indent=2)
@@ -0,0 +1,226 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class ManualClock:
+    """Clock that only moves when told to, for driving a Scheduler deterministically"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+
+class TimerHandle:
+    """A scheduled callback that can be cancelled or moved until it fires"""
+    __slots__ = ("scheduler", "callback", "args", "when", "seq", "active")
+
+    def __init__(self, scheduler, callback, args):
+        self.scheduler = scheduler
+        self.callback = callback
+        self.args = args
+        self.when = None
+        self.seq = None  # Identifies the live heap entry; older entries for this handle are skipped
+        self.active = False
+
+    def cancel(self):
+        return self.scheduler.cancel(self)
+
+    def reschedule(self, delay):
+        """Fire delay seconds from now instead, even if it already fired or was cancelled"""
+        return self.scheduler.reschedule(self, delay)
+
+    def remaining(self):
+        return max(0.0, self.when - self.scheduler.clock()) if self.active else None
+
+
+class Scheduler:
+    """Run deferred callbacks in deadline order from one thread
+
+    Deadlines live in a heap, so scheduling or moving a timer is O(log n) and needs no new OS
+    thread. Cancelled and moved timers leave their old heap entry behind, which is skipped when
+    it comes up. Callbacks run on the scheduler thread and should only set state or queue work.
+
+    With an injected clock (e.g. ManualClock) don't start the thread; call run_due() after
+    advancing the clock instead.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.heap = []
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.running = False
+        self.thread = None
+        self.stale = 0  # Heap entries left behind by cancel/reschedule
+        self.fired = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._timer_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.changed.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def schedule(self, delay, callback, *args):
+        """Call callback(*args) after delay seconds, returns a TimerHandle"""
+        handle = TimerHandle(self, callback, args)
+        self.reschedule(handle, delay)
+        return handle
+
+    def reschedule(self, handle, delay):
+        with self.lock:
+            if handle.active:
+                self.stale += 1
+            handle.when = self.clock() + delay
+            handle.seq = next(self.seq)
+            handle.active = True
+            heapq.heappush(self.heap, (handle.when, handle.seq, handle))
+            self._compact()
+            # Only wake the thread if this is now the earliest deadline
+            if self.heap[0][2] is handle:
+                self.changed.notify_all()
+        return handle
+
+    def cancel(self, handle):
+        """Returns True if the timer was still pending"""
+        with self.lock:
+            if not handle.active:
+                return False
+            handle.active = False
+            self.stale += 1
+            self._compact()
+            return True
+
+    def _compact(self):
+        # Rebuild once dead entries dominate, so a timer reset thousands of times doesn't grow the heap
+        if self.stale > 64 and self.stale > len(self.heap) // 2:
+            self.heap = [entry for entry in self.heap if entry[2].active and entry[2].seq == entry[1]]
+            heapq.heapify(self.heap)
+            self.stale = 0
+
+    def _pop_due(self, now):
+        """Next live entry due by now, or None; caller holds the lock"""
+        while self.heap:
+            when, seq, handle = self.heap[0]
+            if not handle.active or handle.seq != seq:
+                heapq.heappop(self.heap)
+                self.stale = max(0, self.stale - 1)
+                continue
+            if when > now:
+                return None
+            heapq.heappop(self.heap)
+            handle.active = False
+            return handle
+        return None
+
+    def next_deadline(self):
+        with self.lock:
+            while self.heap and (not self.heap[0][2].active or self.heap[0][2].seq != self.heap[0][1]):
+                heapq.heappop(self.heap)
+                self.stale = max(0, self.stale - 1)
+            return self.heap[0][0] if self.heap else None
+
+    def run_due(self, now=None):
+        """Run every callback whose deadline has passed, returns how many ran"""
+        now = self.clock() if now is None else now
+        ran = 0
+        while True:
+            with self.lock:
+                handle = self._pop_due(now)
+            if handle is None:
+                return ran
+            self._run(handle)
+            ran += 1
+
+    def _run(self, handle):
+        self.fired += 1
+        try:
+            handle.callback(*handle.args)
+        except Exception as e:
+            print(f"Error in scheduled callback {getattr(handle.callback, '__name__', handle.callback)}: {e}")
+
+    def _timer_loop(self):
+        while True:
+            with self.lock:
+                if not self.running:
+                    return
+                handle = self._pop_due(self.clock())
+                if handle is None:
+                    deadline = self.heap[0][0] if self.heap else None
+                    timeout = None if deadline is None else max(0.0, deadline - self.clock())
+                    self.changed.wait(timeout)
+                    continue
+            self._run(handle)
+
+    def pending(self):
+        with self.lock:
+            return sum(1 for _, seq, handle in self.heap if handle.active and handle.seq == seq)
+
+
+if __name__ == "__main__":
+    RESETS = 2000
+
+    # What the wake-word timeout did: a new Timer thread on every reset
+    start = time.perf_counter()
+    timer = None
+    for _ in range(RESETS):
+        if timer:
+            timer.cancel()
+        timer = threading.Timer(12, lambda: None)
+        timer.daemon = True
+        timer.start()
+    timer.cancel()
+    thread_cost = (time.perf_counter() - start) / RESETS
+
+    scheduler = Scheduler().start()
+    start = time.perf_counter()
+    handle = scheduler.schedule(12, lambda: None)
+    for _ in range(RESETS):
+        handle.reschedule(12)
+    heap_cost = (time.perf_counter() - start) / RESETS
+    handle.cancel()
+    print(f"Reset a 12 s timeout: threading.Timer {thread_cost * 1e6:.0f} us, Scheduler {heap_cost * 1e6:.1f} us "
+          f"(heap size {len(scheduler.heap)} after {RESETS} resets)")
+
+    # How late callbacks fire on the scheduler thread with 10000 unrelated timers pending
+    for i in range(10000):
+        scheduler.schedule(60 + i / 1000, lambda: None)
+    lateness = []
+    for i in range(20):
+        scheduler.schedule(0.01 + i * 0.005, lambda due: lateness.append(time.monotonic() - due),
+                           time.monotonic() + 0.01 + i * 0.005)
+    time.sleep(0.3)
+    lateness.sort()
+    print(f"Firing lateness with 10000 pending timers: median {lateness[len(lateness) // 2] * 1000:.2f} ms, "
+          f"max {lateness[-1] * 1000:.2f} ms")
+    scheduler.stop()
+
+    # The same timeout logic driven by a manual clock, as a test would
+    clock = ManualClock()
+    manual = Scheduler(clock)
+    fired = []
+    timeout = manual.schedule(12, fired.append, "timed out")
+    clock.advance(10)
+    timeout.reschedule(12)  # A command arrived, the timeout starts over
+    clock.advance(11)
+    manual.run_due()
+    print(f"After 21 s with a reset at 10 s: {fired or 'still waiting'}, fires in {timeout.remaining():.0f} s")
+    clock.advance(1)
+    manual.run_due()
+    print(f"After 22 s: {fired}")
@@ -0,0 +1,212 @@
+import json
+import sys
+import time
+import wave
+from collections import deque, namedtuple
+
+
+# One hypothesis from a streaming recognizer. Partial results may still change, final ones will not.
+RecognitionResult = namedtuple("RecognitionResult", ["text", "is_final"])
+
+
+class NoSpeechError(Exception):
+    """The audio held no recognizable speech"""
+
+
+class BackendError(Exception):
+    """The recognizer could not be used (service unreachable, model missing, ...)"""
+
+
+class GoogleBackend:
+    """Google Web Speech API through speech_recognition, one blocking request per phrase"""
+    streaming = False
+
+    def __init__(self, recognizer=None):
+        import speech_recognition as sr
+        self.sr = sr
+        self.recognizer = recognizer or sr.Recognizer()
+
+    def recognize(self, audio):
+        try:
+            return self.recognizer.recognize_google(audio)
+        except self.sr.UnknownValueError:
+            raise NoSpeechError()
+        except self.sr.RequestError as e:
+            raise BackendError(str(e))
+
+
+class VoskStream:
+    """Incremental recognition of one phrase with a Vosk KaldiRecognizer"""
+
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+
+    def accept(self, chunk):
+        """Feed 16-bit mono PCM bytes, returns a partial or final RecognitionResult"""
+        if self.recognizer.AcceptWaveform(chunk):
+            # Vosk found the end of the phrase on its own
+            return RecognitionResult(json.loads(self.recognizer.Result()).get("text", ""), True)
+        return RecognitionResult(json.loads(self.recognizer.PartialResult()).get("partial", ""), False)
+
+    def finish(self):
+        """Flush the remaining audio and return the final text"""
+        return json.loads(self.recognizer.FinalResult()).get("text", "")
+
+
+class VoskBackend:
+    """On-device recognition with Vosk (https://alphacephei.com/vosk/models), no network needed"""
+    streaming = True
+
+    def __init__(self, model_path):
+        try:
+            import vosk
+        except ImportError:
+            raise BackendError("vosk is not installed (pip install vosk)")
+        vosk.SetLogLevel(-1)
+        try:
+            self.model = vosk.Model(model_path)
+        except Exception as e:
+            raise BackendError(f"Could not load Vosk model from {model_path}: {e}")
+        self.vosk = vosk
+
+    def start_stream(self, sample_rate, grammar=None):
+        """Start a phrase; grammar limits the vocabulary to the given phrases, which helps short commands"""
+        if grammar:
+            recognizer = self.vosk.KaldiRecognizer(self.model, sample_rate, json.dumps(list(grammar) + ["[unk]"]))
+        else:
+            recognizer = self.vosk.KaldiRecognizer(self.model, sample_rate)
+        return VoskStream(recognizer)
+
+    def recognize(self, audio):
+        """Whole-phrase recognition of a speech_recognition AudioData"""
+        stream = self.start_stream(audio.sample_rate)
+        stream.accept(audio.get_raw_data(convert_width=2))
+        text = stream.finish()
+        if not text:
+            raise NoSpeechError()
+        return text
+
+
+class StubStream:
+    """Reveals one more word of a scripted phrase every few chunks, then finishes it"""
+
+    def __init__(self, text, chunks_per_word=2):
+        self.words = text.split()
+        self.chunks_per_word = chunks_per_word
+        self.chunks = 0
+
+    def accept(self, chunk):
+        self.chunks += 1
+        if self.chunks > len(self.words) * self.chunks_per_word:
+            return RecognitionResult(" ".join(self.words), True)
+        shown = (self.chunks - 1) // self.chunks_per_word + 1
+        return RecognitionResult(" ".join(self.words[:shown]), False)
+
+    def finish(self):
+        return " ".join(self.words)
+
+
+class StubBackend:
+    """Deterministic recognizer for tests and replays: returns scripted phrases in order, ignoring the audio"""
+    streaming = True
+
+    def __init__(self, phrases=()):
+        self.phrases = deque(phrases)
+
+    def add(self, phrase):
+        self.phrases.append(phrase)
+
+    def _next(self):
+        if not self.phrases:
+            return ""
+        return self.phrases.popleft()
+
+    def start_stream(self, sample_rate, grammar=None):
+        return StubStream(self._next())
+
+    def recognize(self, audio):
+        text = self._next()
+        if not text:
+            raise NoSpeechError()
+        return text
+
+
+def create_speech_backend(name, model_path=None, recognizer=None):
+    """Create a backend by name, falling back to Google when the offline engine can't be set up"""
+    if name == "stub":
+        return StubBackend()
+    if name == "vosk":
+        try:
+            return VoskBackend(model_path)
+        except BackendError as e:
+            print(f"{e}, falling back to Google speech recognition")
+    return GoogleBackend(recognizer)
+
+
+class PartialStabilizer:
+    """Report the words of a streaming hypothesis that stopped changing
+
+    A word prefix is stable once the last `updates` partial results all start with it, so a
+    command can be acted on before the recognizer decides the phrase has ended.
+    """
+
+    def __init__(self, updates=2):
+        self.recent = deque(maxlen=updates)
+
+    def reset(self):
+        self.recent.clear()
+
+    def update(self, partial):
+        """Add a partial result and return the stable prefix (possibly empty)"""
+        self.recent.append(partial.split())
+        if len(self.recent) < self.recent.maxlen:
+            return ""
+        stable = []
+        for words in zip(*self.recent):
+            if any(word != words[0] for word in words):
+                break
+            stable.append(words[0])
+        return " ".join(stable)
+
+
+def stream_wav(backend, path, chunk_ms=100, grammar=None):
+    """Feed a 16-bit mono WAV file to a streaming backend as if it were live audio, printing hypotheses"""
+    with wave.open(path, "rb") as wav:
+        sample_rate = wav.getframerate()
+        frames_per_chunk = int(sample_rate * chunk_ms / 1000)
+        stream = backend.start_stream(sample_rate, grammar)
+        stabilizer = PartialStabilizer()
+        audio_time = 0.0
+        start = time.perf_counter()
+        while True:
+            chunk = wav.readframes(frames_per_chunk)
+            if not chunk:
+                break
+            audio_time += chunk_ms / 1000
+            result = stream.accept(chunk)
+            if result.is_final:
+                print(f"{audio_time:6.2f}s final:   {result.text}")
+                stabilizer.reset()
+                stream = backend.start_stream(sample_rate, grammar)
+            elif result.text:
+                print(f"{audio_time:6.2f}s partial: {result.text}  (stable: {stabilizer.update(result.text)})")
+        print(f"{audio_time:6.2f}s final:   {stream.finish()}")
+        elapsed = time.perf_counter() - start
+        print(f"Processed {audio_time:.1f}s of audio in {elapsed:.2f}s ({audio_time / elapsed:.1f}x real time)")
+
+
+if __name__ == "__main__":
+    # python speech_backends.py recording.wav path/to/vosk-model  -- or no arguments for the stub
+    if len(sys.argv) > 2:
+        stream_wav(VoskBackend(sys.argv[2]), sys.argv[1])
+    else:
+        stub = StubBackend(["hey computer", "scroll down please"])
+        for _ in range(2):
+            stub_stream = stub.start_stream(16000)
+            stub_stabilizer = PartialStabilizer()
+            while True:
+                stub_result = stub_stream.accept(b"")
+                if stub_result.is_final:
+                    print(f"final:   {stub_result.text}")
+                    break
+                print(f"partial: {stub_result.text}  (stable: {stub_stabilizer.update(stub_result.text)})")
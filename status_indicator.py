@@ -0,0 +1,49 @@
+import pygame
+from pygame._sdl2.video import Renderer, Texture, Window
+
+
+class StatusIndicator:
+    """Small borderless always-on-top window with one coloured dot, the only UI of a headless run
+
+    The dot is drawn through its own SDL renderer, only when its state changes, so it costs
+    nothing on most frames. It is placed in the top right corner of the first display.
+    """
+
+    def __init__(self, size=24, margin=10, title="Eye control"):
+        desktop_w = pygame.display.get_desktop_sizes()[0][0]
+        self.window = Window(title, (size, size), position=(desktop_w - size - margin, margin), borderless=True,
+                             always_on_top=True, skip_taskbar=True)
+        self.renderer = Renderer(self.window)
+        self.size = size
+        self.textures = {}  # (colour, blink) -> texture
+        self.state = None
+
+    def _texture(self, color, blink):
+        key = (color, blink)
+        if key not in self.textures:
+            surface = pygame.Surface((self.size, self.size))
+            radius = self.size // 2
+            pygame.draw.circle(surface, color, (radius, radius), radius)
+            if blink:
+                pygame.draw.circle(surface, (0, 0, 0), (radius, radius), radius // 3)
+            self.textures[key] = Texture.from_surface(self.renderer, surface)
+        return self.textures[key]
+
+    def show(self, color, blink=False):
+        """Draw the dot in color (hollowed out while a blink is seen), if that changes anything"""
+        if (color, blink) == self.state:
+            return
+        self.state = (color, blink)
+        self.renderer.clear()
+        self.renderer.blit(self._texture(color, blink))
+        self.renderer.present()
+
+    def pump(self):
+        """Handle window events, returns False once the indicator has been closed"""
+        for event in pygame.event.get():
+            if event.type in (pygame.QUIT, pygame.WINDOWCLOSE):
+                return False
+        return True
+
+    def close(self):
+        self.window.destroy()
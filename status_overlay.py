@@ -0,0 +1,167 @@
+import time
+from collections import namedtuple
+
+import pygame
+
+from instrumentation import profiler
+
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+WHITE = (255, 255, 255)
+GREEN = (0, 255, 0)
+YELLOW = (255, 255, 0)
+ORANGE = (255, 165, 0)
+PURPLE = (128, 0, 128)
+
+# The voice state the overlay shows. main() passes its VoiceCommandHandler, which has these
+# attributes; replays without voice control pass IDLE_VOICE.
+VoiceStatus = namedtuple("VoiceStatus", ["voice_feedback_enabled", "wake_word_active", "typing_mode",
+                                         "is_actively_listening", "last_heard_text"])
+IDLE_VOICE = VoiceStatus(True, False, False, False, "")
+
+
+class StatusOverlay:
+    """Status texts, indicators and buttons drawn over the camera view of the preview window
+
+    Every label comes from the SurfaceCache and goes through DirtyRegions, so a frame where
+    nothing changed costs a few dictionary lookups and pushes nothing to the display.
+    """
+
+    def __init__(self, surfaces, font, small_font, window_size, wake_phrases=(), profiler_overlay=None):
+        self.surfaces = surfaces  # render_cache.SurfaceCache
+        self.font = font
+        self.small_font = small_font
+        self.window_w, self.window_h = window_size
+        self.profiler_overlay = profiler_overlay
+        self.calibrate_button_rect = pygame.Rect(self.window_w - 150, self.window_h - 40, 140, 30)
+        self.calibrate_gaze_rect = pygame.Rect(self.window_w - 340, self.window_h - 40, 180, 30)
+
+        # Static instructions never change, render them once
+        self.wake_instr = small_font.render("Say any of these to activate: " + ", ".join(wake_phrases[:3]) + "...",
+                                            True, WHITE)
+        self.space_instr = small_font.render("Press SPACEBAR to manually activate command mode", True, WHITE)
+
+        self.debug_info = []  # Last few phrases heard, for debugging
+        self.last_debug_update = 0
+        self.error = None  # Shown in red above the instructions while set
+
+    def buttons_shown(self, keyboard=None):
+        """Whether the calibration buttons are up, they sit over the keyboard's bottom row so it hides them"""
+        return keyboard is None or not keyboard.active
+
+    def draw(self, overlay, tracker, actuator, voice, keyboard=None, governor=None):
+        """Draw one frame of the overlay onto overlay (a DirtyRegions) and push it to the display"""
+        surfaces, font, small_font = self.surfaces, self.font, self.small_font
+        window_w, window_h = self.window_w, self.window_h
+        overlay_start = time.perf_counter()
+        # Display tracking status
+        status_text = "Tracking: " + ("Enabled" if tracker.enabled else "Disabled")
+        overlay.blit(surfaces.text(font, status_text, GREEN if tracker.enabled else RED), (10, 10))
+
+        # Display cursor position
+        cursor_x, cursor_y = actuator.position()
+        overlay.blit(surfaces.text(font, f"Cursor: ({cursor_x}, {cursor_y})", WHITE), (10, 40))
+
+        # Display blink counter
+        overlay.blit(surfaces.text(font, f"Blinks: {tracker.blink_counter}", WHITE), (10, 70))
+
+        # Display voice feedback status
+        feedback_text = surfaces.text(
+            font,
+            f"Voice Feedback: {'On' if voice.voice_feedback_enabled else 'Off'}",
+            GREEN if voice.voice_feedback_enabled else RED
+        )
+        overlay.blit(feedback_text, (10, 100))
+
+        # Display wake word status
+        wake_word_text = surfaces.text(
+            font,
+            f"Command Mode: {'Active' if voice.wake_word_active else 'Inactive'}",
+            ORANGE if voice.wake_word_active else WHITE
+        )
+        overlay.blit(wake_word_text, (10, 130))
+
+        # Display hold click indicator
+        if tracker.holding_click:
+            overlay.blit(surfaces.text(font, "Holding Click", RED), (10, 160))
+
+        # Display typing mode indicator
+        typing_status = "Active" if voice.typing_mode else "Inactive"
+        typing_color = GREEN if voice.typing_mode else WHITE
+        overlay.blit(surfaces.text(font, f"Typing Mode: {typing_status}", typing_color), (10, 190))
+
+        # Display keyboard status
+        keyboard_active = keyboard is not None and keyboard.active
+        keyboard_status = "Active" if keyboard_active else "Inactive"
+        keyboard_color = GREEN if keyboard_active else WHITE
+        overlay.blit(surfaces.text(font, f"Keyboard: {keyboard_status}", keyboard_color), (10, 220))
+
+        # Display last heard text for debugging (update every 2 seconds)
+        current_time = time.time()
+        if current_time - self.last_debug_update > 2:
+            self.last_debug_update = current_time
+            if voice.last_heard_text:
+                # Add to debug info list (keep last 3 entries)
+                self.debug_info.append(voice.last_heard_text)
+                if len(self.debug_info) > 3:
+                    self.debug_info.pop(0)
+                voice.last_heard_text = ""
+
+        # Display what the governor is currently trading away
+        if governor is not None:
+            perf_text = surfaces.text(small_font, governor.status_text(), YELLOW if governor.level_index else WHITE)
+            overlay.blit(perf_text, (10, window_h - 100))
+
+        # Display debug info
+        debug_y = 250
+        overlay.blit(surfaces.text(font, "Last Heard:", PURPLE), (10, debug_y))
+        for i, text in enumerate(self.debug_info):
+            overlay.blit(surfaces.text(small_font, text, WHITE), (10, debug_y + 30 + i * 20))
+
+        # Draw microphone listening indicator
+        if voice.is_actively_listening:
+            overlay.blit(surfaces.circle(YELLOW, 10), (window_w - 40, 20))
+            overlay.blit(surfaces.text(font, "Listening", YELLOW), (window_w - 120, 20))
+
+        # Draw wake word active indicator
+        if voice.wake_word_active:
+            overlay.blit(surfaces.circle(ORANGE, 10), (window_w - 40, 50))
+            overlay.blit(surfaces.text(font, "Command Mode", ORANGE), (window_w - 150, 50))
+
+        # Draw typing mode listening indicator
+        if voice.typing_mode:
+            overlay.blit(surfaces.circle(GREEN, 10), (window_w - 40, 80))
+            overlay.blit(surfaces.text(font, "Typing Active", GREEN), (window_w - 140, 80))
+
+        # Draw blink indicator
+        if tracker.blink_detected:
+            overlay.blit(surfaces.circle(RED, 10), (window_w - 40, 110))
+            overlay.blit(surfaces.text(font, "Blink", RED), (window_w - 80, 110))
+
+        # Display why eye tracking is not running
+        if self.error:
+            overlay.blit(surfaces.text(small_font, self.error, RED), (10, window_h - 120))
+
+        # Display wake word instructions and the note about spacebar
+        overlay.blit(self.wake_instr, (window_w // 2 - 180, window_h - 80))
+        overlay.blit(self.space_instr, (window_w // 2 - 180, window_h - 60))
+
+        # Draw calibration buttons
+        if self.buttons_shown(keyboard):
+            overlay.blit(surfaces.box(BLUE, self.calibrate_button_rect.size), self.calibrate_button_rect.topleft)
+            overlay.blit(surfaces.text(font, "Calibrate Mic", WHITE), (window_w - 145, window_h - 38))
+            overlay.blit(surfaces.box(BLUE, self.calibrate_gaze_rect.size), self.calibrate_gaze_rect.topleft)
+            overlay.blit(surfaces.text(font, "Calibrate Gaze", WHITE), (window_w - 335, window_h - 38))
+
+        profiler.record("render.overlay", time.perf_counter() - overlay_start)
+
+        # Draw the keyboard
+        if keyboard is not None:
+            with profiler.span("render.keyboard"):
+                keyboard.draw(overlay)
+        if self.profiler_overlay is not None:
+            self.profiler_overlay.draw(overlay, (window_w - 330, 140))
+
+        with profiler.span("render.flush"):
+            overlay.flush()
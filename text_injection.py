@@ -0,0 +1,249 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from scheduler import Scheduler
+
+
+class KeystrokeInjector:
+    """Type text as synthetic keystrokes, one batched write per change"""
+    name = "keys"
+
+    def __init__(self, actuator):
+        self.actuator = actuator
+
+    def insert(self, text):
+        self.actuator.write(text)
+
+    def delete(self, count):
+        if count:
+            self.actuator.press("backspace", presses=count)
+
+    def flush(self, timeout=5):
+        """Wait until the text has been delivered"""
+        return self.actuator.flush(timeout=timeout)
+
+
+class ClipboardInjector:
+    """Insert text with one paste shortcut whatever its length, then put the user's clipboard back
+
+    Text shorter than min_chars is typed instead, since a few keystrokes beat a clipboard round
+    trip. The target application reads the clipboard a little after the shortcut arrives, so the
+    clipboard is left alone for settle seconds after each paste, and the user's text is restored
+    restore_delay seconds after the last paste of a burst. A clipboard without text (an image,
+    a file list) reads as "" and is left with the pasted text rather than being emptied. If the
+    clipboard stops working (pyperclip raises on Linux without xclip or xsel), text is typed instead.
+    """
+    name = "clipboard"
+
+    def __init__(self, actuator, scheduler=None, min_chars=8, restore_delay=0.5, settle=0.1):
+        import pyperclip
+        self.clipboard = pyperclip
+        # pyperclip imports without a clipboard tool and only fails when used, so try it now
+        pyperclip.paste()
+        self.actuator = actuator
+        self.scheduler = scheduler or Scheduler().start()
+        self.min_chars = min_chars
+        self.restore_delay = restore_delay
+        self.settle = settle
+        self.paste_keys = ("command", "v") if sys.platform == "darwin" else ("ctrl", "v")
+        self.lock = threading.Lock()
+        self.saved = None  # The user's clipboard while ours is in it
+        self.pending = 0  # Paste shortcuts queued but not yet sent
+        self.last_paste = 0.0  # perf_counter time the last paste shortcut was sent
+        self.restore_timer = None
+
+    def insert(self, text):
+        if len(text) < self.min_chars:
+            self.actuator.write(text)
+            return
+        # An earlier paste must have been sent, and read by the application, before the clipboard changes
+        self.actuator.flush(timeout=1)
+        wait = self.last_paste + self.settle - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            with self.lock:
+                if self.saved is None:
+                    self.saved = self.clipboard.paste()
+                self.clipboard.copy(text)
+                self.pending += 1
+        except Exception as e:
+            print(f"Clipboard unavailable ({e}), typing the text instead")
+            self.min_chars = float("inf")  # Type everything from now on
+            self.actuator.write(text)
+            return
+        self.actuator.hotkey(*self.paste_keys, done=self._pasted)
+
+    def _pasted(self):
+        """Runs on the actuation thread once a paste shortcut has been sent"""
+        with self.lock:
+            self.pending -= 1
+            self.last_paste = time.perf_counter()
+            # Counted from the last paste of a burst, not from when it was queued
+            if self.restore_timer is None:
+                self.restore_timer = self.scheduler.schedule(self.restore_delay, self._restore)
+            else:
+                self.restore_timer.reschedule(self.restore_delay)
+
+    def _restore(self):
+        with self.lock:
+            if self.pending:
+                return  # Another paste is on its way and reschedules the restore once sent
+            saved, self.saved = self.saved, None
+            if not saved:
+                return
+            try:
+                self.clipboard.copy(saved)
+            except Exception as e:
+                print(f"Could not restore the clipboard: {e}")
+
+    def delete(self, count):
+        if count:
+            self.actuator.press("backspace", presses=count)
+
+    def flush(self, timeout=5):
+        return self.actuator.flush(timeout=timeout)
+
+
+class MockInjector:
+    """Apply insertions and deletions to an in-memory string instead of the focused window"""
+    name = "mock"
+
+    def __init__(self):
+        self.text = ""
+        self.keystrokes = 0
+
+    def insert(self, text):
+        self.text += text
+        self.keystrokes += len(text)
+
+    def delete(self, count):
+        if count:
+            self.text = self.text[:-count]
+            self.keystrokes += count
+
+    def flush(self, timeout=None):
+        return True
+
+
+INJECTORS = {
+    "keys": KeystrokeInjector,
+    "clipboard": ClipboardInjector,
+    "mock": MockInjector,
+}
+
+
+def create_injector(name, actuator=None, scheduler=None):
+    """Create a text injector by name, falling back to keystrokes if it is unavailable"""
+    if name == "mock":
+        return MockInjector()
+    try:
+        if name == "clipboard":
+            return ClipboardInjector(actuator, scheduler)
+        return INJECTORS[name](actuator)
+    except Exception as e:
+        # ImportError without pyperclip, PyperclipException without a clipboard tool to drive
+        print(f"Text injection '{name}' unavailable ({e}), typing keystrokes")
+        return KeystrokeInjector(actuator)
+
+
+class DictationSession:
+    """Keep the text typed for the phrase in progress in step with a changing hypothesis
+
+    update() may be called with every partial result. Only the part that differs from what
+    was already typed is deleted and retyped, so a revised last word costs a few backspaces
+    instead of the whole phrase.
+    """
+
+    def __init__(self, injector, history=100):
+        self.injector = injector
+        self.typed = ""  # Text typed so far for the current phrase
+        self.phrases = 0
+        self.chars = 0  # Characters inserted, including ones later corrected
+        self.backspaces = 0
+        self.busy = 0.0  # Seconds spent delivering text
+        self.rates = deque(maxlen=history)  # Characters per second for each finished phrase
+        self.phrase_chars = 0
+        self.phrase_busy = 0.0
+
+    def update(self, hypothesis):
+        """Make the typed text equal to hypothesis, touching only what changed"""
+        start = time.perf_counter()
+        common = len(os.path.commonprefix([self.typed, hypothesis]))
+        removed = len(self.typed) - common
+        added = hypothesis[common:]
+        self.injector.delete(removed)
+        if added:
+            self.injector.insert(added)
+        self.typed = hypothesis
+        self.backspaces += removed
+        self.chars += len(added)
+        self.phrase_chars += len(added)
+        self.phrase_busy += time.perf_counter() - start
+
+    def commit(self, text):
+        """Finish the phrase with its final text and a trailing space, waiting until it is delivered"""
+        self.update(text + " ")
+        start = time.perf_counter()
+        self.injector.flush()
+        self.phrase_busy += time.perf_counter() - start
+        if self.phrase_busy > 0:
+            self.rates.append(self.phrase_chars / self.phrase_busy)
+        self.busy += self.phrase_busy
+        self.phrases += 1
+        self._next_phrase()
+
+    def cancel(self):
+        """Remove whatever was typed for the current phrase"""
+        self.update("")
+        self._next_phrase()
+
+    def _next_phrase(self):
+        self.typed = ""
+        self.phrase_chars = 0
+        self.phrase_busy = 0.0
+
+    def stats(self):
+        stats = {"phrases": self.phrases, "chars": self.chars, "backspaces": self.backspaces}
+        if self.busy > 0:
+            stats["chars_per_second"] = self.chars / self.busy
+        return stats
+
+
+if __name__ == "__main__":
+    # python text_injection.py [pyautogui|xtest|mock]: delivery speed of each strategy into the focused window
+    from actuation import InputActuator, create_backend
+
+    backend_name = sys.argv[1] if len(sys.argv) > 1 else "mock"
+    actuator = InputActuator(create_backend(backend_name)).start()
+    phrase = "the quick brown fox jumps over the lazy dog while the cat watches from the window"
+    if backend_name != "mock":
+        print("Focus a text editor, typing starts in 3 seconds")
+        time.sleep(3)
+    for strategy in ("keys", "clipboard"):
+        if strategy == "clipboard" and backend_name == "mock":
+            continue
+        session = DictationSession(create_injector(strategy, actuator))
+        for _ in range(3):
+            session.commit(phrase)
+        print(f"{strategy:9s}: {session.stats()['chars_per_second']:.0f} chars/s")
+    actuator.stop()
+
+    # Streaming partial results that revise themselves, typed as they arrive
+    partials = ["the", "the whether", "the weather is", "the weather is nice to", "the weather is nice today"]
+    mock = MockInjector()
+    session = DictationSession(mock)
+    for partial in partials:
+        session.update(partial)
+    session.commit("the weather is nice today")
+    # Clearing the previous hypothesis and typing the new one every time instead
+    retyped = 0
+    previous = ""
+    for hypothesis in partials + ["the weather is nice today "]:
+        retyped += len(previous) + len(hypothesis)
+        previous = hypothesis
+    print(f"Incremental: {mock.text!r} in {mock.keystrokes} keystrokes "
+          f"({session.backspaces} backspaces), retyping each partial would take {retyped}")
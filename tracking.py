@@ -0,0 +1,82 @@
+import cv2
+
+from blink import BlinkDetector
+from cursor_filter import CursorFilter
+from instrumentation import profiler
+from landmarks import eye_features, gaze_features, to_pixels
+
+
+class EyeTracker:
+    """Turn landmark snapshots into filtered cursor moves and blink clicks"""
+
+    def __init__(self, actuator, face_worker=None, blink_threshold=0.008, hold_threshold=0.008,
+                 blink_delay=0.3, cursor_filter=None):
+        self.actuator = actuator
+        self.face_worker = face_worker  # Told when the cursor moved, for latency stats
+        self.screen_w, self.screen_h = actuator.size()
+        self.blink_detector = BlinkDetector(blink_threshold, hold_threshold, refractory=blink_delay)
+        self.cursor_filter = cursor_filter or CursorFilter()
+        # GazeMapping from gaze_calibration.py; None moves the cursor with the raw iris position
+        self.gaze_mapping = None
+
+        # Called with each click event before the default click; return True to consume it
+        self.click_handler = None
+
+        self.enabled = True
+        self.eyes = None  # EyeFeatures of the last tracked frame
+        self.holding_click = False
+        self.blink_counter = 0
+        self.blink_detected = False
+
+    def update(self, snapshot):
+        """Process one landmark snapshot and return the blink events it produced"""
+        if snapshot.landmarks is None or not self.enabled:
+            # Start the filter fresh when the face comes back
+            self.eyes = None
+            self.cursor_filter.reset()
+            return []
+
+        with profiler.span("tracking.landmarks"):
+            eyes = self.eyes = eye_features(snapshot.landmarks)
+
+            # Move cursor using eye landmarks
+            if self.gaze_mapping is not None:
+                gaze_x, gaze_y = self.gaze_mapping(gaze_features(snapshot.landmarks))
+                target = (gaze_x * self.screen_w, gaze_y * self.screen_h)
+            else:
+                target = eyes.cursor_point * (self.screen_w, self.screen_h)
+            screen_x, screen_y = self.cursor_filter(target, snapshot.capture_time)
+        # Latency is counted when the move is performed, not when it is queued
+        done = None if self.face_worker is None else lambda: self.face_worker.mark_actuated(snapshot)
+        self.actuator.move_to(screen_x, screen_y, done=done)
+
+        # Blink detection
+        with profiler.span("tracking.blink"):
+            blink_events = self.blink_detector.update(eyes.left_eye_gap, eyes.right_eye_gap, snapshot.capture_time)
+        self.blink_detected = self.blink_detector.right_closed
+
+        for blink_event in blink_events:
+            # Normal Click (Right Eye Blink)
+            if blink_event.kind in ("click", "double_click"):
+                if not (self.click_handler and self.click_handler(blink_event)):
+                    # A double blink follows a click, so one more click makes the OS see a double click
+                    self.actuator.click()
+                self.blink_counter += 1
+
+            # Hold Click (Left Eye Closed)
+            elif blink_event.kind == "hold_start":
+                self.actuator.mouse_down()
+                self.holding_click = True
+            elif blink_event.kind == "hold_end":
+                self.actuator.mouse_up()
+                self.holding_click = False
+
+        return blink_events
+
+    def draw_iris(self, frame, color):
+        """Mark the iris points of the last tracked frame on frame"""
+        if self.eyes is None:
+            return
+        frame_h, frame_w = frame.shape[:2]
+        for x, y in to_pixels(self.eyes.iris_points, frame_w, frame_h).tolist():
+            cv2.circle(frame, (x, y), 5, color, -1)
@@ -0,0 +1,383 @@
+import hashlib
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+import wave
+from collections import deque, namedtuple
+
+import numpy as np
+
+from instrumentation import profiler
+
+
+URGENT = 0  # Mode changes the user must hear now, cuts off less urgent speech
+NORMAL = 1  # Command confirmations
+LOW = 2  # Chatter that is worthless once late (scrolling, repeated errors)
+
+# Seconds a message may wait in the queue before it is dropped instead of spoken
+MAX_AGE = {URGENT: None, NORMAL: 4.0, LOW: 1.5}
+
+# One queued message. Only the newest message of a key ("mode", "keyboard", ...) is worth saying.
+Utterance = namedtuple("Utterance", ["priority", "seq", "text", "key", "queued_at"])
+
+
+class SimulatedEngine:
+    """Stands in for a pyttsx3 engine: speaks at a fixed word rate and writes silent WAV files"""
+
+    def __init__(self, words_per_second=2.5, synthesis_speedup=10, sample_rate=22050):
+        self.words_per_second = words_per_second
+        self.synthesis_speedup = synthesis_speedup
+        self.sample_rate = sample_rate
+        self.properties = {"voice": "simulated", "rate": 150}
+        self.pending = []
+        self.on_word = None
+        self.stopping = False
+
+    def getProperty(self, name):
+        return self.properties.get(name)
+
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def connect(self, topic, callback):
+        if topic == "started-word":
+            self.on_word = callback
+
+    def say(self, text):
+        self.pending.append((text, None))
+
+    def save_to_file(self, text, path):
+        self.pending.append((text, path))
+
+    def stop(self):
+        self.stopping = True
+
+    def runAndWait(self):
+        self.stopping = False
+        pending, self.pending = self.pending, []
+        for text, path in pending:
+            duration = len(text.split()) / self.words_per_second
+            if path:
+                time.sleep(duration / self.synthesis_speedup)
+                with wave.open(path, "wb") as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(2)
+                    wav.setframerate(self.sample_rate)
+                    wav.writeframes(np.zeros(int(duration * self.sample_rate), np.int16).tobytes())
+                continue
+            for word in text.split():
+                if self.on_word:
+                    self.on_word(None, 0, len(word))
+                if self.stopping:
+                    return
+                time.sleep(1 / self.words_per_second)
+
+
+class SpeechWorker:
+    """Speak messages on a dedicated thread that owns the TTS engine
+
+    say() only queues the text, so callers never wait for speech. The worker speaks the most
+    urgent message first, drops messages that waited too long or were replaced by a newer one
+    with the same key, and cuts off the current message when something more urgent arrives.
+    Phrases are synthesized to WAV files once, while idle, and from then on played through
+    pygame.mixer, which starts at once and stops cleanly when interrupted.
+    """
+
+    def __init__(self, engine_factory=None, cache_dir="tts_cache", rate=None, history=300):
+        self.engine_factory = engine_factory
+        self.cache_dir = cache_dir  # None disables the cache
+        self.rate = rate
+        self.heap = []
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.running = False
+        self.thread = None
+        self.ready = threading.Event()
+        self.current = None  # Utterance being spoken
+        self.interrupt = threading.Event()
+
+        self.engine = None
+        self.mixer = None
+        self.voice_key = ""
+        self.cache = {}  # text -> WAV path
+        self.sounds = {}  # text -> loaded mixer Sound
+        self.to_synthesize = deque()  # Phrases to cache when nothing is queued
+        self.uncacheable = set()
+
+        self.waits = deque(maxlen=history)  # Seconds from say() to the start of speech
+        self.counts = {"spoken": 0, "from_cache": 0, "coalesced": 0, "expired": 0, "interrupted": 0,
+                       "synthesized": 0}
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._speech_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self, drain_timeout=2.0):
+        """Let queued messages finish for up to drain_timeout seconds, then stop the thread"""
+        self.wait_idle(drain_timeout)
+        with self.lock:
+            self.running = False
+            self.heap.clear()
+            self.interrupt.set()
+            self.changed.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def wait_idle(self, timeout=None):
+        """Wait until nothing is queued or being spoken"""
+        with self.lock:
+            return self.changed.wait_for(lambda: (not self.heap and self.current is None) or not self.running,
+                                         timeout=timeout)
+
+    # Public API, safe to call from any thread and never blocks on the engine
+
+    def say(self, text, priority=NORMAL, key=None):
+        now = time.perf_counter()
+        with self.lock:
+            current = self.current
+            if current is not None and current.text == text:
+                # Already being said
+                self.counts["coalesced"] += 1
+                return
+            kept = [queued for queued in self.heap if queued.text != text and (key is None or queued.key != key)]
+            if len(kept) != len(self.heap):
+                self.counts["coalesced"] += len(self.heap) - len(kept)
+                self.heap = kept
+                heapq.heapify(self.heap)
+            heapq.heappush(self.heap, Utterance(priority, next(self.seq), text, key, now))
+            if current is not None and (priority < current.priority or (key is not None and key == current.key)):
+                self.interrupt.set()
+            self.changed.notify_all()
+
+    def prefetch(self, phrases):
+        """Synthesize phrases into the cache in idle time so even their first use plays instantly"""
+        with self.lock:
+            self.to_synthesize.extend(phrases)
+            self.changed.notify_all()
+
+    def clear(self):
+        """Drop queued messages and cut off the current one"""
+        with self.lock:
+            self.counts["coalesced"] += len(self.heap)
+            self.heap.clear()
+            if self.current is not None:
+                self.interrupt.set()
+            self.changed.notify_all()
+
+    # Worker thread
+
+    def _open_engine(self):
+        if self.engine_factory is None:
+            import pyttsx3
+            self.engine_factory = pyttsx3.init
+        try:
+            self.engine = self.engine_factory()
+        except Exception as e:
+            print(f"Could not start text to speech: {e}")
+            self.engine = None
+            return
+        if self.rate:
+            self.engine.setProperty("rate", self.rate)
+        self.voice_key = f"{self.engine.getProperty('voice')}|{self.engine.getProperty('rate')}"
+        # pyttsx3 can only be stopped from inside its own loop, so check for interruptions at every word
+        self.engine.connect("started-word", self._on_word)
+
+    def _open_mixer(self):
+        if self.cache_dir is None:
+            return
+        try:
+            import pygame
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            self.mixer = pygame.mixer
+        except Exception as e:
+            print(f"No audio mixer for cached speech ({e}), speaking every message live")
+            self.mixer = None
+
+    def _on_word(self, name, location, length):
+        if self.interrupt.is_set():
+            self.engine.stop()
+
+    def _speech_loop(self):
+        self._open_engine()
+        self._open_mixer()
+        self.ready.set()
+        while True:
+            with self.lock:
+                self.changed.wait_for(lambda: self.heap or self.to_synthesize or not self.running)
+                if not self.running:
+                    break
+                utterance = self._next_utterance()
+                # Every queued message may have expired with nothing left to synthesize either
+                phrase = self.to_synthesize.popleft() if utterance is None and self.to_synthesize else None
+                if utterance is None and phrase is None:
+                    continue
+                self.current = utterance
+                self.interrupt.clear()
+
+            try:
+                if utterance is not None:
+                    self._speak(utterance)
+                else:
+                    self._synthesize(phrase)
+            except Exception as e:
+                # One bad message must not take speech down for the rest of the session
+                print(f"Text to speech error: {e}")
+
+            with self.lock:
+                self.current = None
+                self.changed.notify_all()
+
+    def _next_utterance(self):
+        """Most urgent message that is still fresh, dropping stale ones on the way"""
+        now = time.perf_counter()
+        while self.heap:
+            utterance = heapq.heappop(self.heap)
+            max_age = MAX_AGE.get(utterance.priority)
+            if max_age is not None and now - utterance.queued_at > max_age:
+                self.counts["expired"] += 1
+                continue
+            return utterance
+        return None
+
+    def _speak(self, utterance):
+        wait = time.perf_counter() - utterance.queued_at
+        self.waits.append(wait)
+        profiler.record("voice.tts_wait", wait)
+        with profiler.span("voice.tts"):
+            if self._play_cached(utterance.text):
+                self.counts["from_cache"] += 1
+            else:
+                self._speak_live(utterance.text)
+                # Heard once, likely to come back: have it ready next time
+                if self.mixer and utterance.text not in self.uncacheable:
+                    self.to_synthesize.append(utterance.text)
+        self.counts["spoken"] += 1
+        if self.interrupt.is_set():
+            self.counts["interrupted"] += 1
+
+    def _speak_live(self, text):
+        if self.engine is None:
+            return
+        try:
+            self.engine.say(text)
+            self.engine.runAndWait()
+        except RuntimeError as e:
+            # The engine's run loop got stuck; start over with a fresh one
+            print(f"Text to speech error ({e}), restarting the engine")
+            try:
+                self.engine.stop()
+            except Exception:
+                pass
+            self._open_engine()
+
+    def _cache_path(self, text):
+        digest = hashlib.sha1(f"{self.voice_key}|{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".wav")
+
+    def _cached_path(self, text):
+        """WAV file for text if it was synthesized before, in this session or an earlier one"""
+        if self.mixer is None:
+            return None
+        if text not in self.cache:
+            path = self._cache_path(text)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                return None
+            self.cache[text] = path
+        return self.cache[text]
+
+    def _play_cached(self, text):
+        path = self._cached_path(text)
+        if path is None:
+            return False
+        sound = self.sounds.get(text)
+        if sound is None:
+            try:
+                sound = self.sounds[text] = self.mixer.Sound(path)
+            except Exception as e:
+                print(f"Could not load cached speech {path}: {e}")
+                del self.cache[text]
+                self.uncacheable.add(text)
+                return False
+        channel = sound.play()
+        while channel is not None and channel.get_busy():
+            if self.interrupt.wait(0.01):
+                channel.stop()
+                break
+        return True
+
+    def _synthesize(self, text):
+        if self.engine is None or self.mixer is None or text in self.uncacheable or self._cached_path(text):
+            return
+        path = self._cache_path(text)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with profiler.span("voice.tts_synthesize"):
+                self.engine.save_to_file(text, path)
+                self.engine.runAndWait()
+        except (OSError, RuntimeError) as e:
+            print(f"Could not cache speech for '{text}': {e}")
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.cache[text] = path
+            self.counts["synthesized"] += 1
+        else:
+            self.uncacheable.add(text)
+
+    def stats(self):
+        """Message counts and p50/p95 wait from say() to speech in milliseconds"""
+        with self.lock:
+            stats = dict(self.counts)
+            waits = np.array(self.waits) * 1000
+        if len(waits):
+            stats["wait_p50_ms"] = float(np.percentile(waits, 50))
+            stats["wait_p95_ms"] = float(np.percentile(waits, 95))
+        return stats
+
+
+if __name__ == "__main__":
+    # python tts_worker.py [--simulated]: caller blocking time of runAndWait against the worker
+    if "--simulated" in sys.argv:
+        factory = SimulatedEngine
+    else:
+        import pyttsx3
+        factory = pyttsx3.init
+    messages = ["Command mode activated", "Command: scroll down", "Scrolling down", "Command: right click",
+                "Command mode timed out"]
+
+    blocking_engine = factory()
+    start = time.perf_counter()
+    for message in messages:
+        blocking_engine.say(message)
+        blocking_engine.runAndWait()
+    blocked = (time.perf_counter() - start) / len(messages)
+    print(f"say + runAndWait in the caller: {blocked * 1000:.0f} ms per message")
+    del blocking_engine
+
+    worker = SpeechWorker(factory, cache_dir="tts_cache_demo").start()
+    worker.ready.wait(5)
+    start = time.perf_counter()
+    for message in messages:
+        worker.say(message)
+    print(f"SpeechWorker.say in the caller:  {(time.perf_counter() - start) / len(messages) * 1e6:.0f} us per message")
+    worker.wait_idle(30)
+
+    # A burst like a user scrolling repeatedly, then a mode change that must be heard
+    for _ in range(10):
+        worker.say("Scrolling down", LOW, key="scroll")
+        time.sleep(0.05)
+    worker.say("Command mode activated", URGENT, key="mode")
+    worker.wait_idle(30)
+
+    # Everything again, now from the cache where a mixer is available
+    for message in messages:
+        worker.say(message)
+        worker.wait_idle(30)
+    print(worker.stats())
+    worker.stop()
@@ -1,24 +1,49 @@
+# First, so the startup milestones count from launch
+from instrumentation import ProfilerOverlay, profiler, startup
 import cv2
-import mediapipe as mp
-import pyautogui
 import pygame
 import numpy as np
-import speech_recognition as sr
-import pyttsx3
 import threading
-from queue import Queue, Empty
+from queue import Queue
 import time
 import re
 import os
+import argparse
 import subprocess
+import signal
 import time
 
+from capture import CameraSource, FrameCapture
+from inference import FaceMeshWorker, FaceRoiTracker
+from actuation import InputActuator, create_backend
+from cursor_filter import CursorFilter
+from render_cache import DirtyRegions, SurfaceCache
+from tracking import EyeTracker
+from replay import SessionRecorder
+from governor import Governor
+from speech_backends import (BackendError, GoogleBackend, NoSpeechError, PartialStabilizer,
+                             create_speech_backend)
+from keyword_spotter import KeywordSpotter
+from command_grammar import CommandGrammar
+from tts_worker import LOW, NORMAL, URGENT, SpeechWorker
+from command_registry import WORKER, CommandRegistry, QueuedCommand
+from scheduler import Scheduler
+from text_injection import DictationSession, KeystrokeInjector, create_injector
+from key_selection import DwellSelector, KeyGrid, WindowTransform, layout_rects, save_trace
+from word_prediction import WordPredictor
+from gaze_calibration import GazeMapping, run_calibration
+from status_indicator import StatusIndicator
+from status_overlay import BLUE, GREEN, ORANGE, RED, StatusOverlay
+
 
 class OnScreenKeyboard:
-    def __init__(self, screen, screen_width, screen_height):
+    def __init__(self, screen, screen_width, screen_height, actuator=None, surfaces=None, dwell_time=None,
+                 predictor=None):
         self.screen = screen
         self.screen_width = screen_width
         self.screen_height = screen_height
+        self.actuator = actuator or InputActuator().start()
+        self.surfaces = surfaces or SurfaceCache()
         self.active = False
         self.font = pygame.font.Font(None, 30)
         self.key_font = pygame.font.Font(None, 24)
@@ -35,9 +60,13 @@ class OnScreenKeyboard:
         self.kb_x = (screen_width - self.kb_width) // 2
         self.kb_y = screen_height - self.kb_height - 10
 
-        # Text input field
+        # Text input field, sharing its row with the word completions when there is a predictor
         self.text_input = ""
-        self.input_rect = pygame.Rect(self.kb_x, self.kb_y - 40, self.kb_width, 30)
+        self.predictor = predictor
+        self.suggestions = []  # Completions of the word being typed, shown as selectable keys
+        self.suggestion_slots = 3 if predictor else 0
+        input_width = self.kb_width * 0.4 if predictor else self.kb_width
+        self.input_rect = pygame.Rect(self.kb_x, self.kb_y - 40, input_width, 30)
 
         # Define keyboard layout
         self.layout = [
@@ -50,70 +79,109 @@ class OnScreenKeyboard:
         self.keys = []
         self.build_keyboard()
 
+        # Gaze arrives in desktop coordinates; keys are looked up in the window's
+        self.transform = WindowTransform()
+        # With a dwell time, keys are typed by looking at them instead of blinking
+        self.dwell = DwellSelector(dwell_time) if dwell_time else None
+        self.gaze_index = -1  # Key under the gaze cursor
+
         # Toggle button
         self.toggle_btn = pygame.Rect(10, screen_height - 40, 120, 30)
 
     def build_keyboard(self):
-        """Build the keyboard with key rectangles"""
+        """Build the keyboard with key rectangles and the hit-test grid"""
         self.keys = []
-        num_rows = len(self.layout)
-
-        for row_idx, row in enumerate(self.layout):
-            num_keys = len(row)
-            key_width = self.kb_width / max(len(layout_row) for layout_row in self.layout)
-            key_height = self.kb_height / num_rows
-
-            # Center this row
-            row_width = num_keys * key_width
-            start_x = self.kb_x + (self.kb_width - row_width) / 2
-
-            for key_idx, key in enumerate(row):
-                # Special cases for wider keys
-                if key == 'Space':
-                    key_rect = pygame.Rect(
-                        start_x + key_idx * key_width,
-                        self.kb_y + row_idx * key_height,
-                        key_width * 3,
-                        key_height
-                    )
-                elif key in ['Backspace', 'Enter', 'Clear', 'Close']:
-                    key_rect = pygame.Rect(
-                        start_x + key_idx * key_width,
-                        self.kb_y + row_idx * key_height,
-                        key_width * 1.5,
-                        key_height
-                    )
-                else:
-                    key_rect = pygame.Rect(
-                        start_x + key_idx * key_width,
-                        self.kb_y + row_idx * key_height,
-                        key_width,
-                        key_height
-                    )
-
-                self.keys.append({'rect': key_rect, 'key': key, 'row': row_idx, 'col': key_idx})
+        for key, row_idx, key_idx, box in layout_rects(self.layout, self.kb_x, self.kb_y, self.kb_width,
+                                                        self.kb_height):
+            self.keys.append({'rect': pygame.Rect(*box), 'key': key, 'row': row_idx, 'col': key_idx})
+        # Completion keys right of the text field; their labels change, so they are drawn live
+        slot_width = (self.kb_width - self.input_rect.width) / max(1, self.suggestion_slots)
+        for slot in range(self.suggestion_slots):
+            rect = pygame.Rect(self.input_rect.right + slot * slot_width, self.input_rect.y, slot_width, 30)
+            self.keys.append({'rect': rect, 'key': f'#{slot + 1}', 'row': -1, 'col': slot, 'slot': slot})
+        self.grid = KeyGrid([key['rect'] for key in self.keys])
+
+        self._bake_keyboard()
+
+    def _draw_key(self, surface, key, rect, key_color):
+        pygame.draw.rect(surface, key_color, rect)
+        pygame.draw.rect(surface, (120, 120, 120), rect, 1)  # Key border
+        key_text = self.surfaces.text(self.key_font, key['key'], self.text_color)
+        surface.blit(key_text, key_text.get_rect(center=rect.center))
+
+    def _bake_keyboard(self):
+        """Pre-render the background and every key into one surface so draw() is a single blit"""
+        background = pygame.Rect(self.kb_x, self.kb_y, self.kb_width, self.kb_height)
+        fixed_keys = [key for key in self.keys if 'slot' not in key]
+        # Wide keys can stick out past the background, so bake the union of everything
+        self.kb_rect = background.unionall([key['rect'] for key in fixed_keys])
+        self.keyboard_surface = pygame.Surface(self.kb_rect.size, pygame.SRCALPHA)
+        self.keyboard_surface.fill(self.bg_color, background.move(-self.kb_rect.x, -self.kb_rect.y))
+        for key in fixed_keys:
+            self._draw_key(self.keyboard_surface, key, key['rect'].move(-self.kb_rect.x, -self.kb_rect.y),
+                           self.key_color)
+        if pygame.display.get_surface() is not None:
+            self.keyboard_surface = self.keyboard_surface.convert_alpha()
+        self.highlight_surfaces = {}
+
+    def _highlight_surface(self, index):
+        """Highlighted version of one key, rendered the first time it is hovered"""
+        if index not in self.highlight_surfaces:
+            key = self.keys[index]
+            surface = pygame.Surface(key['rect'].size)
+            self._draw_key(surface, key, surface.get_rect(), self.highlight_color)
+            self.highlight_surfaces[index] = surface
+        return self.highlight_surfaces[index]
 
     def toggle(self):
         """Toggle keyboard visibility"""
         self.active = not self.active
+        self.gaze_index = -1
+        self._update_suggestions()
+        if self.dwell is not None:
+            self.dwell.reset()
         return self.active
 
+    def current_word(self):
+        return self.text_input.split(' ')[-1]
+
+    def _update_suggestions(self):
+        if self.predictor:
+            self.suggestions = self.predictor.complete(self.current_word(), self.suggestion_slots)
+
     def process_key(self, key):
         """Process a key press"""
+        result = self._process_key(key)
+        self._update_suggestions()
+        return result
+
+    def _process_key(self, key):
+        if key.startswith('#'):
+            # A completion: type the rest of the word and a space in one go
+            slot = int(key[1:]) - 1
+            if slot < len(self.suggestions):
+                word = self.suggestions[slot]
+                rest = word[len(self.current_word()):] + ' '
+                self.text_input += rest
+                self.actuator.write(rest)
+                self.predictor.learn(word)
+            return None
+        if key in ('Space', 'Enter') and self.predictor and self.current_word():
+            self.predictor.learn(self.current_word())
         if key == 'Backspace':
             if self.text_input:
                 self.text_input = self.text_input[:-1]
                 # Actually press backspace on the system
-                pyautogui.press('backspace')
+                self.actuator.press('backspace')
         elif key == 'Space':
             self.text_input += ' '
             # Actually press space on the system
-            pyautogui.press('space')
+            self.actuator.press('space')
         elif key == 'Enter':
             # Clear the internal buffer but don't type anything
             temp = self.text_input
             self.text_input = ""
-            pyautogui.press('enter')
+            self.actuator.press('enter')
             return temp
         elif key == 'Clear':
             self.text_input = ""
@@ -122,71 +190,106 @@ class OnScreenKeyboard:
         else:
             self.text_input += key
             # Actually type the character immediately
-            pyautogui.write(key)
+            self.actuator.write(key)
         return None
 
     def get_key_at_pos(self, pos):
-        """Get the key at the given position"""
-        # Convert global screen coordinates to pygame window coordinates
-        window_pos = (pos[0] % self.screen_width, pos[1] % self.screen_height)
-
-        for key in self.keys:
-            if key['rect'].collidepoint(window_pos):
-                return key['key']
-        return None
+        """Get the key at the given desktop position"""
+        index = self.grid.lookup(*self.transform.to_window(pos))
+        return self.keys[index]['key'] if index >= 0 else None
+
+    def update_gaze(self, pos, timestamp):
+        """Follow the gaze cursor (desktop coordinates); returns a key selected by dwelling on it, or None"""
+        self.gaze_index = self.grid.lookup(*self.transform.to_window(pos))
+        if self.dwell is None:
+            return None
+        selected = self.dwell.update(self.gaze_index if self.gaze_index >= 0 else None, timestamp)
+        return self.keys[selected]['key'] if selected is not None else None
 
-    def draw(self):
-        """Draw the keyboard on screen"""
+    def draw(self, target=None):
+        """Draw the keyboard on target (the screen by default, or anything with a Surface-style blit)"""
+        target = target or self.screen
+        toggle_bg = self.surfaces.box((100, 100, 200), self.toggle_btn.size)
         if not self.active:
             # Just draw the toggle button
-            pygame.draw.rect(self.screen, (100, 100, 200), self.toggle_btn)
-            toggle_text = self.font.render("Keyboard", True, self.text_color)
-            self.screen.blit(toggle_text, (self.toggle_btn.x + 10, self.toggle_btn.y + 5))
+            target.blit(toggle_bg, self.toggle_btn.topleft)
+            toggle_text = self.surfaces.text(self.font, "Keyboard", self.text_color)
+            target.blit(toggle_text, (self.toggle_btn.x + 10, self.toggle_btn.y + 5))
             return
 
-        # Draw keyboard background
-        pygame.draw.rect(self.screen, self.bg_color, (self.kb_x, self.kb_y, self.kb_width, self.kb_height))
+        # Draw keyboard background and keys in one go
+        target.blit(self.keyboard_surface, self.kb_rect.topleft)
 
         # Draw text input field
-        pygame.draw.rect(self.screen, (60, 60, 60), self.input_rect)
-        text_surface = self.font.render(self.text_input, True, self.text_color)
-        self.screen.blit(text_surface, (self.input_rect.x + 5, self.input_rect.y + 5))
-
-        # Draw keys
-        mouse_pos = pygame.mouse.get_pos()
-        for key in self.keys:
-            # Check if mouse is over this key for highlighting
-            if key['rect'].collidepoint(mouse_pos):
-                key_color = self.highlight_color
-            else:
-                key_color = self.key_color
-
-            pygame.draw.rect(self.screen, key_color, key['rect'])
-            pygame.draw.rect(self.screen, (120, 120, 120), key['rect'], 1)  # Key border
-
-            # Key text
-            key_text = self.key_font.render(key['key'], True, self.text_color)
-            text_rect = key_text.get_rect(center=key['rect'].center)
-            self.screen.blit(key_text, text_rect)
+        target.blit(self.surfaces.box((60, 60, 60), self.input_rect.size), self.input_rect.topleft)
+        text_surface = self.surfaces.text(self.font, self.text_input, self.text_color)
+        target.blit(text_surface, (self.input_rect.x + 5, self.input_rect.y + 5))
+
+        # Completion keys
+        first_slot = len(self.keys) - self.suggestion_slots
+        for index, key in enumerate(self.keys[first_slot:], first_slot):
+            rect = key['rect']
+            color = self.highlight_color if index == self.gaze_index else self.key_color
+            target.blit(self.surfaces.box(color, rect.size), rect.topleft)
+            if key['slot'] < len(self.suggestions):
+                word_surface = self.surfaces.text(self.key_font, self.suggestions[key['slot']], self.text_color)
+                target.blit(word_surface, word_surface.get_rect(center=rect.center))
+
+        # Highlight the key under the gaze cursor (the last one drawn wins where wide keys overlap)
+        if self.gaze_index >= 0:
+            rect = self.keys[self.gaze_index]['rect']
+            if 'slot' not in self.keys[self.gaze_index]:
+                target.blit(self._highlight_surface(self.gaze_index), rect.topleft)
+            if self.dwell is not None and self.dwell.progress > 0:
+                # Dwell progress bar along the bottom of the key, in 20 steps so the sizes stay cached
+                width = int(rect.width * int(self.dwell.progress * 20) / 20)
+                if width:
+                    target.blit(self.surfaces.box((120, 220, 120), (width, 4)), (rect.x, rect.bottom - 4))
 
         # Draw toggle button
-        pygame.draw.rect(self.screen, (100, 100, 200), self.toggle_btn)
-        toggle_text = self.font.render("Hide Keyboard", True, self.text_color)
-        self.screen.blit(toggle_text, (self.toggle_btn.x + 5, self.toggle_btn.y + 5))
+        target.blit(toggle_bg, self.toggle_btn.topleft)
+        toggle_text = self.surfaces.text(self.font, "Hide Keyboard", self.text_color)
+        target.blit(toggle_text, (self.toggle_btn.x + 5, self.toggle_btn.y + 5))
 
 
 class VoiceCommandHandler:
-    def __init__(self, wake_phrases=None):
-        self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
+    def __init__(self, wake_phrases=None, actuator=None, speech_backend=None, keyword_spotter=None,
+                 audio_stream=None, tts_worker=None, scheduler=None, text_injector=None):
+        self.actuator = actuator or InputActuator().start()
+        # speech_recognition, the microphone and the backend are set up on the listener thread
+        # (_start_voice), so creating the handler doesn't hold up eye tracking
+        self.sr = None
+        self.StreamClosed = None  # audio_stream.StreamClosed, raised by readers once the microphone stops
+        self.recognizer = None
+        self.microphone = None
+        self.audio = audio_stream
+        self.pre_roll = 0.3  # Seconds of audio from before a listen starts, so phrase starts aren't clipped
+        # Streaming backends let commands fire from partial results before the phrase ends. A function
+        # returning a backend is called on the listener thread, for backends that are slow to load.
+        self.speech_backend = speech_backend
+        self.ready = threading.Event()  # Set once the microphone is calibrated and commands are heard
+        self.ready_time = None  # perf_counter time it was set
+        self.stabilizer = PartialStabilizer()
+        self.partial_action = None  # What the current phrase already triggered: None, "wake" or a command
+        # With enrolled wake phrases, full recognition only runs once one of them was spotted on-device
+        if keyword_spotter is not None and not keyword_spotter.phrases:
+            keyword_spotter = None
+        self.keyword_spotter = keyword_spotter
         self.command_queue = Queue()
         self.is_listening = False
         self.is_actively_listening = False
         self.voice_feedback_enabled = True
-        self.engine = pyttsx3.init()
+        # Speech output runs on its own thread, so feedback never stalls tracking or audio capture
+        self.tts = tts_worker or SpeechWorker().start()
+        # Timeouts are entries in one scheduler thread's heap, not a new thread per reset
+        self.scheduler = scheduler or Scheduler().start()
         self.typing_mode = False
         self.typing_thread = None
         self.stop_typing_event = threading.Event()
+        # Dictated text goes out in batches (or one paste) and partial results are corrected in place
+        self.dictation = DictationSession(text_injector or KeystrokeInjector(self.actuator))
+        self.dictation_focus = None  # Cursor position of the last click that focused the text field
+        self.refocus_distance = 40  # Pixels the gaze must move before dictation clicks to focus again
 
         # Set default wake phrases if none provided
         if wake_phrases is None:
@@ -212,18 +315,46 @@ class VoiceCommandHandler:
                                 "windows keyboard"],
             "close keyboard": ["close keyboard", "hide keyboard"],
         }
+        # Compiled once; matching cost depends on the words heard, not the size of the table
+        self.grammar = CommandGrammar(self.command_variations)
+        self.wake_grammar = CommandGrammar({"wake": self.wake_phrases})
+        all_variations = [variation for variations in self.command_variations.values() for variation in variations]
+        # Offline engines only listen for these phrases while waiting for commands
+        self.command_grammar = sorted(set(self.wake_phrases + all_variations))
+        # Have the fixed feedback phrases synthesized before they are first needed
+        self.tts.prefetch(["Command mode activated", "Command mode timed out", "Scrolling up", "Scrolling down"]
+                          + [f"Command: {command}" for command in self.command_variations])
 
         self.wake_word_active = False
         self.wake_word_timeout = 12  # Longer timeout (8 seconds)
-        self.wake_word_timer = None
+        self.wake_word_timer = None  # TimerHandle, re-armed on every wake phrase and command
         self.last_heard_text = ""  # Store last heard text for debugging
         self.last_command_time = 0
 
+    def _start_voice(self):
+        """Import the speech stack, open the microphone, load the backend and calibrate"""
+        import speech_recognition as sr
+        from audio_stream import AudioStream, StreamClosed
+        self.sr = sr
+        self.StreamClosed = StreamClosed
+        self.recognizer = sr.Recognizer()
+
         # Set recognition parameters with lower energy threshold and longer pause
         self.recognizer.energy_threshold = 250  # Lower threshold for better sensitivity
         self.recognizer.dynamic_energy_threshold = True
         self.recognizer.pause_threshold = 1.0  # Longer pause for better phrase completion
 
+        if self.audio is None:
+            # The microphone stays open; every listener reads the shared buffer through its own reader
+            self.microphone = sr.Microphone()
+            self.audio = AudioStream(self.microphone).start()
+        if self.audio.sample_rate is None:
+            raise RuntimeError("the microphone could not be opened")
+        if self.speech_backend is None:
+            self.speech_backend = GoogleBackend(self.recognizer)
+        elif callable(self.speech_backend):
+            self.speech_backend = self.speech_backend()
+
         # Perform initial calibration
         self.calibrate_microphone()
 
@@ -240,12 +371,12 @@ class VoiceCommandHandler:
             # Launch the keyboard
             subprocess.Popen("osk")
             if self.voice_feedback_enabled:
-                self.speak("On-screen keyboard launched")
+                self.speak("On-screen keyboard launched", NORMAL, "keyboard")
             return True
         except Exception as e:
             print(f"Error launching on-screen keyboard: {e}")
             if self.voice_feedback_enabled:
-                self.speak("Failed to launch on-screen keyboard")
+                self.speak("Failed to launch on-screen keyboard", NORMAL, "keyboard")
             return False
 
     def close_system_keyboard(self):
@@ -253,7 +384,7 @@ class VoiceCommandHandler:
         try:
             os.system("taskkill /f /im osk.exe")
             if self.voice_feedback_enabled:
-                self.speak("On-screen keyboard closed")
+                self.speak("On-screen keyboard closed", NORMAL, "keyboard")
             return True
         except Exception as e:
             print(f"Error closing on-screen keyboard: {e}")
@@ -261,53 +392,43 @@ class VoiceCommandHandler:
 
     def calibrate_microphone(self):
         """Calibrate the microphone for ambient noise"""
+        if self.audio is None:
+            print("The microphone is not open yet, it is calibrated as soon as it is")
+            return
         print("Starting microphone calibration. Please remain silent...")
         try:
-            with self.microphone as source:
+            with self.audio.reader() as source:
                 self.recognizer.adjust_for_ambient_noise(source, duration=3)
             print(f"Calibration complete. Energy threshold: {self.recognizer.energy_threshold}")
-            if hasattr(self, 'engine'):
-                self.speak("Microphone calibrated.")
+            self.speak("Microphone calibrated.")
         except Exception as e:
             print(f"Calibration error: {e}")
 
-    def speak(self, text):
+    def speak(self, text, priority=NORMAL, key=None):
+        """Queue spoken feedback; a newer message with the same key replaces an unspoken one"""
         if self.voice_feedback_enabled:
-            try:
-                self.engine.say(text)
-                self.engine.runAndWait()
-            except RuntimeError:
-                # If the engine is busy, stop it and try again
-                self.engine.stop()
-                try:
-                    self.engine = pyttsx3.init()
-                    self.engine.say(text)
-                    self.engine.runAndWait()
-                except:
-                    pass  # If still fails, silently ignore to prevent disrupting the main program
+            self.tts.say(text, priority, key)
 
     def start_listening(self):
         self.is_listening = True
         self.listener_thread = threading.Thread(target=self._listen_for_commands)
         self.listener_thread.daemon = True
         self.listener_thread.start()
-        self.speak(f"Voice commands activated. Say {self.wake_phrases[0]} to start")
 
     def stop_listening(self):
         self.is_listening = False
         if hasattr(self, 'listener_thread'):
             self.listener_thread.join(timeout=1)
-        self.speak("Voice commands deactivated")
+        if self.audio is not None:
+            self.audio.stop()
+        self.speak("Voice commands deactivated", URGENT, "mode")
 
     def _reset_wake_word_timer(self):
         """Reset the wake word timeout timer"""
-        if self.wake_word_timer:
-            self.wake_word_timer.cancel()
-
-        # Set a timer to deactivate wake word after timeout
-        self.wake_word_timer = threading.Timer(self.wake_word_timeout, self._deactivate_wake_word)
-        self.wake_word_timer.daemon = True
-        self.wake_word_timer.start()
+        if self.wake_word_timer is None:
+            self.wake_word_timer = self.scheduler.schedule(self.wake_word_timeout, self._deactivate_wake_word)
+        else:
+            self.wake_word_timer.reschedule(self.wake_word_timeout)
 
     def _deactivate_wake_word(self):
         """Deactivate wake word mode after timeout"""
@@ -315,137 +436,178 @@ class VoiceCommandHandler:
             self.wake_word_active = False
             print("Wake word deactivated due to timeout")
             if self.voice_feedback_enabled:
-                self.speak("Command mode timed out")
+                self.speak("Command mode timed out", NORMAL, "mode")
 
     def _check_for_wake_phrase(self, text):
-        """Check if any wake phrase is in the text"""
-        text = text.lower()
-        for phrase in self.wake_phrases:
-            # Check for exact match or close match (e.g., "eye control" vs "i control")
-            if phrase in text or self._is_similar_to(text, phrase):
-                return True
-        return False
-
-    def _is_similar_to(self, text, phrase):
-        """Check if text is phonetically similar to a phrase"""
-        # Simple phonetic similarity checks
-        similar_sounds = {
-            "eye": ["i", "ai", "aye"],
-            "hey": ["hay", "hi", "he"],
-            "control": ["controller", "controls", "controll"],
-            "computer": ["compute", "commuter", "computing"],
-        }
-
-        # Check original text for each word in phrase
-        phrase_words = phrase.split()
-        text_words = text.split()
-
-        # If lengths are very different, likely not a match
-        if abs(len(phrase_words) - len(text_words)) > 1:
-            return False
-
-        # Check each word
-        matches = 0
-        for p_word in phrase_words:
-            # Check for direct match
-            if p_word in text_words:
-                matches += 1
-                continue
+        """Check if any wake phrase is in the text, allowing sound-alikes (e.g. "i control" for "eye control")"""
+        return self.wake_grammar.best(text) is not None
+
+    def _stream_phrase(self, source, timeout, phrase_time_limit, keep_going, on_partial=None, grammar=None):
+        """Stream microphone audio to the speech backend until the phrase ends, returns the final text
+
+        Mirrors recognizer.listen(): gives up with "" after timeout seconds without speech and
+        cuts the phrase phrase_time_limit seconds after speech started.
+        """
+        stream = self.speech_backend.start_stream(source.SAMPLE_RATE, grammar)
+        start = time.perf_counter()
+        speech_start = None
+        while keep_going():
+            result = stream.accept(source.stream.read(source.CHUNK))
+            if result.is_final:
+                return result.text
+            now = time.perf_counter()
+            if result.text:
+                if speech_start is None:
+                    speech_start = now
+                if on_partial:
+                    on_partial(result.text)
+            elif speech_start is None and now - start > timeout:
+                break
+            if speech_start is not None and now - speech_start > phrase_time_limit:
+                break
+        return stream.finish()
+
+    def _on_command_partial(self, partial):
+        """Act on a wake phrase or command as soon as the partial hypothesis for it is stable"""
+        stable = self.stabilizer.update(partial.lower())
+        if not stable or self.partial_action:
+            return
+        if not self.wake_word_active:
+            if self._check_for_wake_phrase(stable):
+                self.partial_action = "wake"
+                self._activate_command_mode()
+            return
+        command, variation = self._match_variation(stable)
+        # A variation that starts a longer one ("right" -> "right click") waits for the final result
+        if command and not self.grammar.extends(variation):
+            self.partial_action = command
+            self._accept_command(command)
+
+    def _spot_wake_phrase(self, source):
+        """Run the local keyword spotter on raw microphone audio until a wake phrase is heard"""
+        source.seek_latest(self.pre_roll)
+        # The microphone runs at its native rate, the spotter resamples to its templates' rate
+        self.keyword_spotter.reset(source.SAMPLE_RATE)
+        while self.is_listening and not self.wake_word_active and not self.typing_mode:
+            phrase = self.keyword_spotter.feed(source.stream.read(source.CHUNK))
+            if phrase:
+                return phrase
+        return None
 
-            # Check for similar sounds
-            for t_word in text_words:
-                if p_word in similar_sounds and any(sim in t_word for sim in similar_sounds[p_word]):
-                    matches += 1
-                    break
+    def _activate_command_mode(self):
+        self.wake_word_active = True
+        self._reset_wake_word_timer()
+        if self.voice_feedback_enabled:
+            self.speak("Command mode activated", URGENT, "mode")
 
-        # Return true if we matched all words or all but one
-        return matches >= max(1, len(phrase_words) - 1)
+    def _accept_command(self, command):
+        self.command_queue.put(QueuedCommand(command, time.perf_counter()))
+        self._reset_wake_word_timer()  # Reset timeout on successful command
+        self.last_command_time = time.time()
+        if self.voice_feedback_enabled:
+            self.speak(f"Command: {command}", NORMAL, "command")
 
     def _listen_for_commands(self):
+        try:
+            self._start_voice()
+        except Exception as e:
+            print(f"Voice commands unavailable: {e}")
+            return
+        self.ready_time = time.perf_counter()
+        self.ready.set()
+        self.speak(f"Voice commands activated. Say {self.wake_phrases[0]} to start", URGENT, "mode")
+        reader = self.audio.reader()
         while self.is_listening:
             try:
                 # Set active listening indicator to true
                 self.is_actively_listening = True
-
-                with self.microphone as source:
-                    # Use a shorter timeout for more responsive wake word detection
-                    audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=3)
+                self.stabilizer.reset()
+                self.partial_action = None
+
+                # Typing mode still needs full recognition to hear its exit commands
+                if self.keyword_spotter and not self.wake_word_active and not self.typing_mode:
+                    with reader as source:
+                        phrase = self._spot_wake_phrase(source)
+                    if phrase:
+                        self.last_heard_text = phrase
+                        print(f"Spotted wake phrase: {phrase}")
+                        self._activate_command_mode()
+                    continue
+
+                with reader as source:
+                    # Skip what was said (or spoken as feedback) while the last phrase was handled
+                    source.seek_latest(self.pre_roll)
+                    if self.speech_backend.streaming:
+                        text = self._stream_phrase(source, 1, 3, lambda: self.is_listening,
+                                                   self._on_command_partial, self.command_grammar)
+                    else:
+                        # Use a shorter timeout for more responsive wake word detection
+                        audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=3)
 
                 # Set active listening indicator to false after getting audio
                 self.is_actively_listening = False
 
                 try:
-                    text = self.recognizer.recognize_google(audio).lower()
+                    if not self.speech_backend.streaming:
+                        with profiler.span("voice.recognize"):
+                            text = self.speech_backend.recognize(audio)
+                    text = text.lower()
+                    if not text:
+                        continue
                     self.last_heard_text = text  # Store for debugging
                     print(f"Recognized: {text}")  # Debug output
 
+                    # A partial result of this phrase already activated command mode
+                    if self.partial_action == "wake":
+                        continue
+
                     # Check for wake word if not already active
                     if not self.wake_word_active and self._check_for_wake_phrase(text):
-                        self.wake_word_active = True
-                        self._reset_wake_word_timer()
-                        if self.voice_feedback_enabled:
-                            self.speak("Command mode activated")
+                        self._activate_command_mode()
                         continue
 
-                    # Process command if wake word is active
-                    if self.wake_word_active:
+                    # Process command if wake word is active and a partial result didn't already
+                    if self.wake_word_active and self.partial_action is None:
                         command = self._parse_command(text)
                         if command:
-                            self.command_queue.put(command)
-                            self._reset_wake_word_timer()  # Reset timeout on successful command
-                            self.last_command_time = time.time()
-                            if self.voice_feedback_enabled:
-                                self.speak(f"Command: {command}")
+                            self._accept_command(command)
 
                     # Special case for typing mode
                     if self.typing_mode:
                         # In typing mode, we still need to check for exit commands
                         if any(exit_cmd in text for exit_cmd in self.command_variations["dont type"]):
-                            self.command_queue.put("dont type")
+                            self.command_queue.put(QueuedCommand("dont type", time.perf_counter()))
 
-                except sr.UnknownValueError:
+                except NoSpeechError:
                     pass
-                except sr.RequestError:
+                except BackendError:
                     if self.voice_feedback_enabled:
-                        self.speak("Could not reach speech recognition service")
+                        self.speak("Could not reach speech recognition service", LOW, "error")
 
-            except sr.WaitTimeoutError:
+            except self.sr.WaitTimeoutError:
                 self.is_actively_listening = False
                 continue
+            except self.StreamClosed:
+                self.is_actively_listening = False
+                print("Microphone stream closed, no longer listening for commands")
+                break
             except Exception as e:
                 self.is_actively_listening = False
                 print(f"Error in voice recognition: {e}")
+                time.sleep(0.5)  # Don't spin if the error repeats, e.g. the microphone went away
                 continue
 
+    def _match_variation(self, text):
+        """Return (command, variation) for the best match in text, or (None, None)"""
+        matches = self.grammar.match(text, limit=1)
+        if not matches:
+            return None, None
+        return matches[0].command, matches[0].phrase
+
     def _parse_command(self, text):
         """Parse commands with better matching for variations"""
-        # Clean the text
-        text = text.lower().strip()
-
-        # Check against all command variations
-        for command, variations in self.command_variations.items():
-            for variation in variations:
-                if variation in text:
-                    return command
-
-        # If no direct match, try partial matching for short commands
-        words = text.split()
-        if len(words) <= 3:  # Only attempt partial matching for short phrases
-            for command, variations in self.command_variations.items():
-                for variation in variations:
-                    # Check if most of the variation words appear in text
-                    var_words = variation.split()
-                    matches = sum(1 for w in var_words if w in words)
-                    if matches >= max(1, len(var_words) - 1):  # Allow one word to be misheard
-                        return command
-
-        return None
-
-    def get_command(self):
-        try:
-            return self.command_queue.get_nowait()
-        except Empty:
-            return None
+        command, _ = self._match_variation(text)
+        return command
 
     def start_typing_mode(self):
         """Start the typing mode where speech is converted to text input"""
@@ -462,7 +624,7 @@ class VoiceCommandHandler:
         self.typing_thread = threading.Thread(target=self._typing_listener)
         self.typing_thread.daemon = True
         self.typing_thread.start()
-        self.speak("Typing mode activated. Speak clearly to type.")
+        self.speak("Typing mode activated. Speak clearly to type.", URGENT, "mode")
 
     def stop_typing_mode(self):
         """Stop the typing mode"""
@@ -478,81 +640,138 @@ class VoiceCommandHandler:
 
         if self.typing_thread:
             self.typing_thread.join(timeout=1)
-        self.speak("Typing mode deactivated")
+        self.speak("Typing mode deactivated", URGENT, "mode")
+
+    def _focus_dictation_target(self):
+        """Click under the cursor to focus the text field, unless the phrase is already being typed there"""
+        if self.dictation.typed:
+            return
+        x, y = self.actuator.position()
+        focus = self.dictation_focus
+        if focus is None or abs(x - focus[0]) + abs(y - focus[1]) > self.refocus_distance:
+            # The actuation thread keeps order, so the click lands before the text without a sleep
+            self.actuator.click()
+            self.dictation_focus = (x, y)
+
+    def _type_hypothesis(self, text):
+        if text:
+            self._focus_dictation_target()
+            self.dictation.update(text)
 
     def _typing_listener(self):
         """Thread function that listens for speech and converts it to typing"""
-        typing_recognizer = sr.Recognizer()
+        typing_recognizer = self.sr.Recognizer()
         typing_recognizer.energy_threshold = 250  # Lower threshold for typing
         typing_recognizer.dynamic_energy_threshold = True
         typing_recognizer.pause_threshold = 1.2  # Longer pause for complete sentences
 
-        # Create a new microphone instance for typing mode
-        typing_microphone = sr.Microphone()
+        # Own reader on the shared stream; it doesn't skip ahead, so speech during recognition isn't lost
+        typing_reader = self.audio.reader(pre_roll=self.pre_roll)
+        typing_stabilizer = PartialStabilizer()
+        self.dictation_focus = None
 
         while self.typing_mode and not self.stop_typing_event.is_set():
             try:
-                with typing_microphone as source:
+                with typing_reader as source:
                     if self.voice_feedback_enabled:
                         print("Listening for dictation...")
 
                     # Longer phrase time limit for dictation
-                    audio = typing_recognizer.listen(source, timeout=2, phrase_time_limit=10)
+                    if self.speech_backend.streaming:
+                        # Words are typed once stable and corrected if the recognizer revises them
+                        typing_stabilizer.reset()
+                        text = self._stream_phrase(source, 2, 10,
+                                                   lambda: self.typing_mode and not self.stop_typing_event.is_set(),
+                                                   lambda partial: self._type_hypothesis(typing_stabilizer.update(partial)))
+                    else:
+                        audio = typing_recognizer.listen(source, timeout=2, phrase_time_limit=10)
 
                 try:
-                    text = typing_recognizer.recognize_google(audio)
+                    if not self.speech_backend.streaming:
+                        with profiler.span("voice.recognize_dictation"):
+                            text = self.speech_backend.recognize(audio)
+                    if not text:
+                        self.dictation.cancel()
+                        continue
                     print(f"Typing recognized: {text}")  # Debug output
 
                     # Check if the text contains stop command
                     if any(stop_cmd in text.lower() for stop_cmd in self.command_variations["dont type"]):
-                        self.command_queue.put("dont type")
+                        self.dictation.cancel()  # Take back any of it typed from partial results
+                        self.command_queue.put(QueuedCommand("dont type", time.perf_counter()))
                         continue
 
                     # Type the recognized text
-                    if text:
-                        if self.voice_feedback_enabled:
-                            print(f"Typing: {text}")
-                        # Ensure the text field has focus first
-                        pyautogui.click()
-                        time.sleep(0.1)  # Small delay to ensure click registers
-                        pyautogui.write(text + " ")
-
-                except sr.UnknownValueError:
+                    if self.voice_feedback_enabled:
+                        print(f"Typing: {text}")
+                    self._focus_dictation_target()
+                    self.dictation.commit(text)
+
+                except NoSpeechError:
                     print("Speech not recognized")
-                except sr.RequestError as e:
+                except BackendError as e:
                     print(f"Could not request results: {e}")
                     if self.voice_feedback_enabled:
-                        self.speak("Could not reach speech recognition service")
+                        self.speak("Could not reach speech recognition service", LOW, "error")
 
-            except sr.WaitTimeoutError:
+            except self.sr.WaitTimeoutError:
                 print("Listen timeout")
                 continue
+            except self.StreamClosed:
+                print("Microphone stream closed, dictation stopped")
+                break
             except Exception as e:
                 print(f"Error in typing recognition: {e}")
                 continue
 
 
-def main():
+def main(record_path=None, record_landmarks=False, profile_path=None, record_gaze_path=None, headless=None):
+    """Run the assistant; headless is None for the preview window, "dot" for a status dot only, "none" for no UI"""
+    # Per-stage timings cost next to nothing until the stats overlay (F3) or --profile turns them on
+    profiler.enabled = bool(profile_path)
     # Initialize main components
-    cam = cv2.VideoCapture(0)
-    face_mesh = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
-    screen_w, screen_h = pyautogui.size()
+    # Frames are grabbed on their own thread so a slow iteration never queues stale frames
+    # Ask for an explicit resolution rather than the driver default; the governor may lower it
+    capture = FrameCapture(CameraSource(0, 640, 480))
+    # FaceMesh runs on a worker so inference overlaps with cursor actuation and drawing. The worker
+    # imports mediapipe and builds the model itself while the camera opens and the window comes up.
+    face_worker = FaceMeshWorker(capture, roi_tracker=FaceRoiTracker())
+    # Optionally save the session so replay.py can benchmark the loop on it later
+    recorder = None
+    if record_path:
+        recorder = SessionRecorder("landmarks" if record_landmarks else "frames")
+        if record_landmarks:
+            face_worker.recorder = recorder
+        else:
+            capture.recorder = recorder
+    capture.start()
+    face_worker.start()
+    # Lowers resolution, FaceMesh rate and preview rate when frames cost more than the budget
+    FRAME_BUDGET_MS = 25
+    CPU_TARGET = 0.6  # Fraction of one core for capture, FaceMesh worker and frame loop together
+    governor = Governor(capture, face_worker, budget_ms=FRAME_BUDGET_MS, cpu_target=CPU_TARGET)
+    last_snapshot_id = 0
+    # All mouse and keyboard output goes through one actuation thread ("pyautogui", "xtest" or "mock")
+    ACTUATION_BACKEND = "pyautogui"
+    actuator = InputActuator(create_backend(ACTUATION_BACKEND)).start()
+    screen_w, screen_h = actuator.size()
 
     # Initialize Pygame
     pygame.init()
     window_w, window_h = 640, 480
-    screen = pygame.display.set_mode((window_w, window_h))
-    pygame.display.set_caption("Eye Controlled Mouse with On-Screen Keyboard")
-
-    # Colors and Fonts
-    RED = (255, 0, 0)
-    BLUE = (0, 0, 255)
-    WHITE = (255, 255, 255)
-    BLACK = (0, 0, 0)
-    GREEN = (0, 255, 0)
-    YELLOW = (255, 255, 0)
-    ORANGE = (255, 165, 0)
-    PURPLE = (128, 0, 128)
+    indicator = None
+    if headless:
+        # No window: frames are never turned into surfaces and nothing is drawn. The keyboard
+        # still lays itself out on an offscreen surface.
+        screen = pygame.Surface((window_w, window_h))
+        if headless == "dot":
+            indicator = StatusIndicator()
+    else:
+        screen = pygame.display.set_mode((window_w, window_h))
+        pygame.display.set_caption("Eye Controlled Mouse with On-Screen Keyboard")
+        startup.mark("window open")
+
+    # Fonts (the colours are in status_overlay.py)
     font = pygame.font.Font(None, 36)
     small_font = pygame.font.Font(None, 24)
 
@@ -562,288 +781,340 @@ def main():
     HOLD_CLICK_THRESHOLD = 0.008
     SCROLL_AMOUNT = 10
 
-    # Initialize on-screen keyboard
-    keyboard = OnScreenKeyboard(screen, window_w, window_h)
+    # Cursor filter settings (see cursor_filter.py, run it for a lag/jitter comparison)
+    FILTER_MIN_CUTOFF = 1.0  # Hz, lower is steadier when the gaze holds still
+    FILTER_BETA = 0.01  # Higher follows fast eye movements with less lag
+    FILTER_LEAD_TIME = 0.0  # Seconds of constant-velocity prediction, 0 disables it
+    FILTER_DEAD_ZONE = 6  # Pixels the target may wander before the cursor moves
+    cursor_filter = CursorFilter(FILTER_MIN_CUTOFF, FILTER_BETA, lead_time=FILTER_LEAD_TIME,
+                                 dead_zone=FILTER_DEAD_ZONE)
+
+    # Cursor movement and blink clicks (tracking.py). Blink events are derived from frame
+    # timestamps, so the loop never sleeps after a click.
+    tracker = EyeTracker(actuator, face_worker, BLINK_THRESHOLD, HOLD_CLICK_THRESHOLD, BLINK_DELAY, cursor_filter)
+    # Saved by the "Calibrate Gaze" button; without it the cursor follows the raw iris position
+    GAZE_CALIBRATION_PATH = "gaze_calibration.npz"
+    if os.path.exists(GAZE_CALIBRATION_PATH):
+        tracker.gaze_mapping = GazeMapping.load(GAZE_CALIBRATION_PATH)
+        print(f"Loaded gaze calibration from {GAZE_CALIBRATION_PATH}")
+
+    # Rendered labels are cached and the window is only updated where something changed
+    surfaces = SurfaceCache()
+    overlay = DirtyRegions(screen)
+
+    # Initialize on-screen keyboard. Keys are typed by dwelling on them for KEYBOARD_DWELL_TIME seconds;
+    # None types them with a blink instead.
+    KEYBOARD_DWELL_TIME = 0.6
+    # Word completions from a frequency list ("word" or "word count" per line, most common first).
+    # wordlist.txt ships next to this script with a few hundred everyday words; point WORD_LIST_PATH
+    # at a larger list for better completions. Words the user types are learned for the session, and
+    # only kept in USER_WORDS_PATH across runs with LEARN_TYPED_WORDS, since that file records them.
+    WORD_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wordlist.txt")
+    LEARN_TYPED_WORDS = False
+    USER_WORDS_PATH = "user_words.json"
+    predictor = WordPredictor(WORD_LIST_PATH, USER_WORDS_PATH if LEARN_TYPED_WORDS else None)
+    keyboard = OnScreenKeyboard(screen, window_w, window_h, actuator, surfaces, dwell_time=KEYBOARD_DWELL_TIME,
+                                predictor=predictor)
+    gaze_trace = []  # (timestamp, window x, window y) while the keyboard is open, for --record-gaze
+
+    def type_key(key_pressed):
+        text_result = keyboard.process_key(key_pressed)
+        if text_result:
+            # If Enter was pressed, type the text
+            actuator.write(text_result)
+            # Add a print statement to debug
+            print(f"Typing text: {text_result}")
+
+    def keyboard_click(blink_event):
+        """Send blink clicks to the on-screen keyboard while it is open (blinks only type without dwell)"""
+        if not keyboard.active:
+            return False
+        if keyboard.dwell is None:
+            key_pressed = keyboard.get_key_at_pos(actuator.position())
+            if key_pressed:
+                type_key(key_pressed)
+        return True
+
+    tracker.click_handler = keyboard_click
 
     # Initialize voice command handler with multiple wake phrases
     WAKE_PHRASES = ["hey computer", "computer", "eye control", "eye commander", "voice control"]
-    voice_handler = VoiceCommandHandler(wake_phrases=WAKE_PHRASES)
+    # "google" needs the network; "vosk" runs offline and acts on commands while they are spoken
+    SPEECH_BACKEND = "google"
+    VOSK_MODEL_PATH = "vosk-model-small-en-us-0.15"
+    # Wake phrases enrolled with `python keyword_spotter.py enroll "hey computer"` are spotted on-device
+    WAKE_TEMPLATES_PATH = "wake_templates.npz"
+    keyword_spotter = None
+    if os.path.exists(WAKE_TEMPLATES_PATH):
+        try:
+            keyword_spotter = KeywordSpotter().load(WAKE_TEMPLATES_PATH, WAKE_PHRASES)
+        except ValueError as e:
+            print(f"Wake phrase templates not used: {e}")
+    # Shared timer thread for timeouts and other deferred actions (scheduler.py)
+    scheduler = Scheduler().start()
+    # Dictated text: "clipboard" pastes each phrase in one shortcut, "keys" types it, "mock" discards it
+    TEXT_INJECTION = "clipboard"
+    text_injector = create_injector(TEXT_INJECTION, actuator, scheduler)
+    # Voice comes up in the background: the listener thread loads the backend (a Vosk model can take
+    # seconds) and calibrates the microphone while eye tracking already runs
+    voice_handler = VoiceCommandHandler(wake_phrases=WAKE_PHRASES, actuator=actuator,
+                                        speech_backend=lambda: create_speech_backend(SPEECH_BACKEND, VOSK_MODEL_PATH),
+                                        keyword_spotter=keyword_spotter, scheduler=scheduler,
+                                        text_injector=text_injector)
     voice_handler.start_listening()
 
-    # State variables
-    tracking_enabled = True
-    holding_click = False
-    blink_counter = 0
-    blink_detected = False
+    # Voice command handlers. Anything that can block (subprocesses, thread joins, listening to the
+    # microphone) runs on the command thread; the rest runs in the frame loop within COMMAND_BUDGET_MS.
+    COMMAND_BUDGET_MS = 4
+    commands = CommandRegistry(budget_ms=COMMAND_BUDGET_MS).start()
+
+    def set_tracking(enabled):
+        tracker.enabled = enabled
 
-    # Add calibration button
-    calibrate_button_rect = pygame.Rect(window_w - 150, window_h - 40, 140, 30)
+    def scroll(direction):
+        # Multiple scroll steps for more noticeable scrolling
+        actuator.press('pageup' if direction == "up" else 'pagedown', presses=3)
+        voice_handler.speak(f"Scrolling {direction}", LOW, "scroll")
+
+    def set_feedback(enabled):
+        if enabled:
+            voice_handler.voice_feedback_enabled = True
+            voice_handler.speak("Voice feedback enabled", NORMAL, "feedback")
+        else:
+            voice_handler.speak("Voice feedback disabled", NORMAL, "feedback")
+            voice_handler.voice_feedback_enabled = False
+
+    def cancel_command_mode():
+        voice_handler.wake_word_active = False
+        if voice_handler.wake_word_timer:
+            voice_handler.wake_word_timer.cancel()
+        voice_handler.speak("Command mode deactivated", URGENT, "mode")
+
+    def toggle_keyboard():
+        if headless:
+            voice_handler.speak("The on-screen keyboard needs the window, say launch keyboard instead", NORMAL,
+                                "keyboard")
+            return
+        keyboard_active = keyboard.toggle()
+        voice_handler.speak(f"Keyboard {'activated' if keyboard_active else 'deactivated'}", NORMAL, "keyboard")
+
+    commands.register("track", lambda: set_tracking(True))
+    commands.register("stop tracking", lambda: set_tracking(False))
+    commands.register("right click", actuator.right_click)
+    commands.register("double click", actuator.double_click)
+    commands.register("scroll up", lambda: scroll("up"))
+    commands.register("scroll down", lambda: scroll("down"))
+    commands.register("enable feedback", lambda: set_feedback(True))
+    commands.register("disable feedback", lambda: set_feedback(False))
+    commands.register("cancel command mode", cancel_command_mode)
+    commands.register("toggle keyboard", toggle_keyboard)
+    commands.register("start typing", voice_handler.start_typing_mode, WORKER, "Dictation, opens the system keyboard")
+    commands.register("dont type", voice_handler.stop_typing_mode, WORKER, "Ends dictation, joins its thread")
+    commands.register("launch keyboard", voice_handler.launch_system_keyboard, WORKER, "Restarts osk.exe")
+    commands.register("close keyboard", voice_handler.close_system_keyboard, WORKER, "Kills osk.exe")
+    commands.register("calibrate microphone", voice_handler.calibrate_microphone, WORKER, "Listens for 3 seconds")
+
+    def calibrate_gaze():
+        """Full-screen target sequence, then fit and save the gaze mapping (blocks the loop meanwhile)"""
+        voice_handler.speak("Look at each dot until it shrinks", URGENT, "mode")
+        session = run_calibration(face_worker, font)
+        pygame.display.set_mode((window_w, window_h))
+        overlay.set_background(overlay.background)  # Repaint everything over the restored window
+        if session is None:
+            voice_handler.speak("Gaze calibration cancelled", NORMAL, "mode")
+            return
+        mapping = session.fit()
+        features, targets = session.arrays()
+        print(f"Gaze calibration: {len(features)} samples, RMS error "
+              f"{mapping.error(features, targets, (screen_w, screen_h)):.0f} px")
+        mapping.save(GAZE_CALIBRATION_PATH)
+        tracker.gaze_mapping = mapping
+        tracker.cursor_filter.reset()
+        voice_handler.speak("Gaze calibrated", NORMAL, "mode")
+
+    # Status texts, indicators and the calibration buttons over the camera view (status_overlay.py)
+    profiler_overlay = ProfilerOverlay(profiler, pygame.font.SysFont("monospace", 14), surfaces)
+    status_overlay = StatusOverlay(surfaces, font, small_font, (window_w, window_h), WAKE_PHRASES, profiler_overlay)
+    PROFILE_DUMP_INTERVAL = 5  # Seconds between JSONL lines with --profile
+    last_profile_dump = time.time()
 
     # Pygame main loop
     running = True
-    last_debug_update = 0
-    debug_info = []  # For storing debug information
+
+    def request_stop(signum, frame):
+        nonlocal running
+        running = False
+
+    if headless:
+        # Without a window Ctrl+C is the way out, and it should still run the cleanup below
+        signal.signal(signal.SIGINT, request_stop)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    first_cursor_moved = False
+    voice_ready = False
 
     while running:
-        for event in pygame.event.get():
+        if indicator is not None and not indicator.pump():
+            running = False
+        # Headless there is no window to send events (the indicator has handled its own)
+        for event in (pygame.event.get() if not headless else ()):
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
+                # Show per-stage timings
+                elif event.key == pygame.K_F3:
+                    profiler_overlay.toggle()
                 # Add a key to force activate command mode for testing
                 elif event.key == pygame.K_SPACE:
                     voice_handler.wake_word_active = True
                     voice_handler._reset_wake_word_timer()
                     if voice_handler.voice_feedback_enabled:
-                        voice_handler.speak("Command mode activated manually")
+                        voice_handler.speak("Command mode activated manually", URGENT, "mode")
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                # Check if calibrate button was clicked
-                if calibrate_button_rect.collidepoint(event.pos):
-                    voice_handler.calibrate_microphone()
+                # Check if calibrate button was clicked. While the keyboard is up the buttons are
+                # hidden, a blink click there is meant for the key underneath
+                buttons_shown = status_overlay.buttons_shown(keyboard)
+                if buttons_shown and status_overlay.calibrate_button_rect.collidepoint(event.pos):
+                    commands.submit("calibrate microphone")
+                elif buttons_shown and status_overlay.calibrate_gaze_rect.collidepoint(event.pos):
+                    calibrate_gaze()
                 # Check if keyboard toggle button was clicked
                 elif keyboard.toggle_btn.collidepoint(event.pos):
                     keyboard.toggle()
 
-        # Handle voice commands
-        command = voice_handler.get_command()
-        if command:
-            if command == "track":
-                tracking_enabled = True
-            elif command == "stop tracking":
-                tracking_enabled = False
-            elif command == "right click":
-                pyautogui.rightClick()
-            elif command == "double click":
-                pyautogui.doubleClick()
-            elif command == "scroll up":
-                # Multiple scroll steps for more noticeable scrolling
-                for _ in range(3):
-                    pyautogui.press('pageup')
-                if voice_handler.voice_feedback_enabled:
-                    voice_handler.speak("Scrolling up")
-            elif command == "scroll down":
-                # Multiple scroll steps for more noticeable scrolling
-                for _ in range(3):
-                    pyautogui.press('pagedown')
-                if voice_handler.voice_feedback_enabled:
-                    voice_handler.speak("Scrolling down")
-            elif command == "enable feedback":
-                voice_handler.voice_feedback_enabled = True
-                voice_handler.speak("Voice feedback enabled")
-            elif command == "disable feedback":
-                voice_handler.speak("Voice feedback disabled")
-                voice_handler.voice_feedback_enabled = False
-            elif command == "start typing":
-                voice_handler.start_typing_mode()
-            elif command == "dont type":
-                voice_handler.stop_typing_mode()
-            elif command == "cancel command mode":
-                voice_handler.wake_word_active = False
-                if voice_handler.voice_feedback_enabled:
-                    voice_handler.speak("Command mode deactivated")
-
-
-            elif command == "launch keyboard":
-                voice_handler.launch_system_keyboard()
-            elif command == "close keyboard":
-                voice_handler.close_system_keyboard()
-            elif command == "toggle keyboard":
-                if voice_handler.launch_system_keyboard():  # Try to launch
-                    pass  # If successful, we're done
+        if not voice_ready and voice_handler.ready.is_set():
+            voice_ready = True
+            startup.mark("voice ready", at=voice_handler.ready_time)
+
+        # Run every pending voice command that fits in this frame's budget
+        with profiler.span("commands.drain"):
+            commands.drain(voice_handler.command_queue)
+
+        # Process eye tracking (wait at most one camera interval for a fresh landmark snapshot)
+        snapshot = face_worker.wait_snapshot(after_id=last_snapshot_id, timeout=1 / 30)
+        if snapshot is None and face_worker.finished:
+            # The worker gave up (no mediapipe, say) and returns at once; voice commands still work,
+            # so keep the loop at the camera rate instead of spinning
+            if status_overlay.error is None:
+                status_overlay.error = face_worker.error or "Eye tracking stopped"
+                voice_handler.speak("Eye tracking is unavailable, voice commands still work", URGENT, "tracking")
+            time.sleep(1 / 30)
+        if snapshot is not None:
+            frame_start = time.perf_counter()
+            last_snapshot_id = snapshot.frame_id
+            frame = snapshot.frame
+
+            tracker.update(snapshot)
+            if not first_cursor_moved and tracker.eyes is not None:
+                first_cursor_moved = True
+                startup.mark("first cursor move")
+            if keyboard.active and tracker.enabled and snapshot.landmarks is not None:
+                dwell_key = keyboard.update_gaze(actuator.position(), snapshot.capture_time)
+                if dwell_key:
+                    type_key(dwell_key)
+                if record_gaze_path:
+                    gaze_trace.append((snapshot.capture_time,) + keyboard.transform.to_window(actuator.position()))
+            # A snapshot from before the capture resolution changed points into the old buffer pool;
+            # leave the previous background up until a frame from the new pool arrives
+            if (not headless and snapshot.generation == face_worker.converter.generation
+                    and governor.preview_due()):
+                with profiler.span("render.camera"):
+                    # Mirrored RGB frame in a reused buffer; pin it so the worker leaves it alone while shown
+                    face_worker.converter.pin(snapshot.buffer_index)
+                    tracker.draw_iris(frame, BLUE)
+
+                    # A new camera frame becomes the background and repaints the whole window.
+                    # The surface shares the frame buffer, so the iris dots drawn above are already on it.
+                    overlay.set_background(face_worker.converter.display_surface(snapshot.buffer_index,
+                                                                                 (window_w, window_h)))
+
+        if headless:
+            if indicator is not None:
+                # Red while tracking is off, orange in command mode, green while dictating
+                if not tracker.enabled:
+                    indicator_color = RED
+                elif voice_handler.wake_word_active:
+                    indicator_color = ORANGE
+                elif voice_handler.typing_mode:
+                    indicator_color = GREEN
                 else:
-                    voice_handler.close_system_keyboard()
-            elif command == "toggle keyboard":
-                keyboard_active = keyboard.toggle()
-                if voice_handler.voice_feedback_enabled:
-                    voice_handler.speak(f"Keyboard {'activated' if keyboard_active else 'deactivated'}")
-
-        # Process eye tracking
-        _, frame = cam.read()
-        frame = cv2.flip(frame, 1)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        output = face_mesh.process(rgb_frame)
-        landmark_points = output.multi_face_landmarks
-        frame_h, frame_w, _ = frame.shape
-
-        if landmark_points and tracking_enabled:
-            landmarks = landmark_points[0].landmark
-
-            # Move cursor using eye landmarks
-            for id, landmark in enumerate(landmarks[474:478]):
-                x = int(landmark.x * frame_w)
-                y = int(landmark.y * frame_h)
-                if id == 1:
-                    screen_x = screen_w * landmark.x
-                    screen_y = screen_h * landmark.y
-                    pyautogui.moveTo(screen_x, screen_y)
-                cv2.circle(frame, (x, y), 5, BLUE, -1)
-
-            # Blink detection
-            left_eye = [landmarks[145], landmarks[159]]
-            right_eye = [landmarks[374], landmarks[386]]
-
-            left_eye_distance = left_eye[0].y - left_eye[1].y
-            right_eye_distance = right_eye[0].y - right_eye[1].y
-
-            # Normal Click (Right Eye Blink)
-            # In the section where right eye blink is detected (around line 690-700)
-            if right_eye_distance < BLINK_THRESHOLD:
-                # If keyboard is active and visible, check for key presses
-                if keyboard.active:
-                    cursor_x, cursor_y = pyautogui.position()
-                    key_pressed = keyboard.get_key_at_pos((cursor_x, cursor_y))
-                    if key_pressed:
-                        text_result = keyboard.process_key(key_pressed)
-                        if text_result:
-                            # If Enter was pressed, type the text
-                            pyautogui.write(text_result)
-                            # Add a print statement to debug
-                            print(f"Typing text: {text_result}")
-                else:
-                    # Normal click behavior when keyboard is not active
-                    pyautogui.click()
-
-                pyautogui.sleep(BLINK_DELAY)
-                blink_detected = True
-                blink_counter += 1
-            else:
-                blink_detected = False
-
-            # Hold Click (Left Eye Closed)
-            if left_eye_distance < HOLD_CLICK_THRESHOLD:
-                if not holding_click:
-                    pyautogui.mouseDown()
-                    holding_click = True
-            else:
-                if holding_click:
-                    pyautogui.mouseUp()
-                    holding_click = False
-
-        # Update display
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame = np.rot90(frame)
-        frame = pygame.surfarray.make_surface(frame)
-        screen.blit(frame, (0, 0))
-
-        # Display tracking status
-        status_text = "Tracking: " + ("Enabled" if tracking_enabled else "Disabled")
-        status_surface = font.render(status_text, True, GREEN if tracking_enabled else RED)
-        screen.blit(status_surface, (10, 10))
-
-        # Display cursor position
-        cursor_x, cursor_y = pyautogui.position()
-        cursor_text = font.render(f"Cursor: ({cursor_x}, {cursor_y})", True, WHITE)
-        screen.blit(cursor_text, (10, 40))
-
-        # Display blink counter
-        blink_text = font.render(f"Blinks: {blink_counter}", True, WHITE)
-        screen.blit(blink_text, (10, 70))
-
-        # Display voice feedback status
-        feedback_text = font.render(
-            f"Voice Feedback: {'On' if voice_handler.voice_feedback_enabled else 'Off'}",
-            True,
-            GREEN if voice_handler.voice_feedback_enabled else RED
-        )
-        screen.blit(feedback_text, (10, 100))
-
-        # Display wake word status
-        wake_word_text = font.render(
-            f"Command Mode: {'Active' if voice_handler.wake_word_active else 'Inactive'}",
-            True,
-            ORANGE if voice_handler.wake_word_active else WHITE
-        )
-        screen.blit(wake_word_text, (10, 130))
-
-        # Display hold click indicator
-        if holding_click:
-            hold_text = font.render("Holding Click", True, RED)
-            screen.blit(hold_text, (10, 160))
-
-        # Display typing mode indicator
-        typing_status = "Active" if voice_handler.typing_mode else "Inactive"
-        typing_color = GREEN if voice_handler.typing_mode else WHITE
-        typing_text = font.render(f"Typing Mode: {typing_status}", True, typing_color)
-        screen.blit(typing_text, (10, 190))
-
-        # Display keyboard status
-        keyboard_status = "Active" if keyboard.active else "Inactive"
-        keyboard_color = GREEN if keyboard.active else WHITE
-        keyboard_text = font.render(f"Keyboard: {keyboard_status}", True, keyboard_color)
-        screen.blit(keyboard_text, (10, 220))
-
-        # Display last heard text for debugging (update every 2 seconds)
-        current_time = time.time()
-        if current_time - last_debug_update > 2:
-            last_debug_update = current_time
-            if voice_handler.last_heard_text:
-                # Add to debug info list (keep last 3 entries)
-                debug_info.append(voice_handler.last_heard_text)
-                if len(debug_info) > 3:
-                    debug_info.pop(0)
-                voice_handler.last_heard_text = ""
-
-        # Display debug info
-        debug_y = 250
-        debug_text = font.render("Last Heard:", True, PURPLE)
-        screen.blit(debug_text, (10, debug_y))
-
-        for i, text in enumerate(debug_info):
-            text_surf = small_font.render(text, True, WHITE)
-            screen.blit(text_surf, (10, debug_y + 30 + i * 20))
-
-        # Draw microphone listening indicator
-        if voice_handler.is_actively_listening:
-            pygame.draw.circle(screen, YELLOW, (window_w - 30, 30), 10)
-            mic_text = font.render("Listening", True, YELLOW)
-            screen.blit(mic_text, (window_w - 120, 20))
-
-        # Draw wake word active indicator
-        if voice_handler.wake_word_active:
-            pygame.draw.circle(screen, ORANGE, (window_w - 30, 60), 10)
-            cmd_text = font.render("Command Mode", True, ORANGE)
-            screen.blit(cmd_text, (window_w - 150, 50))
-
-        # Draw typing mode listening indicator
-        if voice_handler.typing_mode:
-            pygame.draw.circle(screen, GREEN, (window_w - 30, 90), 10)
-            typing_ind_text = font.render("Typing Active", True, GREEN)
-            screen.blit(typing_ind_text, (window_w - 140, 80))
-
-        # Draw blink indicator
-        if blink_detected:
-            pygame.draw.circle(screen, RED, (window_w - 30, 120), 10)
-            blink_ind_text = font.render("Blink", True, RED)
-            screen.blit(blink_ind_text, (window_w - 80, 110))
-
-        # Display wake word instructions with multiple options
-        wake_instr = small_font.render("Say any of these to activate: " + ", ".join(WAKE_PHRASES[:3]) + "...", True,
-                                       WHITE)
-        screen.blit(wake_instr, (window_w // 2 - 180, window_h - 80))
-
-        # Display note about spacebar
-        space_instr = small_font.render("Press SPACEBAR to manually activate command mode", True, WHITE)
-        screen.blit(space_instr, (window_w // 2 - 180, window_h - 60))
-
-        # Draw calibration button
-        pygame.draw.rect(screen, BLUE, calibrate_button_rect)
-        calibrate_text = font.render("Calibrate Mic", True, WHITE)
-        screen.blit(calibrate_text, (window_w - 145, window_h - 38))
-
-        # Draw the keyboard
-        keyboard.draw()
-
-        pygame.display.update()
-
-    # Cleanup
-    voice_handler.stop_listening()
+                    indicator_color = BLUE
+                indicator.show(indicator_color, tracker.blink_detected)
+        else:
+            # Text surfaces come from the cache, only changed areas are pushed
+            status_overlay.draw(overlay, tracker, actuator, voice_handler, keyboard, governor)
+
+        if snapshot is not None:
+            governor.frame_done(time.perf_counter() - frame_start)
+        governor.update()
+
+        if profile_path and time.time() - last_profile_dump >= PROFILE_DUMP_INTERVAL:
+            profiler.dump_jsonl(profile_path)
+            last_profile_dump = time.time()
+
+    cpu_seconds = time.process_time() - cpu_start
+    wall_seconds = time.perf_counter() - wall_start
+
+    # Cleanup (dictation first, it reads from the audio stream that stop_listening closes)
     if hasattr(voice_handler, 'typing_mode') and voice_handler.typing_mode:
         voice_handler.stop_typing_mode()
+    commands.stop()
+    voice_handler.stop_listening()
+    voice_handler.tts.stop()  # Says the last messages, then releases the mixer before pygame shuts down
+    scheduler.stop()
+    if indicator is not None:
+        indicator.close()
     pygame.quit()
-    cam.release()
+    face_worker.stop()
+    capture.stop()
+    actuator.stop()
+    predictor.save()
+    if recorder:
+        recorder.save(record_path)
+    if record_gaze_path and gaze_trace:
+        gaze_trace = np.array(gaze_trace)
+        save_trace(record_gaze_path, gaze_trace[:, 0], gaze_trace[:, 1:])
+        print(f"Saved {len(gaze_trace)} gaze samples to {record_gaze_path} (python key_selection.py {record_gaze_path})")
+    if profile_path:
+        profiler.dump_jsonl(profile_path)
+    stats = capture.stats()
+    print(f"Camera frames captured: {stats['captured']}, dropped: {stats['dropped']}")
+    stats = face_worker.stats()
+    if "latency_ms_p50" in stats:
+        print(f"Capture-to-cursor latency: p50 {stats['latency_ms_p50']:.1f} ms, "
+              f"p95 {stats['latency_ms_p95']:.1f} ms")
+    if wall_seconds > 0:
+        print(f"CPU: {cpu_seconds / wall_seconds:.0%} of one core over {wall_seconds:.0f} s "
+              f"({'headless' if headless else 'window'})")
+    print("Startup: " + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in startup.summary().items())
+          + (f" (FaceMesh load {face_worker.load_time:.2f} s)" if face_worker.load_time else ""))
+    for name, command_stats in commands.stats().items():
+        if isinstance(command_stats, dict):
+            print(f"Command {name}: {command_stats['count']} runs on the {command_stats['thread']} thread, "
+                  f"dispatch p50 {command_stats['latency_p50_ms']:.1f} ms, p95 {command_stats['latency_p95_ms']:.1f} ms")
+    dictation_stats = voice_handler.dictation.stats()
+    if dictation_stats["phrases"]:
+        print(f"Dictation: {dictation_stats['phrases']} phrases, {dictation_stats['chars']} characters at "
+              f"{dictation_stats['chars_per_second']:.0f} chars/s, {dictation_stats['backspaces']} corrected")
+    for kind, action_stats in actuator.stats().items():
+        if isinstance(action_stats, dict):
+            print(f"Input {kind}: {action_stats['count']} actions, p50 {action_stats['p50_ms']:.1f} ms, "
+                  f"p95 {action_stats['p95_ms']:.1f} ms")
     cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Hands-free eye and voice control")
+    parser.add_argument("--record", metavar="PATH", help="save the session to PATH for replay.py")
+    parser.add_argument("--record-landmarks", action="store_true",
+                        help="record landmark arrays instead of camera frames")
+    parser.add_argument("--profile", metavar="PATH", help="append per-stage timings to PATH as JSON lines")
+    parser.add_argument("--record-gaze", metavar="PATH",
+                        help="save the gaze cursor over the on-screen keyboard to PATH for key_selection.py")
+    parser.add_argument("--headless", nargs="?", const="dot", choices=("dot", "none"),
+                        help="run without the preview window, showing only a status dot (or nothing with 'none')")
+    args = parser.parse_args()
+    main(record_path=args.record, record_landmarks=args.record_landmarks, profile_path=args.profile,
+         record_gaze_path=args.record_gaze, headless=args.headless)
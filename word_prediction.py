@@ -0,0 +1,307 @@
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+
+class FrequencyTrie:
+    """Read-only prefix trie in flat numpy arrays, memory-mapped from a directory of .npy files
+
+    The children of node n are edge_chars/edge_targets[child_start[n]:child_start[n + 1]], sorted
+    by character, and top_words[n] holds the k most frequent words below n. A completion is one
+    binary search per typed letter and one row read, and only the pages touched are loaded.
+    """
+    FILES = ("child_start", "edge_chars", "edge_targets", "top_words", "word_offsets", "word_bytes", "counts")
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Plain ndarray views of the maps: same pages, without np.memmap's cost on every slice
+        self.arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r").view(np.ndarray)
+                       for name in self.FILES}
+        self.child_start = self.arrays["child_start"]
+        self.edge_chars = self.arrays["edge_chars"]
+        self.edge_targets = self.arrays["edge_targets"]
+        self.top_words = self.arrays["top_words"]
+        self.counts = self.arrays["counts"]
+        self.total = float(np.sum(self.counts, dtype=np.float64)) or 1.0
+        # Typing extends the previous prefix, so remembering visited nodes makes each keystroke one step
+        self.nodes = {"": 0}
+        self.entries = {}  # Word index -> (word, relative frequency)
+
+    @classmethod
+    def build(cls, counts, directory, k=8):
+        """Write the trie for a {word: count} dict into directory and open it"""
+        words = sorted(counts, key=lambda word: (-counts[word], word))
+        children = [{}]
+        top = [[]]
+        for index, word in enumerate(words):
+            # Words come most frequent first, so each node's first k words are its top k
+            node = 0
+            if len(top[0]) < k:
+                top[0].append(index)
+            for char in word:
+                child = children[node].get(char)
+                if child is None:
+                    child = children[node][char] = len(children)
+                    children.append({})
+                    top.append([])
+                node = child
+                if len(top[node]) < k:
+                    top[node].append(index)
+
+        # Renumber breadth first so every node's children sit next to each other
+        order = [0]
+        new_id = {0: 0}
+        for node in order:
+            for char in sorted(children[node]):
+                new_id[children[node][char]] = len(order)
+                order.append(children[node][char])
+        child_start = np.zeros(len(order) + 1, np.int32)
+        edge_chars = []
+        edge_targets = []
+        top_words = np.full((len(order), k), -1, np.int32)
+        for position, node in enumerate(order):
+            for char in sorted(children[node]):
+                edge_chars.append(ord(char))
+                edge_targets.append(new_id[children[node][char]])
+            child_start[position + 1] = len(edge_chars)
+            top_words[position, :len(top[node])] = top[node]
+
+        encoded = [word.encode("utf-8") for word in words]
+        word_offsets = np.zeros(len(words) + 1, np.int64)
+        word_offsets[1:] = np.cumsum([len(word) for word in encoded])
+        arrays = {
+            "child_start": child_start,
+            "edge_chars": np.array(edge_chars, np.uint32),
+            "edge_targets": np.array(edge_targets, np.int32),
+            "top_words": top_words,
+            "word_offsets": word_offsets,
+            "word_bytes": np.frombuffer(b"".join(encoded), np.uint8),
+            "counts": np.array([counts[word] for word in words], np.float32),
+        }
+        os.makedirs(directory, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, name + ".npy"), array)
+        return cls(directory)
+
+    def entry(self, index):
+        if index not in self.entries:
+            start, end = self.arrays["word_offsets"][index:index + 2].tolist()
+            word = self.arrays["word_bytes"][start:end].tobytes().decode("utf-8")
+            self.entries[index] = (word, float(self.counts[index]) / self.total)
+        return self.entries[index]
+
+    def _child(self, node, char):
+        start, end = self.child_start[node:node + 2].tolist()
+        chars = self.edge_chars[start:end].tolist()
+        position = bisect.bisect_left(chars, ord(char))
+        if position == len(chars) or chars[position] != ord(char):
+            return None
+        return int(self.edge_targets[start + position])
+
+    def node(self, prefix):
+        """Node reached by prefix, or None"""
+        if prefix in self.nodes:
+            return self.nodes[prefix]
+        node = self.node(prefix[:-1])
+        if node is not None:
+            node = self._child(node, prefix[-1])
+        if len(self.nodes) > 50000:
+            self.nodes = {"": 0}
+        self.nodes[prefix] = node
+        return node
+
+    def complete(self, prefix, k=8):
+        """[(word, relative frequency)] for the most frequent words starting with prefix"""
+        node = self.node(prefix)
+        if node is None:
+            return []
+        return [self.entry(index) for index in self.top_words[node, :k].tolist() if index >= 0]
+
+
+def read_word_list(path):
+    """{word: count} from lines of "word" or "word count"; without counts the line order is the rank"""
+    counts = {}
+    with open(path, encoding="utf-8") as word_list:
+        lines = [line.split() for line in word_list if line.strip()]
+    for rank, fields in enumerate(lines):
+        word = fields[0].lower()
+        count = float(fields[1]) if len(fields) > 1 else len(lines) - rank
+        counts[word] = counts.get(word, 0) + count
+    return counts
+
+
+def words_in(text):
+    return re.findall(r"[a-z']+", text.lower())
+
+
+class WordPredictor:
+    """Word completions from a base word list plus the words this user types
+
+    The base trie is compiled from word_list_path into a directory next to it the first time it
+    is needed (again only when the list changes) and memory-mapped on a background thread, so
+    neither startup nor the first keystroke waits for it; until then completions come from the
+    user's words alone. Learned words are kept in a sorted list and saved to user_path (None
+    keeps them for this session only). Only plain words are learned, so a password or code typed
+    on the keyboard is not written to disk.
+    """
+
+    def __init__(self, word_list_path=None, user_path=None, user_weight=0.5, scan_limit=256):
+        self.word_list_path = word_list_path
+        self.user_path = user_path
+        self.user_weight = user_weight  # Share of the score that comes from the user's own typing
+        self.scan_limit = scan_limit  # Most user words looked at for one prefix
+        self.base = None
+        self.loader = None
+        self.user_counts = Counter()
+        self.user_words = []  # Sorted, for prefix ranges
+        if user_path and os.path.exists(user_path):
+            with open(user_path, encoding="utf-8") as user_file:
+                self.user_counts.update(json.load(user_file))
+            self.user_words = sorted(self.user_counts)
+        self.user_total = sum(self.user_counts.values())
+
+    def _trie_directory(self):
+        return os.path.splitext(self.word_list_path)[0] + ".trie"
+
+    def _load_base(self):
+        directory = self._trie_directory()
+        try:
+            stale = (not os.path.exists(os.path.join(directory, "counts.npy"))
+                     or os.path.getmtime(self.word_list_path) > os.path.getmtime(os.path.join(directory, "counts.npy")))
+            if stale:
+                start = time.perf_counter()
+                base = FrequencyTrie.build(read_word_list(self.word_list_path), directory)
+                print(f"Compiled {self.word_list_path} into {directory} in {time.perf_counter() - start:.1f} s")
+            else:
+                base = FrequencyTrie(directory)
+            self.base = base
+        except (OSError, ValueError) as e:
+            print(f"Word prediction without a word list ({e})")
+
+    def start_loading(self):
+        """Open (or compile) the base trie in the background; called by the first complete()"""
+        if self.loader is None and self.word_list_path and not os.path.exists(self.word_list_path):
+            print(f"Word prediction without a word list ({self.word_list_path} not found)")
+            self.word_list_path = None
+        if self.loader is None and self.word_list_path:
+            self.loader = threading.Thread(target=self._load_base)
+            self.loader.daemon = True
+            self.loader.start()
+        return self
+
+    def wait_loaded(self, timeout=None):
+        if self.loader:
+            self.loader.join(timeout)
+        return self.base is not None
+
+    def complete(self, prefix, k=3):
+        """Up to k words starting with prefix, best first"""
+        if self.loader is None:
+            self.start_loading()
+        prefix = prefix.lower()
+        scores = {}
+        if self.base is not None:
+            base_weight = 1 - self.user_weight
+            for word, frequency in self.base.complete(prefix, k * 2):
+                scores[word] = base_weight * frequency
+        if self.user_total:
+            user_weight = self.user_weight / self.user_total
+            start = bisect.bisect_left(self.user_words, prefix)
+            for word in self.user_words[start:start + self.scan_limit]:
+                if not word.startswith(prefix):
+                    break
+                scores[word] = scores.get(word, 0.0) + user_weight * self.user_counts[word]
+        # Completing a word that is already fully typed saves nothing
+        scores.pop(prefix, None)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+    def learn(self, word):
+        # Digits, symbols or capitals inside a word look like a password, not something to remember
+        if not re.fullmatch(r"[A-Za-z][a-z']*", word):
+            return
+        word = word.lower()
+        if word not in self.user_counts:
+            bisect.insort(self.user_words, word)
+        self.user_counts[word] += 1
+        self.user_total += 1
+
+    def save(self):
+        if self.user_path:
+            # Readable by this user only; it is a record of what they typed
+            descriptor = os.open(self.user_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(descriptor, "w", encoding="utf-8") as user_file:
+                json.dump(self.user_counts, user_file)
+
+
+def keystrokes_for(predictor, word, slots=3, learn=True):
+    """Selections needed to enter word and a space: letters until it shows up in the bar, plus one"""
+    for typed in range(len(word)):
+        if word in predictor.complete(word[:typed], slots):
+            cost = typed + 1
+            break
+    else:
+        cost = len(word) + 1
+    if learn:
+        predictor.learn(word)
+    return cost
+
+
+SAMPLE_TEXT = """
+The keyboard on the screen is used with the eyes. Every letter is a look at a key and a blink or
+a pause, so a word of five letters takes six selections with the space. Prediction shows the
+words that start with the letters typed so far, and choosing one of them types the rest of the
+word and the space at once. Common words like the, and, you, that and with should need one or
+two letters. Names and words the user types often are learned as they are used, so a message to
+a friend or a note about the day gets faster to write over time. The same words come back in
+most messages: thank you, see you later, I am fine, can you help me, I would like some water,
+please call my family, I need to rest now, the weather is nice today, let us go outside later.
+Thank you for the help today. Can you call me later? I would like to watch the news and then
+rest. Please bring me some water and the book from the table. See you tomorrow morning.
+"""
+
+
+def benchmark(corpus_text=SAMPLE_TEXT, word_list_path=None, train_share=0.5):
+    words = words_in(corpus_text)
+    split = int(len(words) * train_share)
+    train, test = words[:split], words[split:]
+
+    directory = None
+    if word_list_path is None:
+        # No list given: the first part of the corpus stands in for it
+        word_list_path = os.path.join("/tmp" if os.path.isdir("/tmp") else ".", "prediction_bench_words.txt")
+        with open(word_list_path, "w", encoding="utf-8") as word_list:
+            for word, count in Counter(train).most_common():
+                word_list.write(f"{word} {count}\n")
+    predictor = WordPredictor(word_list_path).start_loading()
+    predictor.wait_loaded()
+    directory = predictor._trie_directory()
+
+    start = time.perf_counter()
+    prefixes = [word[:length] for word in test for length in range(len(word))]
+    for prefix in prefixes:
+        predictor.complete(prefix)
+    lookup = (time.perf_counter() - start) / len(prefixes)
+
+    letters = sum(len(word) + 1 for word in test)
+    static = sum(keystrokes_for(predictor, word, learn=False) for word in test)
+    learning = sum(keystrokes_for(predictor, word) for word in test)
+    print(f"{len(test)} test words, {letters / len(test):.2f} selections per word letter by letter")
+    print(f"Word list only:   {static / len(test):.2f} per word ({1 - static / letters:.0%} saved)")
+    print(f"Learning as used: {learning / len(test):.2f} per word ({1 - learning / letters:.0%} saved)")
+    print(f"Completion lookup: {lookup * 1e6:.1f} us (trie in {directory})")
+
+
+if __name__ == "__main__":
+    # python word_prediction.py [corpus.txt [wordlist.txt]]
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as corpus:
+            benchmark(corpus.read(), sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        benchmark()